@@ -30,6 +30,9 @@ from franklin.backbone.specifications import (BACKBONE_DIRECTORIES,
                                               BACKBONE_BASENAMES)
 from franklin.utils.misc_utils import (VersionedPath, get_num_threads,
                                        rel_symlink)
+from franklin.utils.compressed_files import (open_compressed_file,
+                                             COMPRESSED_EXTENSIONS)
+from franklin.pipelines.step_cache import StepResultCache
 
 def scrape_info_from_fname(path):
     'It guess pipeline taking into account the platform and the file format'
@@ -38,7 +41,7 @@ def scrape_info_from_fname(path):
     else:
         fpath = path.last_version
 
-    fhand = open(fpath)
+    fhand = open_compressed_file(fpath)
     basename = os.path.splitext(os.path.basename(fpath))[0]
 
     file_info = {}
@@ -52,14 +55,21 @@ def scrape_info_from_fname(path):
     file_info['fpath'] = path
     return file_info
 
+def _seq_extension(path):
+    'It returns the extension of the path, the one before the gz if any'
+    if path.extension in COMPRESSED_EXTENSIONS:
+        return os.path.splitext(path.basename)[1][1:]
+    return path.extension
+
 def _is_sequence_file(path):
     'It returns true if the function is a sequence'
-    return path.extension in ('fasta', 'fastq', 'sfastq', 'repr', 'json',
-                              'pickle')
+    return _seq_extension(path) in ('fasta', 'fastq', 'sfastq', 'repr',
+                                    'json', 'pickle')
 
 def _is_sequence_or_qual_file(path):
     'It returns true if the function is a sequence or quality file'
-    return path.extension in ('fasta', 'fastq', 'sfastq', 'repr', 'qual')
+    return _seq_extension(path) in ('fasta', 'fastq', 'sfastq', 'repr',
+                                    'qual')
 
 def _select_fname(kind, paths):
     'It returns the path that correponds to the given file kind'
@@ -99,12 +109,34 @@ class Analyzer(object):
         self._silent = silent
 
         self.threads = self._get_num_threads()
+        tool_threads = project_settings['General_settings']['tool_threads']
+        self.tool_threads = get_num_threads(tool_threads)
+        memory_budget = project_settings['General_settings']['memory_budget']
+        #in the settings it is given in megabytes
+        if memory_budget:
+            self.memory_budget = memory_budget * 1024 ** 2
+        else:
+            self.memory_budget = None
 
     def _get_num_threads(self):
         'It calculates the number of threads to use'
         threads = self._project_settings['General_settings']['threads']
         return get_num_threads(threads)
 
+    def _get_step_cache(self):
+        '''It returns the cache for the pipeline step results.
+
+        It returns None if the cache is not requested in the settings.
+        '''
+        settings = self._project_settings['General_settings']
+        if not settings['step_cache']:
+            return None
+        fpath = os.path.join(self._get_project_path(),
+                             BACKBONE_DIRECTORIES['step_cache'],
+                             BACKBONE_BASENAMES['step_cache'])
+        return StepResultCache(fpath,
+                               max_size=settings['step_cache_size'] * 1024 ** 2)
+
     @staticmethod
     def _set_tmp(tmpdir):
         'It sets the tmpdir'
@@ -95,8 +95,10 @@ class AnnotationAnalyzer(Analyzer):
                                            delete=False)
             in_fhands = {'in_seq': open(seq_fpath)}
 
+            #the annotation dbs are written in the binary container, the
+            #old pickle files are still read
             writer = SequenceWriter(fhand=temp_pickle,
-                                    file_format='pickle')
+                                    file_format='binary')
 
             if seq_path.basename in configuration:
                 #there is a different configuration for every file to annotate
@@ -107,7 +109,10 @@ class AnnotationAnalyzer(Analyzer):
             seq_pipeline_runner(pipeline, configuration=config,
                                 in_fhands=in_fhands,
                                 processes=self.threads,
-                                writers={'repr': writer})
+                                writers={'repr': writer},
+                                cache=self._get_step_cache(),
+                                tool_threads=self.tool_threads,
+                                memory_budget=self.memory_budget)
             temp_pickle.close()
             repr_path = VersionedPath(os.path.join(output_dir,
                                                  seq_path.basename + '.pickle'))
@@ -375,7 +380,8 @@ class WriteAnnotationAnalyzer(Analyzer):
             feature_counter = seq_pipeline_runner(pipeline=None,
                                                   configuration=None,
                                                   in_fhands=in_fhands,
-                                                  writers = writers)
+                                                  writers=writers,
+                                                  threaded_writers=True)
 
             # We need to close fhands and remove void files.
             # sequence writer could have a qual fhand
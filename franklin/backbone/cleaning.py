@@ -22,7 +22,7 @@ Created on 15/03/2010
 # You should have received a copy of the GNU Affero General Public License
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
-import os, logging, array
+import os, logging, array, shutil
 
 from franklin.backbone.analysis import Analyzer, scrape_info_from_fname
 from franklin.pipelines.pipelines import seq_pipeline_runner
@@ -31,6 +31,7 @@ from franklin.backbone.specifications import (BACKBONE_DIRECTORIES,
                                               PLOT_FILE_FORMAT)
 from franklin.utils.seqio_utils import seqs_in_file
 from franklin.seq.writers import SequenceWriter
+from franklin.utils.compressed_files import open_compressed_file
 from franklin.statistics import (write_distribution, draw_histogram,
                                  draw_boxplot, IntsStats)
 from franklin.seq.seq_stats import create_nucleotide_freq_histogram
@@ -149,6 +150,14 @@ class CleanReadsAnalyzer(Analyzer):
             return self._create_cleaning_configuration_no_solid(platform,
                                                                 library=library)
 
+    def _get_checkpoint_dir(self, fname):
+        'It returns the checkpoint dir for the given file if they are requested'
+        if not self._project_settings['Cleaning']['checkpoints']:
+            return None
+        return os.path.join(self._get_project_path(),
+                            BACKBONE_DIRECTORIES['cleaning_checkpoints'],
+                            fname)
+
     def run(self):
         '''It runs the analysis. It checks if the analysis is already done per
         input file'''
@@ -165,8 +174,10 @@ class CleanReadsAnalyzer(Analyzer):
                 logger.info(msg)
                 continue
             file_info = scrape_info_from_fname(input_path)
-            input_fhand = open(input_fpath)
-            output_fhand = open(output_fpath, 'w')
+            input_fhand = open_compressed_file(input_fpath)
+            #the gzip outputs are written as BGZF files
+            output_fhand = open_compressed_file(output_fpath, 'w',
+                                                threads=self.threads)
             pipeline = self._guess_cleaning_pipepile(file_info)
             infhands = {'in_seq':input_fhand}
             writer = SequenceWriter(output_fhand,
@@ -175,16 +186,24 @@ class CleanReadsAnalyzer(Analyzer):
             configuration = self.create_cleaning_configuration(
                                                        platform=file_info['pl'],
                                                        library=file_info['lb'])
+            checkpoint_dir = self._get_checkpoint_dir(fname)
             try:
                 seq_pipeline_runner(pipeline, configuration, infhands,
                                     file_info['format'], processes=self.threads,
-                                    writers={'seq':writer})
+                                    writers={'seq':writer},
+                                    checkpoint_dir=checkpoint_dir,
+                                    cache=self._get_step_cache(),
+                                    tool_threads=self.tool_threads,
+                                    memory_budget=self.memory_budget,
+                                    compact_reads=True)
             except Exception as error:
                 output_fhand.close()
                 os.remove(output_fpath)
                 raise(error)
             output_fhand.close()
             input_fhand.close()
+            if checkpoint_dir is not None:
+                shutil.rmtree(checkpoint_dir)
 
         self._log({'analysis_finished':True})
         return
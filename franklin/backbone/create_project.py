@@ -201,6 +201,10 @@ DEFAULT_CONFIGURATION = OrderedDict([
                     ('project_name', (STRING, None)),
                     ('project_path', (STRING, None)),
                     ('threads', (INTEGER_OR_BOOL, None)),
+                    ('tool_threads', (INTEGER_OR_BOOL, None)),
+                    ('step_cache', (BOOLEAN, False)),
+                    ('step_cache_size', (INTEGER, 1024)),
+                    ('memory_budget', (INTEGER, None)),
                 ]),
             ),
            ('Other_settings',
@@ -222,6 +226,7 @@ DEFAULT_CONFIGURATION = OrderedDict([
                     ('vector_database', (STRING, UNIVEC)),
                     ('vector_file', (STRING, None)),
                     ('strip_n_percent', (NUMBER, 2.0)),
+                    ('checkpoints', (BOOLEAN, False)),
                     ('min_seq_length',{
                                       '454' : (INTEGER, 100),
                                       'sanger': (INTEGER, 100),
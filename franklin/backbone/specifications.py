@@ -38,6 +38,8 @@ BACKBONE_DIRECTORIES = {
     'info':'info',
     'raw_reads_stats': 'reads/raw/stats',
     'cleaned_reads_stats': 'reads/cleaned/stats',
+    'cleaning_checkpoints': 'reads/cleaned/checkpoints',
+    'step_cache': 'cache',
     'annotation_dbs':'annotations/db',
     'annotation_input':'annotations/input',
     'annotation_result':'annotations/features',
@@ -55,7 +57,8 @@ BACKBONE_BASENAMES = {
     'merged_frg':'all_seq.frg',
     'blast_basename':'blast',
     'statistics_file': 'statistics.txt',
-    'unmapped_list': 'unmapped_reads.gz'
+    'unmapped_list': 'unmapped_reads.gz',
+    'step_cache': 'step_results.sqlite'
 }
 
 PLOT_FILE_FORMAT = 'svg'
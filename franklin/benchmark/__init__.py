@@ -0,0 +1,23 @@
+'''
+Benchmarks for the sequence cleaning pipelines.
+
+It holds the synthetic read generators and the functions that time the
+pipelines and their steps.
+
+Created on 17/10/2026
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
@@ -0,0 +1,290 @@
+'''
+It times the sequence cleaning pipelines and their steps.
+
+Every pipeline in SEQPIPELINES and every step used by them is run with
+synthetic reads through _pipeline_builder. Every benchmark is run in its own
+process, so the peak memory of one benchmark does not hide the next one. The
+results are stored as JSON and two result files can be compared to check if a
+change in the cleaners has made them faster.
+
+Created on 17/10/2026
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import os, time, json, copy, resource, traceback, multiprocessing, platform
+import subprocess, Queue
+
+import franklin
+from franklin.pipelines.pipelines import _pipeline_builder, PipelineStats
+from franklin.pipelines.seq_pipeline_steps import SEQPIPELINES
+from franklin.benchmark.read_generators import (generate_reads, DEFAULT_SEED,
+                                               DEFAULT_ADAPTOR, DEFAULT_VECTOR)
+from franklin.seq.writers import temp_fasta_file
+from franklin.seq.seqs import SeqWithQuality, Seq
+from franklin.utils.misc_utils import DATA_DIR
+
+DEFAULT_NUM_READS = 1000
+
+#the seconds waited for a benchmark result before checking its process
+RESULT_POLL_TIME = 1
+
+UNIVEC = os.path.join(DATA_DIR, 'blastdbs', 'UniVec_Core')
+
+#the reads used for every pipeline
+PIPELINE_READS = {'sanger_with_qual':    {'platform': 'sanger'},
+                  'sanger_without_qual': {'platform': 'sanger',
+                                          'with_quality': False},
+                  'solexa':              {'platform': 'illumina'},
+                  'adaptors':            {'platform': 'illumina'},
+                  'mask_dust':           {'platform': 'sanger'},
+                  'word_masker':         {'platform': '454'},
+                  'solid':               {'platform': 'solid'}}
+
+#the fraction of contaminated reads
+CONTAMINATION = {'adaptor_freq': 0.2, 'vector_freq': 0.1, 'polya_freq': 0.1}
+
+def create_benchmark_configuration(vector_db=UNIVEC):
+    '''It returns the pipeline configuration used by the benchmarks.
+
+    The adaptor and the vector used by the read generators are written in
+    temporary fasta files, the files are returned too to keep them alive.
+    '''
+    adaptors_fhand = temp_fasta_file([SeqWithQuality(Seq(DEFAULT_ADAPTOR),
+                                                     name='adaptor')])
+    vectors_fhand = temp_fasta_file([SeqWithQuality(Seq(DEFAULT_VECTOR),
+                                                    name='vector')])
+    configuration = {'remove_adaptors': {'adaptors': adaptors_fhand.name},
+                     'remove_vectors_blastdb': {'vectors': vector_db},
+                     'remove_vectors_file': {'vectors': vectors_fhand.name},
+                     'remove_short_adaptors': {'words':
+                                               ['^' + DEFAULT_ADAPTOR[:15]]},
+                     'edge_removal': {'left_length': 5, 'right_length': 5},
+                     'filter_similar_seqs': {'db': vector_db,
+                                             'blast_program': 'blastn'}}
+    return configuration, [adaptors_fhand, vectors_fhand]
+
+def get_benchmark_steps():
+    '''It returns the steps used by the pipelines in SEQPIPELINES.
+
+    It returns a list of (benchmark name, step, platform) tuples. If two
+    different steps share a name the pipeline name is added to the name.
+    '''
+    steps, seen_steps, names = [], set(), set()
+    for pipeline_name in sorted(SEQPIPELINES.keys()):
+        for step in SEQPIPELINES[pipeline_name]:
+            if id(step) in seen_steps:
+                continue
+            seen_steps.add(id(step))
+            name = step['name']
+            if name in names:
+                name = '%s.%s' % (pipeline_name, name)
+            names.add(name)
+            steps.append((name, step,
+                          PIPELINE_READS[pipeline_name]['platform']))
+    return steps
+
+def _peak_rss():
+    'It returns the peak resident memory of this process and its children'
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    #ru_maxrss is in kilobytes in linux
+    return max(self_rss, children_rss)
+
+def _stats_to_dict(stats):
+    'It returns the pipeline stats as a dict'
+    steps = {}
+    for step_stats in stats.steps:
+        steps[step_stats.name] = {'items_in': step_stats.items_in,
+                                  'items_out': step_stats.items_out,
+                                  'wall_time': step_stats.wall_time,
+                                  'cpu_time': step_stats.cpu_time}
+    return steps
+
+def time_pipeline(pipeline, reads, configuration, processes=False):
+    '''It runs the pipeline for the reads and it returns the timings.
+
+    The reads should be a list, they are not counted in the timing.
+    '''
+    pipeline = [copy.deepcopy(step) for step in pipeline]
+    stats = PipelineStats()
+    wall_time, cpu_time = time.time(), sum(os.times()[:4])
+    num_out = 0
+    for read in _pipeline_builder(pipeline, iter(reads), configuration,
+                                  processes=processes, stats=stats):
+        if read is not None:
+            num_out += 1
+    wall_time = time.time() - wall_time
+    cpu_time = sum(os.times()[:4]) - cpu_time
+    reads_per_second = len(reads) / wall_time if wall_time else None
+    return {'reads_in': len(reads), 'reads_out': num_out,
+            'wall_time': wall_time, 'cpu_time': cpu_time,
+            'reads_per_second': reads_per_second,
+            'steps': _stats_to_dict(stats)}
+
+def _run_benchmark(pipeline, read_params, num_reads, seed, configuration,
+                   processes, out_queue):
+    'It runs one benchmark in a child process and it sends back the result'
+    try:
+        reads = list(generate_reads(num_reads=num_reads, seed=seed,
+                                    **read_params))
+        rss_before = _peak_rss()
+        result = time_pipeline(pipeline, reads, configuration,
+                               processes=processes)
+        result['peak_rss_kb'] = _peak_rss()
+        result['reads_rss_kb'] = rss_before
+        out_queue.put(result)
+    except Exception:
+        out_queue.put({'error': traceback.format_exc()})
+
+def run_isolated_benchmark(pipeline, read_params, num_reads, configuration,
+                           seed=DEFAULT_SEED, processes=False):
+    '''It runs a benchmark in a new process and it returns its result.
+
+    If the pipeline fails, for instance because an external program is not
+    installed, or if the process dies without sending its result, the result
+    will hold the error.
+    '''
+    out_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_benchmark,
+                                      args=(pipeline, read_params, num_reads,
+                                            seed, configuration, processes,
+                                            out_queue))
+    process.start()
+    result = None
+    while result is None:
+        try:
+            result = out_queue.get(timeout=RESULT_POLL_TIME)
+        except Queue.Empty:
+            if process.is_alive():
+                continue
+            #the result could have been sent just before the process ended
+            try:
+                result = out_queue.get(timeout=RESULT_POLL_TIME)
+            except Queue.Empty:
+                msg = 'The benchmark process ended without a result, exit '
+                msg += 'code %s' % process.exitcode
+                result = {'error': msg}
+    process.join()
+    return result
+
+def _get_commit():
+    'It returns the git commit of the franklin being benchmarked'
+    franklin_dir = os.path.dirname(os.path.dirname(franklin.__file__))
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                   cwd=franklin_dir, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+    except OSError:
+        return None
+    stdout = process.communicate()[0]
+    if process.returncode:
+        return None
+    return stdout.strip()
+
+def run_benchmarks(num_reads=DEFAULT_NUM_READS, seed=DEFAULT_SEED,
+                   pipelines=None, steps=True, processes=False,
+                   vector_db=UNIVEC, log_fhand=None):
+    '''It times the pipelines and the steps and it returns the results.
+
+    pipelines is a list with the names of the SEQPIPELINES to time, all of
+    them by default. If steps is True every step will be also timed alone.
+    '''
+    if pipelines is None:
+        pipelines = sorted(SEQPIPELINES.keys())
+    configuration, config_fhands = create_benchmark_configuration(vector_db)
+    results = {'franklin_version': franklin.__version__,
+               'commit': _get_commit(),
+               'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'python': platform.python_version(),
+               'host': platform.node(),
+               'num_reads': num_reads, 'seed': seed,
+               'processes': processes,
+               'pipelines': {}, 'steps': {}}
+
+    benchmarks = []
+    for pipeline_name in pipelines:
+        read_params = dict(CONTAMINATION, **PIPELINE_READS[pipeline_name])
+        benchmarks.append(('pipelines', pipeline_name,
+                           SEQPIPELINES[pipeline_name], read_params))
+    if steps:
+        for step_name, step, platform_ in get_benchmark_steps():
+            read_params = dict(CONTAMINATION, platform=platform_)
+            benchmarks.append(('steps', step_name, [step], read_params))
+
+    for kind, name, pipeline, read_params in benchmarks:
+        result = run_isolated_benchmark(pipeline, read_params, num_reads,
+                                        configuration, seed=seed,
+                                        processes=processes)
+        result['platform'] = read_params['platform']
+        results[kind][name] = result
+        if log_fhand is not None:
+            log_fhand.write(_format_result(name, result) + '\n')
+            log_fhand.flush()
+    for fhand in config_fhands:
+        fhand.close()
+    return results
+
+def _format_result(name, result):
+    'It returns a line describing a benchmark result'
+    if 'error' in result:
+        error = result['error'].strip().splitlines()[-1]
+        return '%-34s failed: %s' % (name, error)
+    #there is no rate if the pipeline took no measurable time
+    if result['reads_per_second'] is None:
+        reads_per_second = '%10s' % 'n/a'
+    else:
+        reads_per_second = '%10.1f' % result['reads_per_second']
+    return '%-34s %s reads/s %9.3f s %9d KB' % (name, reads_per_second,
+                                                result['wall_time'],
+                                                result['peak_rss_kb'])
+
+def write_benchmark_results(results, fhand):
+    'It writes the benchmark results as JSON'
+    json.dump(results, fhand, indent=4, sort_keys=True)
+    fhand.flush()
+
+def read_benchmark_results(fhand):
+    'It reads the benchmark results written by write_benchmark_results'
+    return json.load(fhand)
+
+def compare_benchmark_results(old_results, new_results):
+    '''It returns a report comparing the reads per second of two runs.
+
+    The change is the percentage of the new speed relative to the old one.
+    '''
+    lines = ['%-10s %-34s %12s %12s %9s' % ('kind', 'benchmark', 'old reads/s',
+                                            'new reads/s', 'change')]
+    for kind in ('pipelines', 'steps'):
+        for name in sorted(new_results[kind].keys()):
+            new_result = new_results[kind][name]
+            old_result = old_results.get(kind, {}).get(name, {})
+            new_speed = new_result.get('reads_per_second', None)
+            old_speed = old_result.get('reads_per_second', None)
+            if new_speed is None or old_speed is None:
+                lines.append('%-10s %-34s %12s %12s %9s' % (kind, name,
+                                        _format_speed(old_speed),
+                                        _format_speed(new_speed), '-'))
+                continue
+            change = (new_speed - old_speed) / old_speed * 100
+            lines.append('%-10s %-34s %12.1f %12.1f %+8.1f%%' % (kind, name,
+                                                        old_speed, new_speed,
+                                                        change))
+    return '\n'.join(lines)
+
+def _format_speed(speed):
+    'It returns the speed as a string'
+    return '-' if speed is None else '%.1f' % speed
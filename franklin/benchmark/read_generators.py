@@ -0,0 +1,143 @@
+'''
+Deterministic generators of synthetic reads.
+
+The reads look like the ones produced by the sanger, 454, illumina and solid
+platforms. Their length and quality profile depend on the platform and they
+can be contaminated with adaptors, vectors and poly-A tails. Two runs with the
+same seed and parameters give the same reads.
+
+Created on 17/10/2026
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import random
+
+from franklin.seq.seqs import SeqWithQuality, Seq
+
+DEFAULT_SEED = 42
+
+#the illumina paired end adaptor
+DEFAULT_ADAPTOR = 'AGATCGGAAGAGCGGTTCAGCAGGAATGCCGAG'
+
+#length: mean read length, length_sd: its standard deviation
+#quality: the mean quality at the start, in the middle and at the end
+#ramp: the fraction of the read in which the quality goes up at the start
+#decay: the fraction of the read in which the quality goes down at the end
+PLATFORM_PROFILES = {
+    'sanger':   {'length': 700, 'length_sd': 80, 'quality': (12, 45, 8),
+                 'ramp': 0.05, 'decay': 0.3, 'quality_sd': 5},
+    '454':      {'length': 400, 'length_sd': 50, 'quality': (35, 38, 18),
+                 'ramp': 0.0, 'decay': 0.25, 'quality_sd': 4},
+    'illumina': {'length': 100, 'length_sd': 0, 'quality': (34, 38, 12),
+                 'ramp': 0.0, 'decay': 0.4, 'quality_sd': 4},
+    'solid':    {'length': 50, 'length_sd': 0, 'quality': (25, 28, 10),
+                 'ramp': 0.0, 'decay': 0.5, 'quality_sd': 6},
+}
+
+MIN_READ_LENGTH = 20
+MAX_QUALITY = 60
+
+def quality_profile(length, start, middle, end, ramp=0.0, decay=0.0):
+    '''It returns the mean quality for every position of a read.
+
+    The quality goes from start to middle in the first ramp fraction of the
+    read and from middle to end in the last decay fraction.
+    '''
+    ramp_length = int(length * ramp)
+    decay_length = int(length * decay)
+    profile = []
+    for index in range(length):
+        if index < ramp_length:
+            qual = start + (middle - start) * index / float(ramp_length)
+        elif index >= length - decay_length:
+            position = index - (length - decay_length) + 1
+            qual = middle + (end - middle) * position / float(decay_length)
+        else:
+            qual = middle
+        profile.append(qual)
+    return profile
+
+def _random_seq(rng, length, gc=50):
+    'It returns a random sequence with the given gc percentage'
+    gc = gc / 100.0
+    nucls = []
+    for index in range(length):
+        if rng.random() < gc:
+            nucls.append('G' if rng.random() < 0.5 else 'C')
+        else:
+            nucls.append('A' if rng.random() < 0.5 else 'T')
+    return ''.join(nucls)
+
+#a made up vector, it is always the same because the seed is fixed
+DEFAULT_VECTOR = _random_seq(random.Random(1), 400)
+
+def _random_qualities(rng, profile, quality_sd):
+    'It returns a quality for every mean in the profile'
+    quals = []
+    for mean in profile:
+        qual = int(round(rng.gauss(mean, quality_sd)))
+        quals.append(min(max(qual, 0), MAX_QUALITY))
+    return quals
+
+def generate_reads(platform, num_reads, seed=DEFAULT_SEED, length=None,
+                   with_quality=True, profile=None, gc=50,
+                   adaptor=DEFAULT_ADAPTOR, adaptor_freq=0.0,
+                   vector=DEFAULT_VECTOR, vector_freq=0.0,
+                   polya_freq=0.0, polya_length=25):
+    '''It yields num_reads synthetic reads for the given platform.
+
+    The length and the quality profile are taken from PLATFORM_PROFILES, but
+    they can be changed with the length and profile parameters (a dict like
+    the ones in PLATFORM_PROFILES).
+    adaptor_freq, vector_freq and polya_freq are the fractions of reads that
+    will start with the adaptor, will start with a part of the vector and will
+    end with a poly-A tail.
+    '''
+    platform_profile = PLATFORM_PROFILES[platform].copy()
+    if profile is not None:
+        platform_profile.update(profile)
+    if length is not None:
+        platform_profile['length'] = length
+    start, middle, end = platform_profile['quality']
+
+    rng = random.Random(seed)
+    for index in range(num_reads):
+        read_length = int(round(rng.gauss(platform_profile['length'],
+                                          platform_profile['length_sd'])))
+        read_length = max(read_length, MIN_READ_LENGTH)
+        seq = _random_seq(rng, read_length, gc)
+        if rng.random() < vector_freq:
+            fragment_length = rng.randint(min(40, len(vector)),
+                                          min(100, len(vector)))
+            fragment_start = rng.randint(0, len(vector) - fragment_length)
+            seq = vector[fragment_start:fragment_start + fragment_length] + seq
+        if rng.random() < adaptor_freq:
+            seq = adaptor + seq
+        if rng.random() < polya_freq:
+            seq = seq[:read_length - polya_length] + 'A' * polya_length
+        seq = seq[:read_length]
+
+        if with_quality:
+            profile_ = quality_profile(read_length, start, middle, end,
+                                       platform_profile['ramp'],
+                                       platform_profile['decay'])
+            qual = _random_qualities(rng, profile_,
+                                     platform_profile['quality_sd'])
+        else:
+            qual = None
+        name = '%s_%07d' % (platform, index)
+        yield SeqWithQuality(seq=Seq(seq), qual=qual, name=name)
@@ -23,15 +23,17 @@ Created on 12/03/2010
 from franklin.seq.seq_annotation import (create_cdna_intron_annotator,
                                          create_ortholog_annotator,
                                          create_description_annotator,
-                                         create_microsatellite_annotator,
-                                         create_orf_annotator,
+                                         create_batch_orf_annotator,
                                          create_go_annotator,
                                          create_prot_change_annotator)
+from franklin.seq.seq_annotation import \
+                                    create_batch_microsatellite_annotator
 
 annotate_cdna_introns = {'function': create_cdna_intron_annotator,
                          'arguments':{'genomic_db':None,
                                       'genomic_seqs_fhand':None},
                          'type':'mapper',
+                         'external_program': True,
                          'name':'annotate_cdna_introns',
             'comment': 'It annotates introns comparing with a reference genome'}
 
@@ -48,15 +50,17 @@ annotate_with_descriptions = {'function': create_description_annotator,
                               'name':'annotate_descriptions',
            'comment': 'It annotates using the first hit of the given databases'}
 
-annotate_microsatellites = {'function': create_microsatellite_annotator,
+annotate_microsatellites = {'function': create_batch_microsatellite_annotator,
                         'arguments':{},
-                        'type':'mapper' ,
+                        'type':'batch_mapper' ,
+                        'external_program': True,
                         'name':'annotate_microsatellites',
                         'comment': 'It annotates The microsatellites'}
 
-annotate_orfs = {'function': create_orf_annotator,
+annotate_orfs = {'function': create_batch_orf_annotator,
                  'arguments':{'parameters':None},
-                 'type':'mapper' ,
+                 'type':'batch_mapper' ,
+                 'external_program': True,
                  'name':'annotate_orfs',
                  'comment': 'It annotates The orf'}
 
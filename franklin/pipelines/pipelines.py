@@ -7,16 +7,36 @@ because they're just a list of dicts that include the name of a function. For
 instance there are pipelines defined to clean short and long sequences, to
 mask them using repeat masker, etc.
 
-The pipeline can hold three step types: filter, mapper and bulk_processor. They
-differ in the interface of the function that process the sequences:
+The pipeline can hold four step types: filter, mapper, batch_mapper and
+bulk_processor. They differ in the interface of the function that process the
+sequences:
     - mapper: These functions take a sequence and return a new processed
     sequence.
     - filter: These functions take a sequence and return True or False according
     to the match of some criteria by the sequence.
+    - batch_mapper: These functions take a list of sequences and return a list
+    with the processed sequences. They are useful to run an external program
+    once for many sequences. The list size can be set in the step with the
+    batch_size key.
     - bulk_processor: These functions take a sequence iterator and return a new
     sequence iterator will the processed sequence.
-The pipeline runner knows how to use these three kinds of steps to filter and
+The pipeline runner knows how to use these four kinds of steps to filter and
 modify the sequences.
+
+The mapper, filter and batch_mapper steps that run an external program should
+have the external_program key set to True in its definition. When the pipeline
+is run with tool_threads these steps are run in a pool of threads, so several
+external programs are run at the same time while the other steps go on.
+
+When the pipeline is run with a memory_budget the bulk_processor steps get
+their items in a SpillingBuffer. It can be iterated several times and it moves
+the items to a temporary file once the process memory exceeds the budget.
+
+When the pipeline is run for paired reads every item is a (mate1, mate2)
+tuple. The mapper and batch_mapper steps process both mates and the pair is
+dropped, it becomes None, when a mapper drops any of them. A pair passes a
+filter only if both mates pass it. The bulk_processor steps can not be used
+with paired reads.
 '''
 
 # Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
@@ -35,24 +55,27 @@ modify the sequences.
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
 
-import logging, os, tempfile, copy, sys
+import logging, multiprocessing, traceback, Queue, time, os, copy, re, sys
+import threading
+import hashlib, json
 import cPickle as pickle
-from itertools import imap, ifilter
-from tempfile import gettempdir, NamedTemporaryFile
-
-try:
-    import psubprocess
-except ImportError:
-    pass
+from itertools import imap, ifilter, chain
+from collections import deque
+from multiprocessing.pool import ThreadPool
 
-import franklin
-from franklin.seq.readers import seqs_in_file
+from franklin.seq.readers import (seqs_in_file, seq_file_sections,
+                                  paired_seqs_in_file, paired_file_sections)
 from franklin.pipelines.seq_pipeline_steps import SEQPIPELINES, SEQ_STEPS
 from franklin.pipelines.snv_pipeline_steps import SNV_PIPELINES, SNV_STEPS
 from franklin.pipelines.annotation_steps import ANNOT_STEPS
 from franklin.seq.readers import guess_seq_file_format
-from franklin.seq.writers import SequenceWriter
-from franklin.utils.misc_utils import DisposableFile
+from franklin.utils.misc_utils import FileSection, get_num_threads
+from franklin.utils.compressed_files import (open_compressed_file,
+                                             uncompressed_fhand,
+                                             has_random_access)
+from franklin.utils.itertools_ import (group_in_batches, SpillingBuffer,
+                                       get_peak_memory_usage)
+from franklin.pipelines.step_cache import create_cached_step_function
 
 # Join the pipelines in PIPELINE
 PIPELINES = dict(SEQPIPELINES.items() + SNV_PIPELINES.items())
@@ -95,257 +118,1163 @@ def configure_pipeline(pipeline, configuration):
 #                raise RuntimeError(msg)
     return pipeline
 
-def _get_func_tools(processes):
-    'It returns a mapping function from multiprocessing or itertools'
-    if isinstance(processes, bool) and not processes:
-        map_ = imap
-    else:
-        #multiprocessing
-        import multiprocessing
-        if not isinstance(processes, int):
-            processes = None    #number determined by cpu_count
-        pool = multiprocessing.Pool(processes)
-        map_ = pool.imap_unordered
-        raise RuntimeError('Multiprocessing not supported yet')
-    filter_ = ifilter
-    return {'map': map_, 'filter': filter_}
-
-def _pipeline_builder(pipeline, items, configuration=None, processes=False):
-    '''It runs all the analysis for the given pipeline.
+#the number of items sent to a multiprocessing worker in every task
+DEFAULT_BATCH_SIZE = 100
 
-    It takes one or two input files and one or two output files. (Fasta files
-    with the sequence and quality).
-    A working directory can be given in which the analysis intermediate files
-    will be created. If not given a temporary directory will be created that
-    will be removed once the analysis is completed.
-    If the checkpoints are requested an intermediate file for every step will be
-    created.
+#the processed batches that a section worker can send before it waits for
+#its section to be read
+SECTION_QUEUE_SIZE = 4
+
+#the number of slowest items remembered for every step
+NUM_SLOWEST_ITEMS = 5
+
+#the steps with external programs can record their stats from several threads
+_STATS_LOCK = threading.Lock()
+
+def _cpu_time():
+    'It returns the cpu time used by this process and its finished children'
+    return sum(os.times()[:4])
+
+def _get_item_name(item):
+    'It returns a name to identify the item in the reports'
+    if isinstance(item, tuple):
+        return ' '.join([str(_get_item_name(mate)) for mate in item])
+    name = getattr(item, 'name', None)
+    if name is None:
+        name = repr(item)
+        if len(name) > 30:
+            name = name[:27] + '...'
+    return name
+
+class StepStats(object):
+    '''It holds the item counts and the times spent by a pipeline step.
+
+    The times are the cumulative wall and cpu times spent inside the step
+    function. The cpu time includes the external programs run by the step.
     '''
-    if configuration is None:
-        configuration = {}
-    if pipeline is None:
-        return items
-    # We configure the pipeline depending on the sequences type and
-    # configuration parameters
-    pipeline_steps = configure_pipeline(pipeline, configuration)
+    def __init__(self, name, type_, num_slowest=NUM_SLOWEST_ITEMS):
+        'It inits the counters'
+        self.name = name
+        self.type = type_
+        self.num_slowest = num_slowest
+        self.reset()
 
-    #we create all the cleaner functions
+    def reset(self):
+        'It sets all the counters to zero'
+        self.items_in = 0
+        self.items_out = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.slowest = []
+
+    def _get_dropped(self):
+        'It returns the number of items removed by the step'
+        return max(self.items_in - self.items_out, 0)
+    dropped = property(_get_dropped)
+
+    def _add_slowest(self, slowest):
+        'It keeps the slowest items from the given (time, name) list'
+        self.slowest = sorted(self.slowest + slowest,
+                              reverse=True)[:self.num_slowest]
+
+    def add_item(self, item, wall_time, cpu_time, passed=True):
+        'It records an item processed by the step'
+        self.items_in += 1
+        if passed:
+            self.items_out += 1
+        self.add_times(wall_time, cpu_time)
+        if (len(self.slowest) < self.num_slowest or
+            wall_time > self.slowest[-1][0]):
+            self._add_slowest([(wall_time, _get_item_name(item))])
+
+    def add_times(self, wall_time, cpu_time):
+        'It adds some time spent by the step'
+        self.wall_time += wall_time
+        self.cpu_time += cpu_time
+
+    def merge(self, step_stats):
+        'It adds the counts and times of other stats for the same step'
+        self.items_in += step_stats.items_in
+        self.items_out += step_stats.items_out
+        self.add_times(step_stats.wall_time, step_stats.cpu_time)
+        self._add_slowest(step_stats.slowest)
+
+class PipelineStats(object):
+    '''It holds the stats for every step of a pipeline run.
+
+    When the steps are run in several processes the times are the sum of the
+    times spent in every process.
+    '''
+    def __init__(self, num_slowest=NUM_SLOWEST_ITEMS):
+        'It inits the stats'
+        self.num_slowest = num_slowest
+        self.steps = []
+        self._steps_by_name = {}
+        #the peak resident memory in bytes
+        self.peak_memory = 0
+
+    def get_step(self, name, type_):
+        'It returns the stats for the given step, it creates them if required'
+        if name not in self._steps_by_name:
+            step_stats = StepStats(name, type_, num_slowest=self.num_slowest)
+            self.steps.append(step_stats)
+            self._steps_by_name[name] = step_stats
+        return self._steps_by_name[name]
+
+    def __getitem__(self, name):
+        'It returns the stats for the step with the given name'
+        return self._steps_by_name[name]
+
+    def reset(self):
+        'It sets the counters of all steps to zero'
+        for step_stats in self.steps:
+            step_stats.reset()
+
+    def merge(self, stats):
+        'It adds the stats from another run of the same pipeline'
+        for step_stats in stats.steps:
+            self.get_step(step_stats.name, step_stats.type).merge(step_stats)
+        self.peak_memory = max(self.peak_memory, stats.peak_memory)
+
+    def report(self):
+        'It returns a text report with the stats of every step'
+        header = '%-28s %-14s %9s %9s %9s %10s %10s %10s' % ('step', 'type',
+                                    'in', 'out', 'dropped', 'wall (s)',
+                                    'cpu (s)', 'items/s')
+        lines = ['Pipeline step stats', header]
+        for step_stats in self.steps:
+            if step_stats.wall_time:
+                rate = '%10.1f' % (step_stats.items_in / step_stats.wall_time)
+            else:
+                rate = '%10s' % '-'
+            line = '%-28s %-14s %9d %9d %9d %10.3f %10.3f %s' % \
+                    (step_stats.name, step_stats.type, step_stats.items_in,
+                     step_stats.items_out, step_stats.dropped,
+                     step_stats.wall_time, step_stats.cpu_time, rate)
+            lines.append(line)
+        for step_stats in self.steps:
+            if not step_stats.slowest:
+                continue
+            slowest = ', '.join(['%s (%.3f s)' % (name, wall_time)
+                                 for wall_time, name in step_stats.slowest])
+            lines.append('Slowest items in %s: %s' % (step_stats.name,
+                                                      slowest))
+        if self.peak_memory:
+            lines.append('Peak memory: %.1f MB' % (self.peak_memory /
+                                                   1024.0 ** 2))
+        return '\n'.join(lines)
+
+def _instrument_item_function(function, step_stats, is_filter):
+    'It returns a mapper or filter function that records its stats'
+    def instrumented_function(item):
+        'It runs the step function and it records the time spent'
+        wall_time, cpu_time = time.time(), _cpu_time()
+        result = function(item)
+        if is_filter:
+            passed = bool(result)
+        else:
+            passed = result is not None
+        with _STATS_LOCK:
+            step_stats.add_item(item, time.time() - wall_time,
+                                _cpu_time() - cpu_time, passed=passed)
+        return result
+    return instrumented_function
+
+def _instrument_batch_function(function, step_stats):
+    'It returns a batch_mapper function that records its stats'
+    def instrumented_function(items):
+        'It runs the step function and it records the time spent'
+        wall_time, cpu_time = time.time(), _cpu_time()
+        result = function(items)
+        with _STATS_LOCK:
+            step_stats.add_times(time.time() - wall_time,
+                                 _cpu_time() - cpu_time)
+            step_stats.items_in += len(items)
+            step_stats.items_out += len([item for item in result
+                                                          if item is not None])
+        return result
+    return instrumented_function
+
+def _instrument_bulk_processor(function, step_stats):
+    '''It returns a bulk processor that records its stats.
+
+    The time spent by the previous steps producing the input items is not
+    counted as time spent by this step.
+    '''
+    def instrumented_function(items):
+        'It runs the bulk processor and it records the time spent'
+        upstream = [0.0, 0.0]
+        def count_items_in(items):
+            'It counts the input items and the time spent to get them'
+            items = iter(items)
+            while True:
+                wall_time, cpu_time = time.time(), _cpu_time()
+                try:
+                    item = items.next()
+                except StopIteration:
+                    break
+                finally:
+                    upstream[0] += time.time() - wall_time
+                    upstream[1] += _cpu_time() - cpu_time
+                step_stats.items_in += 1
+                yield item
+
+        def timed(function, *args):
+            'It runs the function and it adds its own time to the stats'
+            upstream[0], upstream[1] = 0.0, 0.0
+            wall_time, cpu_time = time.time(), _cpu_time()
+            try:
+                return function(*args)
+            finally:
+                step_stats.add_times(time.time() - wall_time - upstream[0],
+                                     _cpu_time() - cpu_time - upstream[1])
+
+        processed_items = iter(timed(function, count_items_in(items)))
+        while True:
+            try:
+                item = timed(processed_items.next)
+            except StopIteration:
+                break
+            step_stats.items_out += 1
+            yield item
+    return instrumented_function
+
+def _instrument_cleaner_functions(pipeline_steps, cleaner_functions, stats):
+    'It wraps the cleaner functions to record their stats'
+    instrumented_functions = {}
+    for analysis_step in pipeline_steps:
+        step_name = _get_name_in_config(analysis_step)
+        if step_name not in cleaner_functions:
+            continue
+        type_ = analysis_step['type']
+        step_stats = stats.get_step(step_name, type_)
+        function = cleaner_functions[step_name]
+        if type_ == 'bulk_processor':
+            function = _instrument_bulk_processor(function, step_stats)
+        elif type_ == 'batch_mapper':
+            function = _instrument_batch_function(function, step_stats)
+        else:
+            function = _instrument_item_function(function, step_stats,
+                                                 is_filter=type_ == 'filter')
+        instrumented_functions[step_name] = function
+    return instrumented_functions
+
+def _get_num_processes(processes):
+    '''It returns the number of processes to use or None if no multiprocessing
+    is requested.
+
+    processes can be False (no multiprocessing), True (one process per cpu) or
+    the number of processes.
+    '''
+    if processes is None or processes is False:
+        return None
+    if processes is True:
+        return multiprocessing.cpu_count()
+    if processes <= 1:
+        return None
+    return processes
+
+def _create_buffered_bulk_processor(function, memory_budget):
+    '''It returns a bulk processor that gets its items in a SpillingBuffer.
+
+    The bulk processors that read the items more than once do not have to keep
+    all of them in memory.
+    '''
+    def buffered_bulk_processor(items):
+        'It runs the bulk processor with the items in a buffer'
+        buffered_items = SpillingBuffer(items, max_memory=memory_budget)
+        try:
+            for item in function(buffered_items):
+                yield item
+        finally:
+            buffered_items.close()
+    return buffered_bulk_processor
+
+def _create_cleaner_functions(pipeline_steps, step_types=None, cache=None,
+                              memory_budget=None):
+    '''It creates the functions that will process the items for every step.
+
+    Only the steps of the given step types will be created. If a
+    StepResultCache is given the mapper, filter and batch_mapper functions will
+    look for their results in it. If a memory_budget is given the
+    bulk_processor functions will get their items in a SpillingBuffer.
+    '''
     cleaner_functions = {}
     for analysis_step in pipeline_steps:
+        if step_types is not None and analysis_step['type'] not in step_types:
+            continue
         function_factory = analysis_step['function']
         if analysis_step['arguments']:
             arguments = analysis_step['arguments']
         else:
             arguments = None
 
-        msg = "Performing: %s" % analysis_step['comment']
-        logging.info(msg)
-
         # Create function adding parameters if they need them
         if arguments is None:
             cleaner_function = function_factory()
         else:
             #pylint:disable-msg=W0142
             cleaner_function = function_factory(**arguments) #IGNORE:W0142
+        if cache is not None:
+            cleaner_function = create_cached_step_function(cleaner_function,
+                                                analysis_step['type'],
+                                                _step_cache_key(analysis_step),
+                                                cache)
+        if (memory_budget is not None and
+            analysis_step['type'] == 'bulk_processor'):
+            cleaner_function = _create_buffered_bulk_processor(
+                                                cleaner_function, memory_budget)
         cleaner_functions[_get_name_in_config(analysis_step)] = cleaner_function
+    return cleaner_functions
+
+def _create_paired_function(function, type_):
+    'It returns a step function that processes (mate1, mate2) tuples'
+    if type_ == 'mapper':
+        def paired_mapper(pair):
+            'It maps both mates, the pair is dropped if a mate is dropped'
+            if pair is None:
+                return None
+            mate1 = function(pair[0])
+            if mate1 is None:
+                return None
+            mate2 = function(pair[1])
+            if mate2 is None:
+                return None
+            return mate1, mate2
+        return paired_mapper
+    elif type_ == 'filter':
+        def paired_filter(pair):
+            'A pair passes the filter if both mates pass it'
+            return (pair is not None and bool(function(pair[0])) and
+                    bool(function(pair[1])))
+        return paired_filter
+    elif type_ == 'batch_mapper':
+        def paired_batch_mapper(pairs):
+            'It maps all the mates in one batch'
+            mates = [mate for pair in pairs if pair is not None
+                                                             for mate in pair]
+            mapped_mates = list(function(mates))
+            if len(mapped_mates) != len(mates):
+                msg = 'A batch_mapper step changed the number of paired seqs'
+                raise ValueError(msg)
+            mapped_mates = iter(mapped_mates)
+            mapped_pairs = []
+            for pair in pairs:
+                if pair is not None:
+                    pair = mapped_mates.next(), mapped_mates.next()
+                    if pair[0] is None or pair[1] is None:
+                        pair = None
+                mapped_pairs.append(pair)
+            return mapped_pairs
+        return paired_batch_mapper
+    msg = 'The %s steps can not process paired reads' % type_
+    raise ValueError(msg)
+
+class _PairedStepFactory(object):
+    '''It creates the step function for paired reads.
+
+    It wraps the step function factory, it can be pickled and sent to the
+    multiprocessing workers like the factory.
+    '''
+    def __init__(self, function_factory, type_):
+        'It inits the class'
+        self.function_factory = function_factory
+        self.type_ = type_
+
+    def __call__(self, **arguments):
+        'It returns the paired step function'
+        return _create_paired_function(self.function_factory(**arguments),
+                                       self.type_)
+
+    def __repr__(self):
+        'The step cache and the checkpoints use it to identify the step'
+        return 'paired(%s)' % _canonical_repr(self.function_factory)
+
+def _pair_pipeline_steps(pipeline_steps):
+    'It returns the steps with their functions ready for the paired reads'
+    paired_steps = []
+    for analysis_step in pipeline_steps:
+        if analysis_step['type'] == 'bulk_processor':
+            msg = 'The bulk_processor step %s can not process paired reads'
+            raise ValueError(msg % _get_name_in_config(analysis_step))
+        analysis_step = analysis_step.copy()
+        analysis_step['function'] = _PairedStepFactory(
+                                                    analysis_step['function'],
+                                                    analysis_step['type'])
+        paired_steps.append(analysis_step)
+    return paired_steps
+
+def _get_batch_size(step):
+    'It returns the number of items given to a batch_mapper step in every list'
+    return step.get('batch_size', DEFAULT_BATCH_SIZE)
+
+def _run_steps_for_items(steps, items, cleaner_functions):
+    '''It runs a group of mapper, filter and batch_mapper steps for the items.
+
+    steps is a list of (step_name, step_type, batch_size) tuples. It returns a
+    list with the items that pass all the filters.
+    '''
+    for step_name, type_, batch_size in steps:
+        cleaner_function = cleaner_functions[step_name]
+        if type_ == 'mapper':
+            items = [cleaner_function(item) for item in items]
+        elif type_ == 'filter':
+            items = [item for item in items if cleaner_function(item)]
+        else:
+            items = list(chain.from_iterable(imap(cleaner_function,
+                                        group_in_batches(items, batch_size))))
+    return items
+
+#The cleaner functions are closures and they can not be pickled, every
+#multiprocessing worker creates them again from the step definitions
+_WORKER_CLEANER_FUNCTIONS = None
+_WORKER_STATS = None
+
+def _init_pipeline_worker(pipeline_steps, instrumented=False, cache=None):
+    'It creates the mapper and filter functions in a multiprocessing worker'
+    #pylint:disable-msg=W0603
+    global _WORKER_CLEANER_FUNCTIONS, _WORKER_STATS
+    step_types = ('mapper', 'filter', 'batch_mapper')
+    _WORKER_CLEANER_FUNCTIONS = _create_cleaner_functions(pipeline_steps,
+                                                        step_types=step_types,
+                                                        cache=cache)
+    if instrumented:
+        _WORKER_STATS = PipelineStats()
+        _WORKER_CLEANER_FUNCTIONS = _instrument_cleaner_functions(
+                                                pipeline_steps,
+                                                _WORKER_CLEANER_FUNCTIONS,
+                                                _WORKER_STATS)
+
+def _process_batch_in_worker(steps, items):
+    '''It processes a batch of items inside a multiprocessing worker.
+
+    It returns the processed items and the stats for this batch, if the worker
+    is instrumented.
+    '''
+    items = _run_steps_for_items(steps, items, _WORKER_CLEANER_FUNCTIONS)
+    if _WORKER_STATS is None:
+        return items, None
+    stats = copy.deepcopy(_WORKER_STATS)
+    _WORKER_STATS.reset()
+    return items, stats
+
+def _get_finished_result(pending_results, ordered):
+    '''It returns the result of one of the pending tasks.
+
+    If ordered is True the result of the oldest task is returned, otherwise the
+    first finished one.
+    '''
+    if ordered:
+        return pending_results.popleft().get()
+    while True:
+        for result in pending_results:
+            if result.ready():
+                pending_results.remove(result)
+                return result.get()
+        pending_results[0].wait(0.01)
+
+def _imap_in_pool(pool, function, tasks, max_tasks_in_flight, ordered=True):
+    '''It yields the results of running the function for every task in a pool.
+
+    Every task should be a tuple with the arguments for the function. Only
+    max_tasks_in_flight are sent to the pool at the same time, so the tasks
+    iterator is not consumed ahead of the results.
+    '''
+    pending_results = deque()
+    for task in tasks:
+        pending_results.append(pool.apply_async(function, task))
+        if len(pending_results) >= max_tasks_in_flight:
+            yield _get_finished_result(pending_results, ordered)
+    while pending_results:
+        yield _get_finished_result(pending_results, ordered)
+
+def _process_items_in_pool(pool, steps, items, batch_size, max_tasks_in_flight,
+                           ordered, stats=None):
+    '''It yields the items processed by the given mapper and filter steps.
+
+    The items are sent to the pool workers in batches. The stats sent back by
+    the workers are added to the given stats.
+    '''
+    tasks = ((steps, batch) for batch in group_in_batches(items, batch_size))
+    for processed_items, batch_stats in _imap_in_pool(pool,
+                                                      _process_batch_in_worker,
+                                                      tasks,
+                                                      max_tasks_in_flight,
+                                                      ordered):
+        if stats is not None and batch_stats is not None:
+            stats.merge(batch_stats)
+        for item in processed_items:
+            yield item
+
+def _terminate_pool_when_done(items, pool):
+    'It yields the given items and it terminates the pool once they are done'
+    try:
+        for item in items:
+            yield item
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _group_steps_for_pool(pipeline_steps):
+    '''It groups the consecutive mapper, filter and batch_mapper steps.
+
+    It returns a list of step groups. Every group is a list of
+    (step_name, step_type, batch_size) tuples or a bulk_processor step alone.
+    '''
+    groups = []
+    for analysis_step in pipeline_steps:
+        type_ = analysis_step['type']
+        step = (_get_name_in_config(analysis_step), type_,
+                _get_batch_size(analysis_step))
+        if type_ == 'bulk_processor':
+            groups.append([step])
+        elif groups and groups[-1][0][1] != 'bulk_processor':
+            groups[-1].append(step)
+        else:
+            groups.append([step])
+    return groups
+
+def _pipeline_builder(pipeline, items, configuration=None, processes=False,
+                      ordered=True, batch_size=DEFAULT_BATCH_SIZE, stats=None,
+                      checkpoint_dir=None, input_signature=None, cache=None,
+                      tool_threads=None, memory_budget=None, paired=False):
+    '''It runs all the analysis for the given pipeline.
+
+    It takes one or two input files and one or two output files. (Fasta files
+    with the sequence and quality).
+    If a checkpoint_dir is given every step will be run to completion and its
+    output items will be written in a file in that directory. A manifest
+    with the step configurations is kept. If the pipeline is run again with
+    the same configuration and input_signature it will resume after the last
+    completed step.
+    If processes is given the mapper and filter steps will be run in a pool of
+    processes. The items will be sent to the processes in batches of
+    batch_size items. By default the order of the items is kept, if ordered is
+    False the items will be yielded as soon as they are processed.
+    If a PipelineStats is given the items in and out and the time spent by
+    every step will be recorded in it.
+    If a StepResultCache is given the results of the mapper, filter and
+    batch_mapper steps will be taken from it when the same item has already
+    been processed by a step with the same configuration.
+    If tool_threads is given (True or the number of threads) and the steps are
+    not run in a pool of processes, the steps that run external programs will
+    keep that number of programs running at the same time.
+    If a memory_budget (in bytes) is given the bulk_processor steps will get
+    their items in a SpillingBuffer that is written to disk when the memory
+    used by the process exceeds it.
+    If paired is True every item should be a (mate1, mate2) tuple and the
+    steps will process both mates.
+    '''
+    if configuration is None:
+        configuration = {}
+    if pipeline is None:
+        return items
+    # We configure the pipeline depending on the sequences type and
+    # configuration parameters
+    pipeline_steps = configure_pipeline(pipeline, configuration)
+    if paired:
+        pipeline_steps = _pair_pipeline_steps(pipeline_steps)
+
+    for analysis_step in pipeline_steps:
+        msg = "Performing: %s" % analysis_step['comment']
+        logging.info(msg)
+        if stats is not None:
+            stats.get_step(_get_name_in_config(analysis_step),
+                           analysis_step['type'])
 
     #are we multiprocessing?
-    functs = _get_func_tools(processes)
+    num_processes = _get_num_processes(processes)
+    tool_threads = _get_num_tool_threads(tool_threads)
+    def build_steps(steps, items):
+        'It chains the given steps to process the items'
+        if num_processes is None:
+            return _build_serial_pipeline(steps, items, stats, cache,
+                                          tool_threads, memory_budget)
+        else:
+            return _build_multiprocessing_pipeline(steps, items, num_processes,
+                                                   ordered, batch_size, stats,
+                                                   cache, memory_budget)
+    if checkpoint_dir is None:
+        items = build_steps(pipeline_steps, items)
+    else:
+        items = _build_checkpointed_pipeline(pipeline_steps, items,
+                                             checkpoint_dir, input_signature,
+                                             build_steps)
+    logging.info('Done!')
+
+    return items
+
+CHECKPOINT_MANIFEST = 'manifest.json'
+
+def _canonical_repr(value):
+    '''It returns a repr that does not depend on the dict order.
+
+    The functions are represented by their names and the memory addresses are
+    removed, so the repr is the same in different runs.
+    '''
+    if isinstance(value, dict):
+        items = ['%s: %s' % (_canonical_repr(key), _canonical_repr(value_))
+                                       for key, value_ in sorted(value.items())]
+        return '{%s}' % ', '.join(items)
+    elif isinstance(value, (list, tuple)):
+        return '[%s]' % ', '.join([_canonical_repr(item) for item in value])
+    elif callable(value) and hasattr(value, '__name__'):
+        return '%s.%s' % (getattr(value, '__module__', None), value.__name__)
+    return re.sub(' at 0x[0-9a-fA-F]+', '', repr(value))
+
+def _step_cache_key(analysis_step):
+    'It returns a key that identifies the step configuration in the cache'
+    return _canonical_repr([_get_name_in_config(analysis_step),
+                            analysis_step['type'], analysis_step['function'],
+                            analysis_step['arguments']])
+
+def _checkpoint_keys(pipeline_steps, input_signature):
+    '''It returns a key for every step.
+
+    The key of a step depends on the input signature, the step configuration
+    and the configuration of all the previous steps.
+    '''
+    digest = hashlib.md5(_canonical_repr(input_signature))
+    keys = []
+    for analysis_step in pipeline_steps:
+        digest.update(_step_cache_key(analysis_step))
+        keys.append(digest.hexdigest())
+    return keys
+
+def _read_checkpoint_manifest(checkpoint_dir):
+    'It returns the completed steps found in the manifest'
+    fpath = os.path.join(checkpoint_dir, CHECKPOINT_MANIFEST)
+    if not os.path.exists(fpath):
+        return []
+    fhand = open(fpath)
+    try:
+        return json.load(fhand)['steps']
+    except ValueError:
+        logging.warning('Corrupted checkpoint manifest ignored: %s' % fpath)
+        return []
+    finally:
+        fhand.close()
+
+def _write_checkpoint_manifest(checkpoint_dir, completed_steps):
+    'It writes the manifest with the completed steps'
+    fpath = os.path.join(checkpoint_dir, CHECKPOINT_MANIFEST)
+    fhand = open(fpath + '.partial', 'w')
+    json.dump({'steps': completed_steps}, fhand, indent=4)
+    fhand.close()
+    os.rename(fpath + '.partial', fpath)
+
+def _write_checkpoint_items(items, fpath):
+    '''It writes the items in the given file and it returns the number written.
+
+    The file only gets its final name once all items have been written.
+    '''
+    fhand = open(fpath + '.partial', 'wb')
+    num_items = 0
+    for item in items:
+        pickle.dump(item, fhand, pickle.HIGHEST_PROTOCOL)
+        num_items += 1
+    fhand.close()
+    os.rename(fpath + '.partial', fpath)
+    return num_items
+
+def _read_checkpoint_items(fpath):
+    'It yields the items written in a checkpoint file'
+    fhand = open(fpath, 'rb')
+    while True:
+        try:
+            yield pickle.load(fhand)
+        except EOFError:
+            break
+    fhand.close()
+
+def _get_completed_checkpoints(checkpoint_dir, keys):
+    '''It returns the steps from the manifest that can be reused.
+
+    A step can be reused if its key has not changed and its file exists.
+    '''
+    completed_steps = []
+    for key, completed_step in zip(keys,
+                                   _read_checkpoint_manifest(checkpoint_dir)):
+        fpath = os.path.join(checkpoint_dir, completed_step['file'])
+        if completed_step['key'] != key or not os.path.exists(fpath):
+            break
+        completed_steps.append(completed_step)
+    return completed_steps
+
+def _build_checkpointed_pipeline(pipeline_steps, items, checkpoint_dir,
+                                 input_signature, build_steps):
+    '''It runs the steps one after the other saving the output of every step.
+
+    The steps already completed in a previous run with the same configuration
+    are not run again, the items are read from the last completed step.
+    build_steps should be a function that takes a list of steps and an item
+    iterator and that returns the processed items.
+    '''
+    if not os.path.exists(checkpoint_dir):
+        os.makedirs(checkpoint_dir)
+    keys = _checkpoint_keys(pipeline_steps, input_signature)
+    completed_steps = _get_completed_checkpoints(checkpoint_dir, keys)
+
+    if completed_steps:
+        msg = 'Resuming the pipeline after step: %s'
+        logging.info(msg % completed_steps[-1]['name'])
+        items = _read_checkpoint_items(os.path.join(checkpoint_dir,
+                                                 completed_steps[-1]['file']))
+    for index in range(len(completed_steps), len(pipeline_steps)):
+        analysis_step = pipeline_steps[index]
+        step_name = _get_name_in_config(analysis_step)
+        fname = 'step_%02d_%s.pickle' % (index, step_name)
+        fpath = os.path.join(checkpoint_dir, fname)
+        num_items = _write_checkpoint_items(build_steps([analysis_step],
+                                                        items), fpath)
+        completed_steps.append({'name': step_name,
+                                'type': analysis_step['type'],
+                                'arguments': _canonical_repr(
+                                                analysis_step['arguments']),
+                                'key': keys[index],
+                                'file': fname,
+                                'num_items': num_items})
+        _write_checkpoint_manifest(checkpoint_dir, completed_steps)
+        logging.info('Checkpoint written for step: %s' % step_name)
+        items = _read_checkpoint_items(fpath)
+    for item in items:
+        yield item
+
+def _filter_item(function, item):
+    'It returns the item and the result of the filter function for it'
+    return item, function(item)
+
+def _process_step_in_threads(pool, type_, function, items, num_threads,
+                             batch_size):
+    '''It yields the items processed by the step in a pool of threads.
+
+    Only num_threads calls to the step function are run at the same time and
+    the items are yielded in the input order.
+    '''
+    if type_ == 'batch_mapper':
+        tasks = ((batch,) for batch in group_in_batches(items, batch_size))
+        return chain.from_iterable(_imap_in_pool(pool, function, tasks,
+                                                 num_threads))
+    elif type_ == 'filter':
+        tasks = ((function, item) for item in items)
+        return (item for item, passed in _imap_in_pool(pool, _filter_item,
+                                                       tasks, num_threads)
+                                                                    if passed)
+    tasks = ((item,) for item in items)
+    return _imap_in_pool(pool, function, tasks, num_threads)
+
+def _get_num_tool_threads(tool_threads):
+    '''It returns the number of external programs to run at the same time.
+
+    It returns None if they should be run one after the other.
+    '''
+    if not tool_threads:
+        return None
+    tool_threads = get_num_threads(tool_threads)
+    return tool_threads if tool_threads > 1 else None
+
+def _build_serial_pipeline(pipeline_steps, items, stats=None, cache=None,
+                           tool_threads=None, memory_budget=None):
+    '''It chains the cleaner functions to process the items in this process.
+
+    If tool_threads is given the steps with external programs are run in a
+    pool with that number of threads.
+    '''
+    #we create all the cleaner functions
+    cleaner_functions = _create_cleaner_functions(pipeline_steps, cache=cache,
+                                                  memory_budget=memory_budget)
+    if stats is not None:
+        cleaner_functions = _instrument_cleaner_functions(pipeline_steps,
+                                                          cleaner_functions,
+                                                          stats)
 
     #now use use the cleaner functions using the mapper functions
+    pool = None
     for analysis_step in pipeline_steps:
         step_name = _get_name_in_config(analysis_step)
         cleaner_function = cleaner_functions[step_name]
         type_ = analysis_step['type']
-        if type_ == 'mapper':
-            filtered_items = functs['map'](cleaner_function, items)
+        if (tool_threads and type_ != 'bulk_processor' and
+            analysis_step.get('external_program', False)):
+            if pool is None:
+                pool = ThreadPool(tool_threads)
+            filtered_items = _process_step_in_threads(pool, type_,
+                                                cleaner_function, items,
+                                                tool_threads,
+                                                _get_batch_size(analysis_step))
+        elif type_ == 'mapper':
+            filtered_items = imap(cleaner_function, items)
         elif type_ == 'filter':
-            filtered_items = functs['filter'](cleaner_function, items)
+            filtered_items = ifilter(cleaner_function, items)
+        elif type_ == 'batch_mapper':
+            batches = group_in_batches(items, _get_batch_size(analysis_step))
+            filtered_items = chain.from_iterable(imap(cleaner_function,
+                                                      batches))
         elif type_ == 'bulk_processor':
             filtered_items = cleaner_function(items)
         items = filtered_items
 
         msg = "Analysis step prepared: %s" % analysis_step['comment']
         logging.info(msg)
+    if pool is not None:
+        items = _terminate_pool_when_done(items, pool)
+    return items
 
-    logging.info('Done!')
+def _build_multiprocessing_pipeline(pipeline_steps, items, num_processes,
+                                    ordered, batch_size, stats=None,
+                                    cache=None, memory_budget=None):
+    '''It chains the cleaner functions to process the items in a process pool.
 
-    return items
+    The mapper and filter steps are run by the pool workers, the bulk
+    processors are run in this process.
+    '''
+    cleaner_functions = _create_cleaner_functions(pipeline_steps,
+                                            step_types=('bulk_processor',),
+                                            memory_budget=memory_budget)
+    if stats is not None:
+        cleaner_functions = _instrument_cleaner_functions(pipeline_steps,
+                                                          cleaner_functions,
+                                                          stats)
+    pool = multiprocessing.Pool(num_processes,
+                                initializer=_init_pipeline_worker,
+                                initargs=(pipeline_steps, stats is not None,
+                                          cache))
+    max_tasks_in_flight = num_processes * 2
+    for steps in _group_steps_for_pool(pipeline_steps):
+        step_name, type_ = steps[0][:2]
+        if type_ == 'bulk_processor':
+            items = cleaner_functions[step_name](items)
+        else:
+            items = _process_items_in_pool(pool, steps, items, batch_size,
+                                           max_tasks_in_flight, ordered, stats)
+    logging.info('Analysis steps prepared for %d processes' % num_processes)
+    return _terminate_pool_when_done(items, pool)
 
-def process_sequences_for_script(in_fpath_seq, file_format, pipeline,
-                                 configuration, out_fpath, in_fpath_qual=None):
-    '''It returns a repr file with the processed sequences
+def _process_file_section(in_fpath_seqs, in_fpath_qual, section, file_format,
+                          pipeline, configuration, out_queue, batch_size,
+                          instrumented=False, cache=None, tool_threads=None,
+                          memory_budget=None, compact_reads=False,
+                          paired=False, in_fpath_mates=None):
+    '''It processes the sequences found in a section of the input files.
 
-    The pipeline and configuration should be pickled object.
+    It runs in a worker process and it puts the processed sequences in the
+    out_queue in batches. Once it has finished it puts the stats, if it is
+    instrumented, and a done message. If there is an error the traceback is
+    sent.
     '''
-    pipeline = pickle.loads(pipeline)
-    configuration = pickle.loads(configuration)
-    #the pipeline is now a list of strs we should convert it into a list of
-    #dicts
-    steps = dict([(step['name'], step) for step in STEPS])
-    #the pipeline step do not have real functions because they were not
-    #pickeable, so we have to put the functions again in the steps
-    for step in pipeline:
-        step_name = step['name']
-        step['function'] = steps[step_name]['function']
+    try:
+        if in_fpath_qual is None and in_fpath_mates is None:
+            seq_section, other_section = section, None
+        else:
+            seq_section, other_section = section
+        in_fhand_seqs = FileSection(open_compressed_file(in_fpath_seqs),
+                                    *seq_section)
+        in_fhand_qual, in_fhand_mates = None, None
+        if in_fpath_qual is not None:
+            in_fhand_qual = FileSection(open_compressed_file(in_fpath_qual),
+                                        *other_section)
+        elif in_fpath_mates is not None:
+            in_fhand_mates = FileSection(open_compressed_file(in_fpath_mates),
+                                         *other_section)
+        stats = PipelineStats() if instrumented else None
+        processed_seqs = _process_sequences(in_fhand_seqs, in_fhand_qual,
+                                            file_format, pipeline,
+                                            configuration, stats=stats,
+                                            cache=cache,
+                                            tool_threads=tool_threads,
+                                            memory_budget=memory_budget,
+                                            compact_reads=compact_reads,
+                                            paired=paired,
+                                            in_fhand_mates=in_fhand_mates)
+        for batch in group_in_batches(processed_seqs, batch_size):
+            out_queue.put(('seqs', batch))
+        if stats is not None:
+            stats.peak_memory = get_peak_memory_usage()
+            out_queue.put(('stats', stats))
+        out_queue.put(('done', None))
+    except Exception:
+        out_queue.put(('error', traceback.format_exc()))
 
-    if in_fpath_qual:
-        in_fhand_qual = open(in_fpath_qual)
-    else:
-        in_fhand_qual = None
-    processed_seqs = _process_sequences(open(in_fpath_seq),
-                                        in_fhand_qual=in_fhand_qual,
-                                        file_format=file_format,
-                                        pipeline=pipeline,
-                                        configuration=configuration)
-    #now we write all seq in the file
-    out_fhand = open(out_fpath, 'a')
-    writer = SequenceWriter(fhand=out_fhand,
-                            file_format='pickle')
-    for sequence in processed_seqs:
-        writer.write(sequence)
-    out_fhand.close()
+def _get_from_worker(out_queue, process):
+    'It returns the next message sent by the worker process'
+    while True:
+        try:
+            return out_queue.get(timeout=1)
+        except Queue.Empty:
+            if not process.is_alive() and out_queue.empty():
+                msg = 'A sequence processing worker died unexpectedly'
+                raise RuntimeError(msg)
+
+def _collect_processed_sections(workers, stats=None):
+    '''It yields the sequences processed by the workers.
+
+    The sequences are yielded in the order of the file sections. The stats
+    sent by the workers are added to the given stats.
+    '''
+    try:
+        for process, out_queue in workers:
+            while True:
+                kind, content = _get_from_worker(out_queue, process)
+                if kind == 'seqs':
+                    for sequence in content:
+                        yield sequence
+                elif kind == 'stats':
+                    if stats is not None:
+                        stats.merge(content)
+                elif kind == 'done':
+                    break
+                else:
+                    msg = 'Processing sequences in parallel failed:\n'
+                    raise RuntimeError(msg + content)
+            process.join()
+    finally:
+        for process, out_queue in workers:
+            if process.is_alive():
+                process.terminate()
 
 def _parallel_process_sequences(in_fhand_seqs, in_fhand_qual, file_format,
-                                pipeline, configuration, processes):
+                                pipeline, configuration, processes,
+                                batch_size=DEFAULT_BATCH_SIZE, stats=None,
+                                cache=None, tool_threads=None,
+                                memory_budget=None, compact_reads=False,
+                                paired=False, in_fhand_mates=None):
     '''It returns a generator with the processed sequences
 
-    This function does the job calling an external script that does the
-    processing. For this calling uses psubprocess doing in fact the
-    parallelization
+    The input files are split in as many sections as processes. The sections
+    start and end at record boundaries and every worker process reads and
+    processes the sequences of its section. The processed sequences are sent
+    back to this process in batches and they are yielded in the input order.
+    Every worker waits once it has sent SECTION_QUEUE_SIZE batches that have
+    not been read yet.
+    The paired files are split keeping both mates of every pair in the same
+    section.
     '''
-    #we have to transform the pipeline list into a list of strs, otherwise
-    #it wouldn't be possible to send them to an external script.
-    str_pipeline = []
-    for step in pipeline:
-        str_step = copy.copy(step)
-        str_step['function'] = 'function'
-        str_pipeline.append(step)
-
-    #everything should be pickle because it will run with an external script
-    pipeline = pickle.dumps(pipeline)
-    configuration = pickle.dumps(configuration)
-
-    #we need a file that will be removed when the close is called in it
-    fhand, out_fpath = tempfile.mkstemp()
-    os.close(fhand)
-
-    #debug = 'function'
-    #debug = 'subprocess'
-    debug = False
-    if debug == 'function':
-        if in_fhand_qual:
-            process_sequences_for_script(in_fhand_seqs.name, file_format,
-                                         pipeline, configuration, out_fpath,
-                                         in_fpath_qual=in_fhand_qual.name)
-        else:
-            process_sequences_for_script(in_fhand_seqs.name, file_format,
-                                         pipeline, configuration, out_fpath)
+    if processes is True:
+        processes = multiprocessing.cpu_count()
+    if paired:
+        sections = paired_file_sections(in_fhand_seqs, file_format, processes,
+                                        mate_fhand=in_fhand_mates)
     else:
-        if in_fhand_qual and file_format == 'fasta':
-            splitter = '>'
-        elif file_format == 'fasta':
-            splitter = '>'
-        elif 'fastq' in file_format:
-            splitter = 'fastq'
-        elif file_format == 'repr':
-            splitter = 'SeqWithQual'
-        elif file_format in ('json', 'pickle'):
-            splitter = 'blank_line'
-        else:
-            if file_format:
-                msg = 'No parallel splitter for format ' + file_format
-            else:
-                msg = 'A file with an unknown format cannot be split'
-            raise NotImplementedError(msg)
-
-        cmd = [sys.executable]
-        cmd2 = os.path.join(franklin.__path__[0], 'process_sequences.py')
-        cmd.append(os.path.abspath(cmd2))
-        cmd.append(in_fhand_seqs.name)
-        if in_fhand_qual:
-            cmd.append(in_fhand_qual.name)
-        cmd.extend([file_format, pipeline, configuration, out_fpath,
-                    gettempdir()])
-
-        cmd_def = [{'options': 2, 'io': 'in', 'splitter':splitter},
-                   {'options':-2, 'io': 'out'}]
-        if in_fhand_qual:
-            cmd_def.append({'options': 3, 'io': 'in', 'splitter':splitter})
-
-        stdout = NamedTemporaryFile()
-        stderr = NamedTemporaryFile()
-        if debug == 'subprocess':
-            import subprocess
-            process = subprocess.Popen(cmd, stdout=stdout,
-                                        stderr=stderr)
-        else:
-            process = psubprocess.Popen(cmd, cmd_def=cmd_def,
-                                        stdout=stdout,
-                                        stderr=stderr,
-                                        splits=processes)
-        retcode = process.wait()
-        if retcode:
-            stdout = open(stdout.name).read()
-            stderr = open(stderr.name).read()
-            msg = 'Running process seqs script failed.\n stdout: %s\n stderr: %s\n' % (stdout, stderr)
-            raise RuntimeError(msg)
-        stdout.close()
-        stderr.close()
-    return seqs_in_file(DisposableFile(out_fpath), format='pickle')
+        sections = seq_file_sections(in_fhand_seqs, file_format, processes,
+                                     qual_fhand=in_fhand_qual)
+    in_fpath_qual = None if in_fhand_qual is None else in_fhand_qual.name
+    in_fpath_mates = None if in_fhand_mates is None else in_fhand_mates.name
+
+    workers = []
+    for section in sections:
+        #the queue is bounded, the workers of the following sections wait
+        #instead of keeping all their processed sequences in memory
+        out_queue = multiprocessing.Queue(maxsize=SECTION_QUEUE_SIZE)
+        process = multiprocessing.Process(target=_process_file_section,
+                                          args=(in_fhand_seqs.name,
+                                                in_fpath_qual, section,
+                                                file_format, pipeline,
+                                                configuration, out_queue,
+                                                batch_size,
+                                                stats is not None, cache,
+                                                tool_threads, memory_budget,
+                                                compact_reads, paired,
+                                                in_fpath_mates))
+        process.start()
+        workers.append((process, out_queue))
+    return _collect_processed_sections(workers, stats)
 
 def _process_sequences(in_fhand_seqs, in_fhand_qual, file_format, pipeline,
-                                          configuration):
-    'It returns a generator with the processed sequences'
-    sequences = seqs_in_file(in_fhand_seqs, in_fhand_qual, file_format)
+                                          configuration, stats=None,
+                                          processes=False, checkpoint_dir=None,
+                                          cache=None, tool_threads=None,
+                                          memory_budget=None,
+                                          compact_reads=False, paired=False,
+                                          in_fhand_mates=None):
+    '''It returns a generator with the processed sequences
+
+    The sequences are read as LazySeqWithQuality, so the qualities and
+    descriptions not used by the steps or the writers are never built. If
+    compact_reads is True they are read as CompactSeqWithQuality.
+    If paired is True (mate1, mate2) tuples are read from the seq and the
+    mates files, or from the seq file if the mates are interleaved.
+    '''
+    if paired:
+        sequences = paired_seqs_in_file(in_fhand_seqs, in_fhand_mates,
+                                        file_format, lazy=True,
+                                        compact=compact_reads)
+    else:
+        sequences = seqs_in_file(in_fhand_seqs, in_fhand_qual, file_format,
+                                 lazy=True, compact=compact_reads)
 
+    if checkpoint_dir is None:
+        input_signature = None
+    else:
+        input_signature = [_file_signature(fhand) for fhand in (in_fhand_seqs,
+                                                                in_fhand_qual,
+                                                                in_fhand_mates)
+                                                          if fhand is not None]
     # the pipeline that will process the generator is build
-    processed_seqs = _pipeline_builder(pipeline, sequences, configuration)
+    processed_seqs = _pipeline_builder(pipeline, sequences, configuration,
+                                       processes=processes, stats=stats,
+                                       checkpoint_dir=checkpoint_dir,
+                                       input_signature=input_signature,
+                                       cache=cache, tool_threads=tool_threads,
+                                       memory_budget=memory_budget,
+                                       paired=paired)
     return processed_seqs
 
+def _file_signature(fhand):
+    'It returns the path, size and modification time of a file'
+    fpath = os.path.abspath(fhand.name)
+    try:
+        stat = os.stat(fpath)
+    except OSError:
+        return [fpath]
+    return [fpath, stat.st_size, int(stat.st_mtime)]
+
+#the number of sequences waiting for every writer thread
+WRITER_QUEUE_SIZE = 200
+_NO_MORE_SEQS = object()
+
+def _write_from_queue(writer, queue, errors):
+    '''It writes the sequences taken from the queue until it gets the end mark.
+
+    If the writer fails the error is appended to the errors list and the
+    remaining sequences are taken from the queue without writing them, so the
+    thread putting them is never blocked.
+    '''
+    while True:
+        sequence = queue.get()
+        if sequence is _NO_MORE_SEQS:
+            break
+        if errors:
+            continue
+        try:
+            writer.write(sequence)
+        except Exception:
+            errors.append(sys.exc_info())
+
+def _write_seqs_in_threads(sequences, writers, queue_size=WRITER_QUEUE_SIZE):
+    '''It writes the sequences with every writer in its own thread.
+
+    Every writer thread gets the sequences from a queue with queue_size
+    sequences at most, so if a writer is slow the sequences are not
+    accumulated. The first error found in a writer is raised.
+    '''
+    errors = []
+    queues, threads = [], []
+    for writer in writers.values():
+        queue = Queue.Queue(maxsize=queue_size)
+        thread = threading.Thread(target=_write_from_queue,
+                                  args=(writer, queue, errors))
+        thread.daemon = True
+        thread.start()
+        queues.append(queue)
+        threads.append(thread)
+    try:
+        for sequence in sequences:
+            if errors:
+                break
+            for queue in queues:
+                queue.put(sequence)
+    finally:
+        for queue in queues:
+            queue.put(_NO_MORE_SEQS)
+        for thread in threads:
+            thread.join()
+    if errors:
+        error_class, error, trace = errors[0]
+        raise error_class, error, trace
+
 def seq_pipeline_runner(pipeline, configuration, in_fhands, file_format=None,
-                        writers=None, processes=False):
+                        writers=None, processes=False, stats=None,
+                        checkpoint_dir=None, cache=None, tool_threads=None,
+                        threaded_writers=False, memory_budget=None,
+                        compact_reads=False, paired=False):
 
     '''It runs all the analysis for the given sequence pipeline.
 
     It takes one or two input files and one or two output files. (Fasta files
     with the sequence and quality).
-    A working directory can be given in which the analysis intermediate files
-    will be created. If not given a temporary directory will be created that
-    will be removed once the analysis is completed.
-    If the checkpoints are requested an intermediate file for every step will be
-    created.
+    If a PipelineStats is given it will be filled with the items in and out
+    and the time spent by every step and a report will be logged.
+    If a checkpoint_dir is given the output of every step will be saved in it
+    and a new run with the same input files and configuration will resume
+    after the last completed step. In that case the input files are not split
+    and only the pipeline steps are run in parallel.
+    If a StepResultCache is given the step results already stored in it will
+    not be calculated again.
+    If tool_threads is given the steps with external programs will run that
+    number of programs at the same time in every process.
+    If threaded_writers is True every writer will write the sequences in its
+    own thread while the pipeline goes on.
+    If a memory_budget (in bytes) is given the bulk_processor steps will move
+    the sequences they hold to a temporary file when the memory used by every
+    process exceeds it. The peak memory used is logged at the end.
+    If compact_reads is True the sequences are read as CompactSeqWithQuality,
+    that use less memory, the pipeline steps should use only the interface
+    that they share with SeqWithQuality.
+    If paired is True the mates are read in lockstep from the in_seq and the
+    in_mates files, or from the in_seq file if they are interleaved, and
+    every pair is processed and written as one item, with a
+    PairedSequenceWriter. A pair is dropped if any of its mates is dropped,
+    so the output files keep the pairs.
+    The input files can be gzip or BGZF files. The BGZF files are split at
+    their block starts, the gzip files can not be split, so their sequences
+    are read in this process and only the pipeline steps are run in parallel.
     '''
     if isinstance(pipeline, str):
         pipeline = PIPELINES[pipeline]
 
-    if file_format is None:
-        file_format = guess_seq_file_format(in_fhands['in_seq'])
-
     # Here we extract our input/output files
-    in_fhand_seqs = in_fhands['in_seq']
+    in_fhand_seqs = uncompressed_fhand(in_fhands['in_seq'])
     if 'in_qual' in in_fhands:
-        in_fhand_qual = in_fhands['in_qual']
+        in_fhand_qual = uncompressed_fhand(in_fhands['in_qual'])
     else:
         in_fhand_qual = None
+    in_fhand_mates = in_fhands.get('in_mates', None)
+    if in_fhand_mates is not None:
+        in_fhand_mates = uncompressed_fhand(in_fhand_mates)
+
+    if file_format is None:
+        file_format = guess_seq_file_format(in_fhand_seqs)
+    if paired and in_fhand_qual is not None:
+        raise ValueError('The paired reads can not be read with a qual file')
 
     # Here the SeqRecord generator is created
     processes = None if processes == 1 else processes
-    if processes:
+    #an empty file has no format and there is nothing to split
+    splittable = all(has_random_access(fhand) for fhand in
+                             (in_fhand_seqs, in_fhand_qual, in_fhand_mates)
+                                                        if fhand is not None)
+    if (processes and file_format is not None and checkpoint_dir is None and
+        splittable):
         sequences = _parallel_process_sequences(in_fhand_seqs,
                                                 in_fhand_qual,
                                                 file_format, pipeline,
                                                 configuration,
-                                                processes)
+                                                processes, stats=stats,
+                                                cache=cache,
+                                                tool_threads=tool_threads,
+                                                memory_budget=memory_budget,
+                                                compact_reads=compact_reads,
+                                                paired=paired,
+                                                in_fhand_mates=in_fhand_mates)
     else:
         sequences = _process_sequences(in_fhand_seqs, in_fhand_qual,
                                        file_format, pipeline,
-                                       configuration)
+                                       configuration, stats=stats,
+                                       processes=processes,
+                                       checkpoint_dir=checkpoint_dir,
+                                       cache=cache, tool_threads=tool_threads,
+                                       memory_budget=memory_budget,
+                                       compact_reads=compact_reads,
+                                       paired=paired,
+                                       in_fhand_mates=in_fhand_mates)
 
     # The SeqRecord generator is consumed
-    for sequence in sequences:
-        for writer in writers.values():
-            writer.write(sequence)
+    if threaded_writers:
+        _write_seqs_in_threads(sequences, writers)
+    else:
+        for sequence in sequences:
+            for writer in writers.values():
+                writer.write(sequence)
 
     # Some of the writers needs to close in order to finish its work
     feature_counter = {}
@@ -354,4 +1283,10 @@ def seq_pipeline_runner(pipeline, configuration, in_fhands, file_format=None,
             writer.close()
         feature_counter[wtype] = writer.num_features
 
+    peak_memory = get_peak_memory_usage(children=True)
+    if stats is not None:
+        stats.peak_memory = max(stats.peak_memory, peak_memory)
+        logging.info(stats.report())
+    else:
+        logging.info('Peak memory: %.1f MB' % (peak_memory / 1024.0 ** 2))
     return feature_counter
@@ -19,13 +19,13 @@ Created on 03/12/2009
 # You should have received a copy of the GNU Affero General Public License
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
-from franklin.seq.seq_cleaner import (create_vector_striper,
-                                      create_adaptor_striper,
-                                      create_striper_by_quality,
+from franklin.seq.seq_cleaner import (create_batch_vector_striper,
+                                      create_batch_adaptor_striper,
+                                      create_batch_striper_by_quality,
                                       create_striper_by_quality_lucy,
-                                      create_striper_by_quality_trimpoly,
-                                      create_masker_for_polia,
-                                      create_masker_for_low_complexity,
+                                      create_batch_striper_by_quality_trimpoly,
+                                      create_batch_masker_for_polia,
+                                      create_batch_masker_for_low_complexity,
                                       create_re_word_striper,
                                       create_edge_stripper, create_upper_mapper,
                                       create_seq_trim_and_masker,
@@ -33,11 +33,12 @@ from franklin.seq.seq_cleaner import (create_vector_striper,
 
 from franklin.seq.seq_filters import (create_length_filter,
                                       create_solid_quality_filter,
-                                      create_similar_seqs_filter)
+                                      create_batch_similar_seqs_filter)
 
-filter_similar_seqs = {'function':create_similar_seqs_filter,
+filter_similar_seqs = {'function':create_batch_similar_seqs_filter,
            'arguments':{'db': None, 'blast_program':None},
-           'type': 'filter',
+           'type': 'batch_mapper',
+           'external_program': True,
            'name': 'filter_similar_seqs',
            'comment': 'It filters similar seqs from a reads database'}
 
@@ -54,39 +55,42 @@ up_case = {'function':create_upper_mapper,
            'comment': 'It convers the sequence to upper case'}
 
 #pylint:disable-msg=C0103
-remove_vectors_blastdb = {'function':create_vector_striper,
+remove_vectors_blastdb = {'function':create_batch_vector_striper,
                           'arguments':{'vectors':None,
-                                       'vectors_are_blastdb':True},
-                          'type': 'mapper',
+                                       'vectors_are_blastdb':True,
+                                       'vector_index':False},
+                          'type': 'batch_mapper',
+                          'external_program': True,
                           'name': 'remove_vectors_blastdb',
                           'comment': 'Remove vector using vector db'}
-remove_vectors_file = {'function':create_vector_striper,
+remove_vectors_file = {'function':create_batch_vector_striper,
                        'arguments':{'vectors':None,
                                     'vectors_are_blastdb':False},
-                       'type': 'mapper',
+                       'type': 'batch_mapper',
+                       'external_program': True,
                        'name': 'remove_vectors_file',
                        'comment': 'Remove vector using vector db'}
 
-remove_adaptors = {'function':create_adaptor_striper,
+remove_adaptors = {'function':create_batch_adaptor_striper,
                    'arguments':{'adaptors':None},
-                   'type': 'mapper',
+                   'type': 'batch_mapper',
                    'name': 'remove_adaptors',
                    'comment': 'Remove adaptors'}
 
-strip_quality = {'function': create_striper_by_quality,
+strip_quality = {'function': create_batch_striper_by_quality,
                       'arguments':{'quality_treshold':20,
                                    'quality_window_width':1,
                                    'only_3_end':False},
 #min_quality_bases=None, min_seq_length=None, quality_window_width=None },
-                      'type':'mapper',
+                      'type':'batch_mapper',
                       'name':'strip_quality',
                       'comment':'Strip low quality with our algorithm'}
-strip_quality_3 = {'function': create_striper_by_quality,
+strip_quality_3 = {'function': create_batch_striper_by_quality,
                       'arguments':{'quality_treshold':20,
                                    'quality_window_width':1,
                                    'only_3_end':True},
 #min_quality_bases=None, min_seq_length=None, quality_window_width=None },
-                      'type':'mapper',
+                      'type':'batch_mapper',
                       'name':'strip_quality',
                     'comment':"Strip low quality from 3 end with our algorithm"}
 
@@ -96,22 +100,24 @@ strip_quality_lucy = {'function': create_striper_by_quality_lucy,
                       'name':'strip_lucy',
                       'comment':'Strip low quality with lucy'}
 
-strip_quality_by_n = {'function': create_striper_by_quality_trimpoly,
+strip_quality_by_n = {'function': create_batch_striper_by_quality_trimpoly,
                           'arguments': {},
-                          'type':'mapper',
+                          'type':'batch_mapper',
+                          'external_program': True,
                           'name':'strip_trimpoly',
                           'comment':'Strip low quality with trimpoly'}
 
-mask_polia         = {'function': create_masker_for_polia,
+mask_polia         = {'function': create_batch_masker_for_polia,
                        'arguments': {},
-                       'type':'mapper',
+                       'type':'batch_mapper',
+                       'external_program': True,
                        'name':'mask_polia',
                        'comment':'Mask poli A regions'}
 
 
-mask_low_complexity = {'function': create_masker_for_low_complexity,
+mask_low_complexity = {'function': create_batch_masker_for_low_complexity,
                        'arguments': {},
-                       'type':'mapper',
+                       'type':'batch_mapper',
                        'name':'mask_low_complex',
                        'comment':'Mask low complexity regions'}
 
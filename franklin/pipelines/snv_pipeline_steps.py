@@ -51,6 +51,7 @@ unique_contiguous_region_filter = {
           'arguments':{'distance':60, 'genomic_db':None,
                         'genomic_seqs_fpath':None},
           'type':'filter',
+          'external_program': True,
           'name':'uniq_contiguous',
           'comment': 'A blast in the near region gave several matches'}
 
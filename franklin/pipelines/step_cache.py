@@ -0,0 +1,302 @@
+'''
+A persistent cache for the results of the pipeline steps.
+
+The results of the mapper, filter and batch_mapper steps are stored in an
+sqlite database. The key of every result is a hash of the step configuration
+(name, function and arguments) and of the whole item state, so the sequence,
+its quality and every annotation added by the previous steps are taken into
+account. When the same item gets to the same step with the same configuration
+the stored result is returned without running the step function.
+
+The cache has a maximum size, the least recently used results are removed when
+it is exceeded.
+
+Created on 17/10/2026
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import os, time, hashlib, sqlite3, logging, thread
+import cPickle as pickle
+
+#the default maximum size of the cache in bytes
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+#when the cache is full it is emptied until this fraction of its maximum size
+EVICTION_WATERMARK = 0.9
+#every how many writes the size of the database is checked
+SIZE_CHECK_INTERVAL = 1000
+
+_SCHEMA = '''CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY,
+                                                 value BLOB,
+                                                 size INTEGER,
+                                                 used REAL)'''
+
+class StepResultCache(object):
+    '''It stores the step results in an sqlite database with a maximum size.
+
+    The object can be given to several processes and threads, every process
+    and thread opens its own connection to the database.
+    '''
+    def __init__(self, fpath, max_size=DEFAULT_CACHE_SIZE):
+        'It inits the cache, the database file will be created if required'
+        self.fpath = fpath
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._connections = {}
+        self._size = 0
+        self._writes = 0
+
+    def __getstate__(self):
+        'The connections are not pickled'
+        state = self.__dict__.copy()
+        state['_connections'] = {}
+        return state
+
+    def _get_connection(self):
+        'It returns the connection to the database for this process and thread'
+        owner = os.getpid(), thread.get_ident()
+        connection = self._connections.get(owner, None)
+        if connection is None:
+            dirname = os.path.dirname(self.fpath)
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname)
+            connection = sqlite3.connect(self.fpath, timeout=60,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(_SCHEMA)
+            connection.execute('''CREATE INDEX IF NOT EXISTS results_used
+                                  ON results (used)''')
+            self._connections[owner] = connection
+            self._size = self._get_db_size()
+        return connection
+
+    def _get_db_size(self):
+        'It returns the size of all the stored results'
+        connection = self._get_connection()
+        cursor = connection.execute('''SELECT COALESCE(SUM(size), 0)
+                                       FROM results''')
+        return cursor.fetchone()[0]
+
+    def get(self, key):
+        '''It returns the stored value for the given key.
+
+        It returns a tuple with a boolean that tells if the key was found and
+        the value.
+        '''
+        connection = self._get_connection()
+        row = connection.execute('SELECT value FROM results WHERE key = ?',
+                                 (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        connection.execute('UPDATE results SET used = ? WHERE key = ?',
+                           (time.time(), key))
+        return True, pickle.loads(str(row[0]))
+
+    def set(self, key, value):
+        'It stores the value for the given key'
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        size = len(value)
+        if size > self.max_size:
+            return
+        connection = self._get_connection()
+        connection.execute('''INSERT OR REPLACE INTO results
+                              (key, value, size, used) VALUES (?, ?, ?, ?)''',
+                           (key, sqlite3.Binary(value), size, time.time()))
+        self._size += size
+        self._writes += 1
+        #the other processes could also be writing in the database
+        if (self._size > self.max_size or
+            not self._writes % SIZE_CHECK_INTERVAL):
+            self._size = self._get_db_size()
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        'It removes the least recently used results until the cache fits'
+        to_free = self._size - int(self.max_size * EVICTION_WATERMARK)
+        connection = self._get_connection()
+        cursor = connection.execute(
+                               'SELECT key, size FROM results ORDER BY used')
+        keys = []
+        for key, size in cursor:
+            if to_free <= 0:
+                break
+            keys.append((key,))
+            to_free -= size
+            self._size -= size
+        cursor.close()
+        connection.executemany('DELETE FROM results WHERE key = ?', keys)
+        logging.info('%d results removed from the step cache' % len(keys))
+
+    def __len__(self):
+        'It returns the number of stored results'
+        connection = self._get_connection()
+        return connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def clear(self):
+        'It removes all the stored results'
+        self._get_connection().execute('DELETE FROM results')
+        self._size = 0
+
+    def close(self):
+        'It closes the connection to the database of this process and thread'
+        owner = os.getpid(), thread.get_ident()
+        connection = self._connections.pop(owner, None)
+        if connection is not None:
+            connection.close()
+
+_PLAIN_TYPES = (basestring, int, long, float, bool, type(None))
+
+def _canonical_state(value):
+    '''It returns a string with the state of the value.
+
+    Two equal values give the same string regardless of the order in which
+    the items were added to their dicts.
+    '''
+    if isinstance(value, _PLAIN_TYPES):
+        return repr(value)
+    elif isinstance(value, dict):
+        items = [(_canonical_state(key), _canonical_state(value_))
+                                             for key, value_ in value.items()]
+        return '{%s}' % ','.join(['%s:%s' % item for item in sorted(items)])
+    elif isinstance(value, (set, frozenset)):
+        return 'set(%s)' % ','.join(sorted([_canonical_state(item)
+                                                        for item in value]))
+    elif isinstance(value, (list, tuple)):
+        return '[%s]' % ','.join([_canonical_state(item) for item in value])
+    elif hasattr(value, '__dict__'):
+        #the lazy sequences should have all their parts built
+        if hasattr(value, 'materialize'):
+            value.materialize()
+        return '%s%s' % (value.__class__.__name__,
+                         _canonical_state(value.__dict__))
+    elif hasattr(value, '__slots__') and hasattr(value, '__getstate__'):
+        #the compact sequences have no __dict__
+        return '%s%s' % (value.__class__.__name__,
+                         _canonical_state(value.__getstate__()))
+    return repr(value)
+
+def _get_item_key(step_key, item):
+    '''It returns the key for the result of the given step for the item.
+
+    It returns None if the item is None.
+    '''
+    if item is None:
+        return None
+    return hashlib.md5(step_key + _canonical_state(item)).hexdigest()
+
+def _update_item(item, changed_item):
+    'It copies the changes done by a filter in the item'
+    if changed_item is None:
+        return
+    if isinstance(item, tuple):
+        #the paired reads
+        for mate, changed_mate in zip(item, changed_item):
+            _update_item(mate, changed_mate)
+    elif hasattr(item, '__dict__'):
+        item.__dict__.update(changed_item.__dict__)
+    else:
+        item.__setstate__(changed_item.__getstate__())
+
+def _create_cached_mapper(function, step_key, cache):
+    'It returns a mapper that looks for its results in the cache'
+    def cached_mapper(item):
+        'It returns the cached result or it runs the mapper'
+        key = _get_item_key(step_key, item)
+        if key is None:
+            return function(item)
+        found, result = cache.get(key)
+        if not found:
+            result = function(item)
+            cache.set(key, result)
+        return result
+    return cached_mapper
+
+def _create_cached_filter(function, step_key, cache):
+    '''It returns a filter that looks for its results in the cache.
+
+    Some filters annotate the item they check, these changes are also stored.
+    '''
+    def cached_filter(item):
+        'It returns the cached result or it runs the filter'
+        key = _get_item_key(step_key, item)
+        if key is None:
+            return function(item)
+        found, result = cache.get(key)
+        if found:
+            result, changed_item = result
+            _update_item(item, changed_item)
+            return result
+        result = bool(function(item))
+        if _get_item_key(step_key, item) == key:
+            changed_item = None
+        else:
+            changed_item = item
+        cache.set(key, (result, changed_item))
+        return result
+    return cached_filter
+
+def _create_cached_batch_mapper(function, step_key, cache):
+    '''It returns a batch_mapper that looks for its results in the cache.
+
+    Only the items not found in the cache are given to the step function.
+    It should return one result for every item, otherwise a ValueError is
+    raised and nothing is cached.
+    '''
+    def cached_batch_mapper(items):
+        'It returns the cached results and it runs the batch for the rest'
+        results = [None] * len(items)
+        missing_items, missing_indexes, missing_keys = [], [], []
+        for index, item in enumerate(items):
+            key = _get_item_key(step_key, item)
+            if key is not None:
+                found, result = cache.get(key)
+                if found:
+                    results[index] = result
+                    continue
+            missing_items.append(item)
+            missing_indexes.append(index)
+            missing_keys.append(key)
+        if missing_items:
+            missing_results = list(function(missing_items))
+            if len(missing_results) != len(missing_items):
+                msg = 'A batch_mapper step changed the number of items'
+                raise ValueError(msg)
+            for index, key, result in zip(missing_indexes, missing_keys,
+                                          missing_results):
+                results[index] = result
+                if key is not None:
+                    cache.set(key, result)
+        return results
+    return cached_batch_mapper
+
+def create_cached_step_function(function, step_type, step_key, cache):
+    '''It returns the step function wrapped to use the cache.
+
+    The step_key should identify the step configuration. The bulk_processor
+    steps are not cached.
+    '''
+    if step_type == 'mapper':
+        return _create_cached_mapper(function, step_key, cache)
+    elif step_type == 'filter':
+        return _create_cached_filter(function, step_key, cache)
+    elif step_type == 'batch_mapper':
+        return _create_cached_batch_mapper(function, step_key, cache)
+    return function
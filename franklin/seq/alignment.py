@@ -8,6 +8,7 @@ from __future__ import division
 import re
 
 from Bio.pairwise2 import align
+from Bio.Seq import UnknownSeq
 
 from franklin.seq.alignment_result import (get_alignment_parser,
                                            filter_alignments,
@@ -15,6 +16,8 @@ from franklin.seq.alignment_result import (get_alignment_parser,
 from franklin.utils.cmd_utils import create_runner
 from franklin.seq.writers import temp_fasta_file
 from franklin.seq.readers import seqs_in_file
+from franklin.seq.seqs import SeqWithQuality, reverse_complement_str
+from franklin.seq.word_matcher import WordMatcher
 
 def _seq_to_fasta_fhand(seq):
     'Given a fhand or Seq object it returns a fhand'
@@ -98,6 +101,7 @@ def _seq_to_seqwithqualities(seq):
         return list(seqs_in_file(seq))
     if not isinstance(seq, list) and not isinstance(seq, tuple):
         return [seq]
+    return list(seq)
 
 def match_parts_from_biopython_alignment(alignments, query_strand,
                                          subject_strand):
@@ -192,6 +196,261 @@ class SWAligner(object):
         return alignments
 
 
+#the mismatch penalty of blastn-short, the first one tried in the extensions
+_EXTENSION_PENALTY = 3
+
+def _local_alignment(query, subject, penalty, min_diagonal, max_diagonal):
+    '''It returns the best local alignment between the query and the subject.
+
+    Every match scores one and every mismatch and every gap position costs
+    the penalty. Only the cells with a diagonal, the query index minus the
+    subject index, from min_diagonal to max_diagonal are aligned. It returns
+    a (query_start, query_end, subject_start, subject_end, matches, columns)
+    tuple with the ends included or None.
+    '''
+    query_length = len(query)
+    width = max_diagonal - min_diagonal + 1
+    best = None
+    best_score = 0
+    #every subject row is held in lists indexed by the diagonal minus the
+    #min_diagonal, the diagonal cell is in the same index of the previous
+    #row. The cells with a score of 0 are not part of any alignment
+    prev_row = [[0] * (width + 1) for index in range(5)]
+    for subject_index, subject_letter in enumerate(subject):
+        row = [[0] * (width + 1) for index in range(5)]
+        scores, query_starts, subject_starts, matches, columns = row
+        (prev_scores, prev_query_starts, prev_subject_starts, prev_matches,
+                                                      prev_columns) = prev_row
+        first_query = subject_index + min_diagonal
+        for band_index in range(max(0, -first_query),
+                                min(width, query_length - first_query)):
+            query_index = first_query + band_index
+            cell = None
+            score = prev_scores[band_index]
+            if query[query_index] == subject_letter:
+                if score:
+                    cell = band_index, score + 1, prev_row, 1
+                else:
+                    cell = band_index, 1, None, 1
+            elif score > penalty:
+                cell = band_index, score - penalty, prev_row, 0
+            #a query letter aligned with a gap
+            score = scores[band_index - 1] if band_index else 0
+            if score > penalty and (cell is None or
+                                    score - penalty > cell[1]):
+                cell = band_index - 1, score - penalty, row, 0
+            #a subject letter aligned with a gap
+            score = prev_scores[band_index + 1]
+            if score > penalty and (cell is None or
+                                    score - penalty > cell[1]):
+                cell = band_index + 1, score - penalty, prev_row, 0
+            if cell is None:
+                continue
+            from_index, score, from_row, match = cell
+            scores[band_index] = score
+            if from_row is None:
+                query_starts[band_index] = query_index
+                subject_starts[band_index] = subject_index
+                columns[band_index] = matches[band_index] = 1
+            else:
+                query_starts[band_index] = from_row[1][from_index]
+                subject_starts[band_index] = from_row[2][from_index]
+                matches[band_index] = from_row[3][from_index] + match
+                columns[band_index] = from_row[4][from_index] + 1
+            if score > best_score:
+                best_score = score
+                best = (query_starts[band_index], query_index,
+                        subject_starts[band_index], subject_index,
+                        matches[band_index], columns[band_index])
+        prev_row = row
+    return best
+
+def _cluster_diagonals(diagonals, max_distance):
+    'It groups the sorted diagonals that are close to each other'
+    clusters = []
+    for diagonal in diagonals:
+        if clusters and diagonal - clusters[-1][1] <= max_distance:
+            clusters[-1][1] = diagonal
+        else:
+            clusters.append([diagonal, diagonal])
+    return clusters
+
+def _contains(match_part, other):
+    'It returns True if the match_part includes the other one'
+    return (match_part['subject_strand'] == other['subject_strand'] and
+            match_part['query_start'] <= other['query_start'] and
+            match_part['query_end'] >= other['query_end'] and
+            match_part['subject_start'] <= other['subject_start'] and
+            match_part['subject_end'] >= other['subject_end'])
+
+class SeedAligner(object):
+    '''An aligner that looks for short subjects in the queries in process.
+
+    The words of the subjects and of their reverse complements are indexed.
+    The words found in the query are extended with a local alignment, so
+    the parts of the subjects are also found, in the middle of the query or
+    cut by its ends. The best sub-alignment with at least min_length
+    subject residues and no more than max_error_rate errors is reported if
+    its score, with the blastn-short reward and penalty, reaches min_score.
+    '''
+    def __init__(self, subject, parameters=None, filters=None):
+        '''It inits the class.
+
+        subject could be a fhand (fasta), a sequence or a list of them.
+        The parameters are the word_size, the max_error_rate, the
+        min_length of the subject part aligned in the query and the
+        min_score.
+        '''
+        if parameters is None:
+            parameters = {}
+        self._word_size = parameters.get('word_size', 7)
+        self._min_length = parameters.get('min_length', 13)
+        self._max_error_rate = parameters.get('max_error_rate', 0.11)
+        self._min_score = parameters.get('min_score', 14)
+        self._filters = filters
+
+        self._targets = []
+        self._words = {}
+        for subject in _seq_to_seqwithqualities(subject):
+            str_seq = str(subject.seq).upper()
+            strands = [(1, str_seq)]
+            rev_str_seq = reverse_complement_str(str_seq)
+            if rev_str_seq != str_seq:
+                strands.append((-1, rev_str_seq))
+            for strand, target in strands:
+                self._add_target(subject, strand, target)
+
+    def _add_target(self, subject, strand, target):
+        '''It indexes the words of one subject strand.
+
+        The local alignments are tried first with the blastn-short penalty.
+        If the error rate is too high they are tried again with a penalty
+        that only allows the alignments within the max_error_rate.
+        '''
+        length = len(target)
+        max_error_rate = self._max_error_rate
+        if max_error_rate > 0:
+            penalty = (1 - max_error_rate) / max_error_rate
+        else:
+            penalty = length + 1
+        penalties = [min(_EXTENSION_PENALTY, penalty)]
+        if penalty > _EXTENSION_PENALTY:
+            penalties.append(penalty)
+        #the columns of an alignment include the inserted query letters
+        if max_error_rate < 1:
+            max_errors = int(length * max_error_rate / (1 - max_error_rate))
+        else:
+            max_errors = length
+        target_index = len(self._targets)
+        self._targets.append({'subject': subject,
+                              'strand': strand,
+                              'seq': target,
+                              'length': length,
+                              'max_errors': max_errors,
+                              'penalties': penalties})
+        word_size = self._word_size
+        for offset in range(length - word_size + 1):
+            word = target[offset: offset + word_size]
+            if word not in self._words:
+                self._words[word] = []
+            self._words[word].append((target_index, offset))
+
+    def _extend_seed(self, str_query, target, diagonals):
+        '''It returns the match_part found around the given diagonals.
+
+        Only a band of diagonals around them is aligned, the alignments
+        within the max_error_rate can not have more indels than max_errors.
+        '''
+        max_errors = target['max_errors']
+        min_diagonal = diagonals[0] - max_errors
+        max_diagonal = diagonals[1] + max_errors
+        for penalty in target['penalties']:
+            alignment = _local_alignment(str_query, target['seq'], penalty,
+                                         min_diagonal, max_diagonal)
+            if alignment is None:
+                return None
+            (query_start, query_end, subject_start, subject_end, matches,
+                                                           columns) = alignment
+            #a higher penalty would not give a longer alignment
+            if subject_end - subject_start + 1 < self._min_length:
+                return None
+            if columns - matches <= columns * self._max_error_rate:
+                break
+        else:
+            return None
+        errors = columns - matches
+        if matches - errors * _EXTENSION_PENALTY < self._min_score:
+            return None
+        return {'query_start':   query_start,
+                'query_end':     query_end,
+                'query_strand':  1,
+                'subject_start': subject_start,
+                'subject_end':   subject_end,
+                'subject_strand':target['strand'],
+                'scores':{'identity': matches / columns * 100}}
+
+    def _align(self, query):
+        'It returns the alignment for one query or None'
+        str_query = str(query.seq).upper()
+        query_length = len(str_query)
+        word_size = self._word_size
+        diagonals = {}
+        for pos in range(query_length - word_size + 1):
+            word = str_query[pos: pos + word_size]
+            for target_index, offset in self._words.get(word, []):
+                if target_index not in diagonals:
+                    diagonals[target_index] = set()
+                diagonals[target_index].add(pos - offset)
+        if not diagonals:
+            return None
+
+        matches = {}
+        for target_index in sorted(diagonals):
+            target = self._targets[target_index]
+            clusters = _cluster_diagonals(sorted(diagonals[target_index]),
+                                          target['max_errors'])
+            for cluster in clusters:
+                match_part = self._extend_seed(str_query, target, cluster)
+                if match_part is None:
+                    continue
+                subject = target['subject']
+                if id(subject) not in matches:
+                    matches[id(subject)] = {'subject': subject,
+                                            'match_parts': []}
+                match_parts = matches[id(subject)]['match_parts']
+                #the clusters near a hit can find a part of it
+                match_parts[:] = [part for part in match_parts
+                                  if not _contains(match_part, part)]
+                if not any(_contains(part, match_part)
+                                                   for part in match_parts):
+                    match_parts.append(match_part)
+        if not matches:
+            return None
+        matches = matches.values()
+        for match in matches:
+            match['match_parts'].sort(key=lambda x: x['scores']['identity'],
+                                      reverse=True)
+        #the query is given as in the blast results
+        query = SeqWithQuality(name=query.name,
+                               seq=UnknownSeq(length=query_length))
+        alignment = {'query': query, 'matches': matches}
+        return _fix_matches(alignment, score_keys=['identity'])
+
+    def do_alignment(self, query):
+        '''It returns the alignments for the query.
+
+        The query can be a sequence or a list of sequences.
+        '''
+        alignments = []
+        for seq in _seq_to_seqwithqualities(query):
+            alignment = self._align(seq)
+            if alignment is not None:
+                alignments.append(alignment)
+        if self._filters is not None:
+            alignments = filter_alignments(alignments, config=self._filters)
+        return alignments
+
+
 def _build_match_parts(matches, query_strand, subj_strand):
     'Given a list of matches it returns a list of match parts dicts'
 
@@ -208,38 +467,6 @@ def _build_match_parts(matches, query_strand, subj_strand):
     return match_parts
 
 
-def _find_matches(string, word):
-    'It returns the spans covered for the word matches in the string'
-    matches = set()
-    for match in re.finditer(word, string, re.IGNORECASE):
-        match = match.span()
-        matches.add((match[0], match[1] - 1))
-    return matches
-
-def _reverse_locations(locations, len_string):
-    'It transforms the coordinates into the reverse complementary ones'
-    reverse_point = lambda p: len_string - p - 1
-    reverse_location = lambda x: (reverse_point(x[1]), reverse_point(x[0]))
-    rev_locations = set()
-    for location in locations:
-        rev_locations.add(reverse_location(location))
-    return rev_locations
-
-def match_word(seq, word):
-    'It matches the words against the given sequence'
-
-    fwd_seq  = str(seq.seq)
-    rev_seq  = str(seq.seq.reverse_complement())
-
-    matches = _find_matches(fwd_seq, word)
-    match_parts = _build_match_parts(matches, query_strand=1,
-                                              subj_strand=1)
-    matches = _find_matches(rev_seq, word)
-    matches = _reverse_locations(matches, len(rev_seq))
-    match_parts.extend(_build_match_parts(matches, query_strand=1,
-                                          subj_strand=-1))
-    return match_parts
-
 def _find_match_start_end(match_parts):
     'Given a list of match parts it find the start and end on the query'
     start, end = None, None
@@ -254,11 +481,22 @@ def _find_match_start_end(match_parts):
     return start, end
 
 def match_words(seq, words):
-    'It matches the words against the given sequence'
+    '''It matches the words against the given sequence
+
+    The words can be given as a list or as a WordMatcher built once for all
+    the sequences.
+    '''
+    if not isinstance(words, WordMatcher):
+        words = WordMatcher(words)
     #this result is an alignment search result structure
     result = {'query': seq, 'matches':[]}
-    for word in words:
-        match_parts = match_word(seq, word)
+    locations_by_word = words.find_words(str(seq.seq))
+    for word, locations in zip(words.words, locations_by_word):
+        match_parts = []
+        for start, end, strand in locations:
+            match_parts.extend(_build_match_parts([(start, end)],
+                                                  query_strand=1,
+                                                  subj_strand=strand))
         if match_parts:
             start, end = _find_match_start_end(match_parts)
             match = {'subject':word,
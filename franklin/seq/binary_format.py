@@ -0,0 +1,247 @@
+'''
+A binary container for the pickled sequences.
+
+The file starts with a magic string followed by the records. Every record is
+its length as a little endian 32 bit integer followed by the pickled sequence.
+The length's highest bit is set if the record is compressed with zlib. After
+the last record there is an end mark and the footer. The footer holds the
+offset of every record as 64 bit integers and a trailer with the number of
+records and the footer offset. With it the records can be counted and the
+file can be split in sections for the parallel readers without reading it.
+A file whose footer was not written, because the writer was not closed, can
+still be read.
+
+Created on 17/10/2026
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import struct, zlib, random
+from array import array
+
+#the newline ends the magic, so readline returns it when the format is guessed
+BINARY_MAGIC = '\x89FRNKLN\n'
+BINARY_VERSION = 1
+_HEADER = struct.Struct('<8sB')
+_LENGTH = struct.Struct('<I')
+_OFFSET = struct.Struct('<Q')
+_TRAILER = struct.Struct('<QQ8s')
+FOOTER_MAGIC = 'FRNKLNIX'
+COMPRESSED_FLAG = 0x80000000
+END_MARK = 0xFFFFFFFF
+MAX_RECORD_LENGTH = COMPRESSED_FLAG - 1
+#the offsets are written in chunks of this size
+OFFSETS_CHUNK = 65536
+
+class BinarySeqWriter(object):
+    '''It writes records in the binary container one by one.
+
+    The footer is written when the writer is closed, the file handler is not
+    closed.
+    '''
+    def __init__(self, fhand, compress=False, compress_level=1):
+        'It inits the writer and it writes the header if the file is empty'
+        self.fhand = fhand
+        self.compress = compress
+        self._compress_level = compress_level
+        self._offset = fhand.tell()
+        if not self._offset:
+            self._write(_HEADER.pack(BINARY_MAGIC, BINARY_VERSION))
+        #array has no 64 bit integer type in python 2, a double holds exactly
+        #any offset below 2 ** 53
+        self._offsets = array('d')
+        self._closed = False
+
+    def _write(self, string):
+        'It writes the string and it keeps the file offset'
+        self.fhand.write(string)
+        self._offset += len(string)
+
+    def write(self, record):
+        'It writes one record'
+        if self._closed:
+            raise RuntimeError('The binary writer is closed')
+        length = len(record)
+        if self.compress:
+            record = zlib.compress(record, self._compress_level)
+            length = len(record) | COMPRESSED_FLAG
+        if len(record) > MAX_RECORD_LENGTH:
+            raise ValueError('The record is too long for the binary format')
+        self._offsets.append(self._offset)
+        self._write(_LENGTH.pack(length))
+        self._write(record)
+
+    def close(self):
+        'It writes the end mark and the footer'
+        if self._closed:
+            return
+        self._closed = True
+        self._write(_LENGTH.pack(END_MARK))
+        footer_offset = self._offset
+        offsets = self._offsets
+        for start in xrange(0, len(offsets), OFFSETS_CHUNK):
+            chunk = offsets[start:start + OFFSETS_CHUNK]
+            self._write(struct.pack('<%dQ' % len(chunk),
+                                    *[int(offset) for offset in chunk]))
+        self._write(_TRAILER.pack(len(offsets), footer_offset, FOOTER_MAGIC))
+        self.fhand.flush()
+
+def _skip_header(fhand):
+    '''It goes to the first record.
+
+    The header is only found at the start of the file, a section of the file
+    starts directly with a record.
+    '''
+    fhand.seek(0)
+    header = fhand.read(_HEADER.size)
+    if header[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+        fhand.seek(0)
+        return 0
+    version = _HEADER.unpack(header)[1]
+    if version != BINARY_VERSION:
+        raise ValueError('Unknown binary format version: %i' % version)
+    return _HEADER.size
+
+def _read_length(fhand):
+    '''It reads a record length and it returns it with the compressed flag.
+
+    It returns None at the end of the records.
+    '''
+    prefix = fhand.read(_LENGTH.size)
+    if not prefix:
+        return None
+    if len(prefix) < _LENGTH.size:
+        raise ValueError('The binary file is truncated')
+    length = _LENGTH.unpack(prefix)[0]
+    if length == END_MARK:
+        return None
+    return length & MAX_RECORD_LENGTH, bool(length & COMPRESSED_FLAG)
+
+def _read_record(fhand):
+    'It reads the record found at the current position'
+    length = _read_length(fhand)
+    if length is None:
+        return None
+    length, compressed = length
+    record = fhand.read(length)
+    if len(record) < length:
+        raise ValueError('The binary file is truncated')
+    if compressed:
+        record = zlib.decompress(record)
+    return record
+
+def binary_records(fhand):
+    'It yields the records found in the file or in a section of it'
+    _skip_header(fhand)
+    while True:
+        record = _read_record(fhand)
+        if record is None:
+            break
+        yield record
+
+def _read_footer(fhand):
+    '''It returns the number of records and the footer offset.
+
+    It returns None if the file has no footer.
+    '''
+    fhand.seek(0, 2)
+    if fhand.tell() < _HEADER.size + _LENGTH.size + _TRAILER.size:
+        return None
+    fhand.seek(-_TRAILER.size, 2)
+    num_records, footer_offset, magic = _TRAILER.unpack(
+                                                   fhand.read(_TRAILER.size))
+    if magic != FOOTER_MAGIC:
+        return None
+    return num_records, footer_offset
+
+def _record_offsets_by_scan(fhand):
+    '''It returns the offsets of the records and the end of the last one.
+
+    Only the lengths are read, the records are skipped.
+    '''
+    offset = _skip_header(fhand)
+    offsets = array('d')
+    while True:
+        length = _read_length(fhand)
+        if length is None:
+            break
+        offsets.append(offset)
+        offset += _LENGTH.size + length[0]
+        fhand.seek(offset)
+    return offsets, offset
+
+def _record_offset(fhand, footer_offset, index):
+    'It returns the offset of the record with the given index'
+    fhand.seek(footer_offset + index * _OFFSET.size)
+    return _OFFSET.unpack(fhand.read(_OFFSET.size))[0]
+
+def num_binary_records(fhand):
+    '''It returns the number of records in the file.
+
+    It is read from the footer, the file is only scanned if it has no footer.
+    '''
+    footer = _read_footer(fhand)
+    if footer is not None:
+        return footer[0]
+    return len(_record_offsets_by_scan(fhand)[0])
+
+def binary_file_sections(fhand, num_sections):
+    '''It splits the file in sections with a similar number of records.
+
+    It returns a list of (start, end) byte offsets. With the footer only
+    num_sections offsets are read.
+    '''
+    footer = _read_footer(fhand)
+    if footer is None:
+        offsets, records_end = _record_offsets_by_scan(fhand)
+        num_records = len(offsets)
+        get_offset = lambda index: int(offsets[index])
+    else:
+        num_records, footer_offset = footer
+        records_end = footer_offset - _LENGTH.size
+        get_offset = lambda index: _record_offset(fhand, footer_offset, index)
+    if not num_records:
+        return []
+    starts = [get_offset(0)]
+    for section in range(1, num_sections):
+        start = get_offset(num_records * section // num_sections)
+        if start > starts[-1]:
+            starts.append(start)
+    return zip(starts, starts[1:] + [records_end])
+
+def sample_binary_records(fhand, sample_size):
+    '''It yields a random sample of the records found in the file.
+
+    The records are chosen with the footer and read seeking to them, they are
+    yielded in the file order. It returns None if the file has no footer.
+    '''
+    footer = _read_footer(fhand)
+    if footer is None:
+        return None
+    num_records, footer_offset = footer
+    if sample_size < num_records:
+        indexes = sorted(random.sample(xrange(num_records), sample_size))
+    else:
+        indexes = xrange(num_records)
+    offsets = [_record_offset(fhand, footer_offset, index)
+                                                        for index in indexes]
+    return _records_at_offsets(fhand, offsets)
+
+def _records_at_offsets(fhand, offsets):
+    'It yields the records found at the given offsets'
+    for offset in offsets:
+        fhand.seek(offset)
+        yield _read_record(fhand)
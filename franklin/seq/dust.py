@@ -0,0 +1,228 @@
+'''
+It finds the low complexity regions of the sequences with the DUST algorithm.
+
+It is the algorithm implemented by mdust, so the same regions are found
+without running it. The sequence is scanned in windows of 64 bp that overlap
+by 32 bp. In every window the subsequence with the highest triplet score is
+looked for; the score of a subsequence is ten times the number of pairs of
+equal triplets found in it divided by its length minus one. If the best
+score is higher than the level, the subsequence is masked up to the start
+of the next window, and the next window is masked from its start to the
+subsequence end. Every masked segment is merged with the previous one only
+when they overlap, and the segments of one base are left out, so the same
+segments as in the mdust output are given.
+
+The triplet pair counts of every start and end in a window are calculated
+with numpy for all the windows of a list of sequences at the same time. If
+numpy is not installed the counts are incremented triplet by triplet.
+
+Created on 17/10/2026
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#the mdust cut off used by franklin
+DUST_LEVEL = 25
+DUST_WINDOW = 64
+_HALF_WINDOW = DUST_WINDOW // 2
+_TRIPLETS = DUST_WINDOW - 2
+#the windows processed by numpy at once
+_WINDOWS_CHUNK = 256
+
+def _triplet_codes(str_seq):
+    '''It returns the code of every triplet, None for the ones with no letters.
+
+    The letters are case insensitive.
+    '''
+    str_seq = str_seq.upper()
+    codes = []
+    for index in range(len(str_seq) - 2):
+        triplet = str_seq[index:index + 3]
+        codes.append(triplet if triplet.isalpha() else None)
+    return codes
+
+def _best_window_subseq(triplets):
+    '''It returns the best score and subsequence for the window triplets.
+
+    The subsequence is given by its start and end in the window. The triplet
+    pairs are counted for every start as the triplets are added one by one.
+    '''
+    best_score, best_start, best_end = 0, 0, 0
+    for start in range(len(triplets)):
+        counts = {}
+        pairs = 0
+        for index in range(start, len(triplets)):
+            triplet = triplets[index]
+            if triplet is None:
+                continue
+            count = counts.get(triplet, 0)
+            if count:
+                pairs += count
+                #the length of the subsequence minus one
+                length = index + 2 - start
+                score = 10 * pairs // length
+                if score > best_score:
+                    best_score, best_start = score, start
+                    best_end = index + 2
+            counts[triplet] = count + 1
+    return best_score, best_start, best_end
+
+def _window_starts(length):
+    'It returns the starts of the windows for a sequence of the given length'
+    return range(0, length, _HALF_WINDOW)
+
+def _best_subseqs_for_windows(windows):
+    '''It returns the best score, start and end for every window.
+
+    The windows are given by a matrix with their triplet codes.
+    '''
+    codes = windows
+    valid = codes >= 0
+    #the pairs of equal triplets, the first one before the second one
+    pairs = codes[:, :, None] == codes[:, None, :]
+    pairs &= valid[:, :, None] & valid[:, None, :]
+    pairs &= numpy.triu(numpy.ones((_TRIPLETS, _TRIPLETS), dtype=bool), 1)
+    #the pairs of every end triplet with the triplets after every start
+    #the counts fit in 16 bits, even ten times the pairs of a full window
+    end_pairs = pairs[:, ::-1, :].cumsum(axis=1, dtype=numpy.int16)[:, ::-1]
+    #the pairs between every start and end
+    pair_counts = end_pairs.cumsum(axis=2, dtype=numpy.int16)
+    index = numpy.arange(_TRIPLETS, dtype=numpy.int16)
+    lengths = index[None, :] + 2 - index[:, None]
+    lengths[lengths < 1] = 1
+    scores = 10 * pair_counts // lengths
+    #the score is only updated when a repeated triplet is added
+    scores[end_pairs == 0] = 0
+    scores = scores.reshape(len(windows), -1)
+    best = scores.argmax(axis=1)
+    best_scores = scores[numpy.arange(len(windows)), best]
+    starts, ends = numpy.divmod(best, _TRIPLETS)
+    return zip(best_scores.tolist(), starts.tolist(), (ends + 2).tolist())
+
+def _letter_table():
+    'It returns the code of every char, the letters are case insensitive'
+    table = numpy.zeros(256, dtype=numpy.int32)
+    table.fill(-1)
+    for letter in range(ord('A'), ord('Z') + 1):
+        table[letter] = letter
+        table[letter + ord('a') - ord('A')] = letter
+    return table
+
+_LETTER_CODES = _letter_table() if numpy is not None else None
+
+def _window_codes(str_seq):
+    '''It returns the triplet codes of every window of the sequence.
+
+    The triplets with no letters and the ones after the window end are -1.
+    '''
+    letters = _LETTER_CODES[numpy.frombuffer(str_seq, dtype=numpy.uint8)]
+    num_triplets = max(len(letters) - 2, 0)
+    codes = numpy.empty(len(letters) + _TRIPLETS, dtype=numpy.int32)
+    codes.fill(-1)
+    if num_triplets:
+        first, second, third = (letters[:-2], letters[1:-1], letters[2:])
+        triplets = (first << 16) | (second << 8) | third
+        triplets[(first < 0) | (second < 0) | (third < 0)] = -1
+        codes[:num_triplets] = triplets
+    starts = numpy.array(_window_starts(len(str_seq)), dtype=numpy.int32)
+    return codes[starts[:, None] + numpy.arange(_TRIPLETS)[None, :]]
+
+def _add_segment(segments, start, end):
+    '''It adds the segment to the segments like mdust does.
+
+    The segment is only compared with the last one. It is merged with it when
+    they overlap and the segments of one base are not added.
+    '''
+    if start >= end or end < 0:
+        return
+    if not segments:
+        segments.append([start, end])
+        return
+    last = segments[-1]
+    if start > last[0]:
+        if start > last[1]:
+            segments.append([start, end])
+        elif end > last[1]:
+            last[1] = end
+    elif end < last[0]:
+        segments.append([start, end])
+    else:
+        last[0] = start
+
+def _masked_segments(length, best_subseqs, level):
+    '''It returns the masked segments given the best subseqs of the windows.
+
+    The segments are given as (start, end) tuples with the end included.
+    '''
+    segments = []
+    mask_from, mask_to = 0, -1
+    for start, (score, subseq_start, subseq_end) in zip(_window_starts(length),
+                                                        best_subseqs):
+        mask_from -= _HALF_WINDOW
+        mask_to -= _HALF_WINDOW
+        _add_segment(segments, start + mask_from, start + mask_to)
+        if score > level:
+            mask_from = min(subseq_end, _HALF_WINDOW)
+            _add_segment(segments, start + subseq_start, start + mask_from)
+            mask_to = subseq_end
+        else:
+            mask_from, mask_to = 0, -1
+    return [tuple(segment) for segment in segments]
+
+def dust_segments_for_seqs(str_seqs, level=DUST_LEVEL):
+    '''It returns the low complexity segments of every sequence.
+
+    The segments of every sequence are given as a list of (start, end)
+    tuples with the end included.
+    '''
+    if numpy is None:
+        return [dust_segments(str_seq, level) for str_seq in str_seqs]
+    windows_by_seq = [_window_codes(str_seq) for str_seq in str_seqs]
+    if not windows_by_seq:
+        return []
+    windows = numpy.vstack(windows_by_seq)
+    best_subseqs = []
+    for start in range(0, len(windows), _WINDOWS_CHUNK):
+        chunk = windows[start:start + _WINDOWS_CHUNK]
+        best_subseqs.extend(_best_subseqs_for_windows(chunk))
+    segments = []
+    start = 0
+    for str_seq, seq_windows in zip(str_seqs, windows_by_seq):
+        end = start + len(seq_windows)
+        segments.append(_masked_segments(len(str_seq),
+                                         best_subseqs[start:end], level))
+        start = end
+    return segments
+
+def dust_segments(str_seq, level=DUST_LEVEL):
+    '''It returns the low complexity segments of the sequence.
+
+    The segments are given as a list of (start, end) tuples with the end
+    included.
+    '''
+    if numpy is not None:
+        return dust_segments_for_seqs([str_seq], level)[0]
+    triplets = _triplet_codes(str_seq)
+    best_subseqs = []
+    for start in _window_starts(len(str_seq)):
+        best_subseqs.append(_best_window_subseq(
+                                        triplets[start:start + _TRIPLETS]))
+    return _masked_segments(len(str_seq), best_subseqs, level)
@@ -23,18 +23,27 @@ Reader capaple of taking a bam file and adding the SNPs to the SeqRecords.
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
 import math, re, json
+from bisect import bisect_left
 import cPickle as pickle
-from itertools import izip
+from cStringIO import StringIO
+from itertools import izip, chain
 from Bio import SeqIO
 from Bio.Alphabet import (Alphabet, SingleLetterAlphabet, ProteinAlphabet,
-                          DNAAlphabet)
+                          DNAAlphabet, single_letter_alphabet)
 from Bio.SeqFeature import ExactPosition, FeatureLocation
 from Bio.SeqIO.QualityIO import FastqGeneralIterator
 
 from franklin.seq.seqs import (SeqWithQuality, Seq, SeqFeature,
-                               create_seq_from_struct, fix_seq_struct_for_json)
-from franklin.utils.itertools_ import take_sample
+                               create_seq_from_struct, fix_seq_struct_for_json,
+                               LazySeqWithQuality, decode_quality,
+                               CompactSeqWithQuality)
+from franklin.utils.itertools_ import take_sample, reservoir_sample
 from franklin.utils.misc_utils import get_fhand
+from franklin.utils.compressed_files import uncompressed_fhand
+from franklin.seq.binary_format import (BINARY_MAGIC, binary_records,
+                                        num_binary_records,
+                                        binary_file_sections,
+                                        sample_binary_records)
 #the translation between our formats and the biopython formats
 BIOPYTHON_FORMATS = {'fasta': 'fasta',
                      'fastq': 'fastq',
@@ -67,12 +76,18 @@ def _is_sfastq(fhand, max_iterations=1000):
     return False
 
 def guess_seq_file_format(fhand):
-    'Given a sequence file it returns its format'
+    '''Given a sequence file it returns its format.
+
+    The gzip and BGZF files are looked at decompressed.
+    '''
+    fhand = uncompressed_fhand(fhand)
     fhand.seek(0)
     line = fhand.readline()
     if not line:
         return None
-    if line[0] == '{':
+    if line == BINARY_MAGIC:
+        format_ = 'binary'
+    elif line[0] == '{':
         format_ = 'json'
     elif 'ccopy_reg' in line:
         format_ = 'pickle'
@@ -96,7 +111,7 @@ def guess_seq_file_format(fhand):
 
 def num_seqs_in_file(seq_fhand, format=None):
     'It counts seqs in file. '
-    seq_fhand = get_fhand(seq_fhand)
+    seq_fhand = uncompressed_fhand(get_fhand(seq_fhand))
     if format is None:
         format = guess_seq_file_format(seq_fhand)
 
@@ -107,6 +122,8 @@ def num_seqs_in_file(seq_fhand, format=None):
         return count_str_in_file(seq_fhand, "^%s" % class_name)
     elif 'fastq' in format:
         return _num_seqs_in_fastq(seq_fhand)
+    elif format == 'binary':
+        return num_binary_records(seq_fhand)
     else:
         raise NotImplementedError('I can not count this format: %s' % format)
 
@@ -131,25 +148,329 @@ def _num_seqs_in_fastq(fhand):
     fhand.seek(pos_at_start)
     return counter
 
+def _is_fasta_record_start(line, fhand):
+    'It returns True if the fasta line is the first line of a record'
+    return line.startswith('>')
+
+def _is_repr_record_start(line, fhand):
+    'It returns True if the repr line is the first line of a record'
+    return line[:4] in ('SeqW', 'SeqR')
+
+def _is_fastq_record_start(line, fhand):
+    '''It returns True if the fastq line is the first line of a record.
+
+    A quality line can also start with an @, so we check that the third line
+    is the + line.
+    '''
+    if not line.startswith('@'):
+        return False
+    position = fhand.tell()
+    fhand.readline()
+    plus_line = fhand.readline()
+    fhand.seek(position)
+    return plus_line.startswith('+')
+
+def _find_serialized_record_start(fhand):
+    '''It returns the position of the first record that starts after a blank
+    line. The serialized records are separated by empty lines.'''
+    after_blank_line = False
+    while True:
+        position = fhand.tell()
+        line = fhand.readline()
+        if not line:
+            return position
+        if not line.rstrip():
+            after_blank_line = True
+        elif after_blank_line:
+            return position
+
+RECORD_START_CHECKERS = {'fasta': _is_fasta_record_start,
+                         'repr': _is_repr_record_start,
+                         'fastq': _is_fastq_record_start}
+
+def _find_record_start(fhand, position, file_format):
+    '''It returns the position of the first record that starts at or after the
+    given byte position'''
+    if position:
+        #we go to the beginning of the next line
+        fhand.seek(position - 1)
+        fhand.readline()
+    else:
+        fhand.seek(0)
+    if file_format in ('json', 'pickle'):
+        if not position:
+            return 0
+        return _find_serialized_record_start(fhand)
+
+    is_record_start = RECORD_START_CHECKERS[file_format]
+    while True:
+        line_start = fhand.tell()
+        line = fhand.readline()
+        if not line or is_record_start(line, fhand):
+            return line_start
+
+def _find_fasta_record_by_name(fhand, name, position):
+    '''It returns the position of the fasta record with the given name.
+
+    The search starts at the given position.
+    '''
+    fhand.seek(position)
+    while True:
+        line_start = fhand.tell()
+        line = fhand.readline()
+        if not line:
+            msg = 'Sequence %s not found in file %s' % (name, fhand.name)
+            raise ValueError(msg)
+        if line.startswith('>') and line[1:].split()[0] == name:
+            return line_start
+
+def _record_name(fhand, position):
+    'It returns the name of the fasta or fastq record found at the position'
+    fhand.seek(position)
+    words = fhand.readline()[1:].split()
+    return words[0] if words else ''
+
+def _find_record_by_name(fhand, name, position, file_format):
+    '''It returns the position of the record whose mate name is the given one.
+
+    The search starts at the given position. It works for the fasta and fastq
+    files.
+    '''
+    is_record_start = RECORD_START_CHECKERS[file_format]
+    fhand.seek(position)
+    while True:
+        line_start = fhand.tell()
+        line = fhand.readline()
+        if not line:
+            msg = 'Sequence %s not found in file %s' % (name, fhand.name)
+            raise ValueError(msg)
+        if (is_record_start(line, fhand) and
+            _mate_name(_first_word(line[1:])) == name):
+            return line_start
+
+def _file_size(fhand):
+    'It returns the size in bytes of the file'
+    fhand.seek(0, 2)
+    return fhand.tell()
+
+def _split_positions(fhand, file_size, num_sections):
+    '''It returns the positions around which the file will be split.
+
+    The BGZF files are split at the block starts, so every section only
+    decompresses its own blocks.
+    '''
+    positions = [file_size * index // num_sections
+                                            for index in range(1, num_sections)]
+    if 'block_starts' not in dir(fhand):
+        return positions
+    block_starts = fhand.block_starts()
+    snapped = []
+    for position in positions:
+        index = bisect_left(block_starts, position)
+        snapped.append(block_starts[index] if index < len(block_starts)
+                                                              else file_size)
+    return snapped
+
+def _split_format(file_format):
+    'It returns the format used to look for the record starts'
+    if file_format in ('json', 'pickle', 'repr', 'fasta'):
+        return file_format
+    elif 'fastq' in file_format:
+        return 'fastq'
+    if file_format:
+        msg = 'No parallel splitter for format ' + file_format
+    else:
+        msg = 'A file with an unknown format cannot be split'
+    raise NotImplementedError(msg)
+
+def seq_file_sections(seq_fhand, file_format, num_sections, qual_fhand=None):
+    '''It splits a sequence file in sections by byte offsets.
+
+    Every section starts at a record start. It returns a list with one
+    (start, end) tuple for every section. If a qual file is given it returns a
+    list of ((seq_start, seq_end), (qual_start, qual_end)) tuples, the qual
+    sections will hold the same sequences than the seq ones.
+    There can be less sections than the requested ones for small files.
+    The offsets of the gzip and BGZF files are uncompressed offsets, the
+    BGZF files are split at their block starts.
+    '''
+    seq_fhand = uncompressed_fhand(seq_fhand)
+    if qual_fhand is not None:
+        qual_fhand = uncompressed_fhand(qual_fhand)
+    if file_format == 'binary':
+        return binary_file_sections(seq_fhand, num_sections)
+    split_format = _split_format(file_format)
+    file_size = _file_size(seq_fhand)
+    starts = [0]
+    for position in _split_positions(seq_fhand, file_size, num_sections):
+        start = _find_record_start(seq_fhand, position, split_format)
+        if starts[-1] < start < file_size:
+            starts.append(start)
+    sections = zip(starts, starts[1:] + [file_size])
+    if qual_fhand is None:
+        return sections
+
+    #the qual file should be split by the same sequences
+    qual_starts = [0]
+    for start in starts[1:]:
+        seq_fhand.seek(start)
+        name = seq_fhand.readline()[1:].split()[0]
+        qual_starts.append(_find_fasta_record_by_name(qual_fhand, name,
+                                                      qual_starts[-1]))
+    qual_sections = zip(qual_starts, qual_starts[1:] + [_file_size(qual_fhand)])
+    return zip(sections, qual_sections)
+
+def paired_file_sections(seq_fhand, file_format, num_sections,
+                         mate_fhand=None):
+    '''It splits paired sequence files in sections that keep the pairs.
+
+    If a mate file is given it returns a list of
+    ((seq_start, seq_end), (mate_start, mate_end)) tuples, the mate sections
+    hold the mates of the sequences found in the seq sections. Without a mate
+    file the mates should be interleaved in the seq file and a list of
+    (start, end) tuples is returned, every section starts with the first
+    mate of a pair. Only the fasta and the fastq files can be split.
+    '''
+    split_format = _split_format(file_format)
+    if split_format not in ('fasta', 'fastq'):
+        msg = 'The paired %s files can not be split' % file_format
+        raise NotImplementedError(msg)
+    seq_fhand = uncompressed_fhand(seq_fhand)
+    if mate_fhand is not None:
+        mate_fhand = uncompressed_fhand(mate_fhand)
+    file_size = _file_size(seq_fhand)
+    starts = [start for start, end in seq_file_sections(seq_fhand,
+                                                        file_format,
+                                                        num_sections)]
+    if mate_fhand is None:
+        #a section should not start with the second mate of a pair
+        pair_starts = [0]
+        for start in starts[1:]:
+            next_start = _find_record_start(seq_fhand, start + 1,
+                                            split_format)
+            if (next_start < file_size and
+                _mate_name(_record_name(seq_fhand, start)) !=
+                _mate_name(_record_name(seq_fhand, next_start))):
+                start = next_start
+            if pair_starts[-1] < start < file_size:
+                pair_starts.append(start)
+        return zip(pair_starts, pair_starts[1:] + [file_size])
+
+    #the mate file should be split by the same pairs
+    mate_starts = [0]
+    for start in starts[1:]:
+        name = _mate_name(_record_name(seq_fhand, start))
+        mate_starts.append(_find_record_by_name(mate_fhand, name,
+                                                mate_starts[-1],
+                                                split_format))
+    sections = zip(starts, starts[1:] + [file_size])
+    mate_sections = zip(mate_starts,
+                        mate_starts[1:] + [_file_size(mate_fhand)])
+    return zip(sections, mate_sections)
+
 def seqs_in_file(seq_fhand, qual_fhand=None, format=None, sample_size=None,
-                 double_encoding=False):
-    'It yields a seqrecord for each of the sequences found in the seq file.'
+                 double_encoding=False, lazy=False, compact=False):
+    '''It yields a seqrecord for each of the sequences found in the seq file.
 
+    If lazy is True the fasta and fastq sequences will be LazySeqWithQuality
+    objects that build their sequence, quality and description when used.
+    If compact is True CompactSeqWithQuality objects are yielded instead,
+    they take precedence over the lazy ones.
+    If a sample_size is given a random sample of that size is taken in one
+    pass, without keeping the rest of the sequences in memory. For the fasta,
+    fastq and pickle files only the offsets of the records are sampled and
+    the chosen records are read afterwards. The binary files are sampled with
+    their footer.
+    The gzip and BGZF files are read decompressed.
+    '''
+    seq_fhand = uncompressed_fhand(seq_fhand)
+    if qual_fhand is not None:
+        qual_fhand = uncompressed_fhand(qual_fhand)
     if format is None:
         format = guess_seq_file_format(seq_fhand)
-    seqs =_seqs_in_file(seq_fhand, qual_fhand=qual_fhand, file_format=format,
-                        double_encoding=double_encoding)
+    seqs = None
+    if sample_size is not None:
+        seqs = _sample_seqs_in_file(seq_fhand, qual_fhand, format, sample_size,
+                                    lazy=lazy, compact=compact)
+    if seqs is None:
+        seqs =_seqs_in_file(seq_fhand, qual_fhand=qual_fhand,
+                            file_format=format,
+                            double_encoding=double_encoding, lazy=lazy,
+                            compact=compact)
+        if sample_size is not None:
+            seqs = take_sample(seqs, sample_size)
+    #the native parsers create the compact sequences by themselves
+    if compact and format not in NATIVE_FORMATS:
+        seqs = _compact_seqs(seqs)
+    return seqs
 
-    if sample_size is None:
-        return seqs
-    try:
-        num_seqs = num_seqs_in_file(seq_fhand, format)
-    except NotImplementedError:
-        num_seqs = None
+_MATE_SUFFIX = re.compile(r'/[12]$')
+
+def _mate_name(name):
+    'It returns the name shared by both mates, without the /1 or /2'
+    return _MATE_SUFFIX.sub('', name)
+
+def _check_mates(mate1, mate2):
+    'It raises a ValueError if the sequences are not mates'
+    if mate1 is None or mate2 is None:
+        raise ValueError('The paired files have a different number of seqs')
+    if _mate_name(mate1.name) != _mate_name(mate2.name):
+        msg = 'The paired sequences do not match (%s vs %s)'
+        raise ValueError(msg % (mate1.name, mate2.name))
+
+def paired_seqs_in_file(seq_fhand, mate_fhand=None, format=None, lazy=False,
+                        compact=False):
+    '''It yields a (mate1, mate2) tuple for every pair of sequences.
+
+    The mates are read from the seq and the mate files in lockstep. If no mate
+    file is given the mates should be interleaved in the seq file. The names
+    of both mates should be equal once the /1 and /2 suffixes are removed, a
+    ValueError is raised if they are not or if a mate is missing.
+    The lazy and compact parameters are the seqs_in_file ones.
+    '''
+    seq_fhand = uncompressed_fhand(seq_fhand)
+    if format is None:
+        format = guess_seq_file_format(seq_fhand)
+    seqs = iter(seqs_in_file(seq_fhand, format=format, lazy=lazy,
+                             compact=compact))
+    if mate_fhand is None:
+        mates = seqs
+    else:
+        mates = iter(seqs_in_file(mate_fhand, format=format, lazy=lazy,
+                                  compact=compact))
+    for mate1 in seqs:
+        mate2 = next(mates, None)
+        _check_mates(mate1, mate2)
+        yield mate1, mate2
+    if mate_fhand is not None and next(mates, None) is not None:
+        raise ValueError('The paired files have a different number of seqs')
+
+def _compact_seqs(seqs):
+    'It yields the sequences as CompactSeqWithQuality'
+    for seq in seqs:
+        if not isinstance(seq, CompactSeqWithQuality):
+            seq = CompactSeqWithQuality.from_seq_with_quality(seq)
+        yield seq
 
-    return take_sample(seqs, sample_size, num_seqs)
+def _sample_seqs_in_file(seq_fhand, qual_fhand, file_format, sample_size,
+                         lazy=False, compact=False):
+    '''It returns a sample of the sequences reading only the chosen ones.
 
-def _seqs_in_file(seq_fhand, qual_fhand, file_format, double_encoding):
+    It returns None if the file can not be sampled in that way.
+    '''
+    if (record_entry_kind(file_format) is not None and
+        (qual_fhand is None or file_format == 'fasta')):
+        return _sample_seqs_by_offset(seq_fhand, file_format, sample_size,
+                                      qual_fhand=qual_fhand, lazy=lazy,
+                                      compact=compact)
+    if file_format == 'binary':
+        records = sample_binary_records(seq_fhand, sample_size)
+        if records is not None:
+            return (pickle.loads(record) for record in records)
+    return None
+
+def _seqs_in_file(seq_fhand, qual_fhand, file_format, double_encoding,
+                  lazy=False, compact=False):
     'It yields a seqrecord for each of the sequences found in the seq file'
     # look if seq_fhand is a list or not
     seq_fhand.seek(0)
@@ -164,10 +485,17 @@ def _seqs_in_file(seq_fhand, qual_fhand, file_format, double_encoding):
     elif file_format == 'pickle':
         return _seqs_in_file_serialized(seq_fhand=seq_fhand,
                                          serializer='pickle')
+    elif file_format == 'binary':
+        return _seqs_in_file_binary(seq_fhand)
     elif file_format == 'csfasta':
         return _seqs_in_file_csfasta(seq_fhand=seq_fhand,
                                      qual_fhand=qual_fhand,
                                      double_encoding=double_encoding)
+    elif file_format in NATIVE_FORMATS:
+        return _seqs_in_file_native(seq_fhand=seq_fhand,
+                                    file_format=file_format,
+                                    qual_fhand=qual_fhand, lazy=lazy,
+                                    compact=compact)
     else:
         return _seqs_in_file_with_bio(seq_fhand=seq_fhand,
                                       file_format=file_format,
@@ -269,17 +597,22 @@ def _seq_from_string(string, serializer):
 
 def _seqs_in_file_serialized(seq_fhand, serializer):
     'It yields all the sequences in json or pickle format in a file'
-    buffer_ = ''
+    buffer_ = []
     for line in seq_fhand:
         if not line.rstrip():    #seqs are divided by empty lines
-            if buffer:
-                yield _seq_from_string(buffer_, serializer)
-                buffer_ = ''
+            if buffer_:
+                yield _seq_from_string(''.join(buffer_), serializer)
+                buffer_ = []
         else:
-            buffer_ += line
+            buffer_.append(line)
     else:
         if buffer_: #the last seq
-            yield _seq_from_string(buffer_, serializer)
+            yield _seq_from_string(''.join(buffer_), serializer)
+
+def _seqs_in_file_binary(seq_fhand):
+    'It yields all the sequences in a binary file'
+    for record in binary_records(seq_fhand):
+        yield pickle.loads(record)
 
 def _seqs_in_file_with_repr(seq_fhand):
     'It yields all the sequences in repr format in a file'
@@ -287,6 +620,365 @@ def _seqs_in_file_with_repr(seq_fhand):
     for seq_chunk in _seq_chunks_in_repr(seq_fhand):
         yield _cast_to_class(seq_chunk)
 
+#the files are read in blocks of this size by the native parsers
+READ_BUFFER_SIZE = 1024 * 1024
+
+#the formats read by the native parsers and their quality encodings
+NATIVE_FORMATS = {'fasta': None,
+                  'fastq': 'sanger',
+                  'sfastq': 'sanger',
+                  'fastq-sanger': 'sanger',
+                  'ifastq': 'illumina',
+                  'fastq-illumina': 'illumina',
+                  'fastq-solexa': 'solexa'}
+
+def _line_blocks(fhand, buffer_size=READ_BUFFER_SIZE):
+    '''It yields lists with the lines of the file without the line ends.
+
+    The file is read in blocks of buffer_size bytes.
+    '''
+    remainder = ''
+    while True:
+        block = fhand.read(buffer_size)
+        if not block:
+            break
+        lines = (remainder + block).split('\n')
+        remainder = lines.pop()
+        yield lines
+    if remainder:
+        yield [remainder]
+
+def _lines_in_file(fhand, buffer_size=READ_BUFFER_SIZE):
+    'It returns an iterator with the lines of the file without the line ends'
+    return chain.from_iterable(_line_blocks(fhand, buffer_size))
+
+def _fasta_records_with_lines(lines):
+    '''It yields a (title, lines) tuple for every fasta like record.
+
+    The lines before the first record are ignored.
+    '''
+    lines = iter(lines)
+    for line in lines:
+        if line[:1] == '>':
+            title = line[1:].rstrip()
+            break
+    else:
+        return
+    record_lines = []
+    for line in lines:
+        if line[:1] == '>':
+            yield title, record_lines
+            record_lines = []
+            title = line[1:].rstrip()
+            continue
+        record_lines.append(line)
+    yield title, record_lines
+
+def _fasta_records(lines):
+    '''It yields a (title, sequence) tuple for every fasta record.
+
+    Like in the biopython fasta parser the whitespace is removed from the
+    sequence.
+    '''
+    for title, seq_lines in _fasta_records_with_lines(lines):
+        seq = ''.join([line.rstrip() for line in seq_lines])
+        yield title, seq.replace(' ', '').replace('\r', '')
+
+def _fastq_records(lines):
+    '''It yields a (title, sequence, quality string) tuple for every record.
+
+    Like the biopython FastqGeneralIterator it accepts records with the
+    sequence and the quality split in several lines.
+    '''
+    lines = iter(lines)
+    line = next(lines, None)
+    while line is not None:
+        if line[:1] != '@':
+            msg = "Records in Fastq files should start with '@' character"
+            raise ValueError(msg)
+        title = line[1:].rstrip()
+        seq = next(lines, '').rstrip()
+        while True:
+            line = next(lines, None)
+            if line is None:
+                raise ValueError('End of file without quality information.')
+            if line[:1] == '+':
+                second_title = line[1:].rstrip()
+                if second_title and second_title != title:
+                    raise ValueError('Sequence and quality captions differ.')
+                break
+            seq += line.rstrip()
+        if ' ' in seq or '\t' in seq:
+            raise ValueError('Whitespace is not allowed in the sequence.')
+        seq_len = len(seq)
+        qual = next(lines, '').rstrip()
+        while True:
+            line = next(lines, None)
+            if line is None:
+                break
+            if line[:1] == '@' and len(qual) >= seq_len:
+                break
+            qual += line.rstrip()
+        if seq_len != len(qual):
+            msg = 'Lengths of sequence and quality values differs for %s '
+            msg += '(%i and %i).'
+            raise ValueError(msg % (title, seq_len, len(qual)))
+        yield title, seq, qual
+
+def _first_word(title):
+    'It returns the first word of the title'
+    words = title.split(None, 1)
+    return words[0] if words else ''
+
+def _fasta_qual_records(seq_fhand, qual_fhand, lazy=False):
+    '''It yields a (title, sequence, qualities) tuple for every fasta record.
+
+    If lazy is True the qualities are not decoded, the string with the numbers
+    found in the qual file is returned.
+    '''
+    seqs = _fasta_records(_lines_in_file(seq_fhand))
+    quals = _fasta_records_with_lines(_lines_in_file(qual_fhand))
+    for title, seq in seqs:
+        qual_record = next(quals, None)
+        if qual_record is None:
+            raise ValueError('FASTA file has more entries than the QUAL file.')
+        qual_title, qual = qual_record
+        qual = ' '.join(qual)
+        if _first_word(title) != _first_word(qual_title):
+            msg = 'FASTA and QUAL entries do not match (%s vs %s).'
+            raise ValueError(msg % (_first_word(title),
+                                    _first_word(qual_title)))
+        if lazy:
+            qual_length = len(qual.split())
+        else:
+            qual = decode_quality(qual, 'qual')
+            qual_length = len(qual)
+        if len(seq) != qual_length:
+            msg = 'Sequence length and number of quality scores disagree for '
+            raise ValueError(msg + _first_word(title))
+        yield title, seq, qual
+    if next(quals, None) is not None:
+        raise ValueError('QUAL file has more entries than the FASTA file.')
+
+def _seqs_in_file_native(seq_fhand, file_format, qual_fhand=None, lazy=False,
+                         compact=False):
+    '''It yields a SeqWithQuality for each of the sequences found in the file.
+
+    It reads fasta, fasta with a qual file and the sanger, illumina and solexa
+    fastq files without biopython. The file is read in big blocks and the
+    fastq qualities are decoded with a precomputed table. The sequences are
+    equal to the ones created by _seqs_in_file_with_bio.
+    If lazy is True LazySeqWithQuality objects are yielded, their sequence,
+    quality and description are built only when they are used. In that case
+    an invalid quality character is found only when the quality is used.
+    If compact is True CompactSeqWithQuality objects are yielded.
+    '''
+    lazy = lazy and not compact
+    seq_fhand.seek(0)
+    if qual_fhand is not None:
+        qual_fhand.seek(0)
+        records = _fasta_qual_records(seq_fhand, qual_fhand, lazy=lazy)
+        encoding = 'qual'
+    elif file_format == 'fasta':
+        records = ((title, seq, None) for title, seq in
+                                  _fasta_records(_lines_in_file(seq_fhand)))
+        encoding = None
+    else:
+        records = _fastq_records(_lines_in_file(seq_fhand))
+        encoding = NATIVE_FORMATS[file_format]
+    if compact:
+        for title, seq, qual in records:
+            if encoding is not None and encoding != 'qual':
+                qual = decode_quality(qual, encoding, as_array=True)
+            yield CompactSeqWithQuality(seq, qual=qual,
+                                        name=_first_word(title),
+                                        description=' '.join(
+                                                      title.split(' ')[1:]))
+        return
+    if lazy:
+        for title, seq, qual in records:
+            yield LazySeqWithQuality.from_raw(_first_word(title), title, seq,
+                                              qual, encoding)
+        return
+    for title, seq, qual in records:
+        if encoding is not None and encoding != 'qual':
+            qual = decode_quality(qual, encoding)
+        yield SeqWithQuality(seq=Seq(seq, single_letter_alphabet), qual=qual,
+                             name=_first_word(title),
+                             description=' '.join(title.split(' ')[1:]))
+
+def _lines_with_offsets(fhand):
+    'It yields the offset and the line for every line of the file'
+    offset = 0
+    for line in fhand:
+        yield offset, line
+        offset += len(line)
+
+class _SeqLines(object):
+    '''It keeps the layout of the sequence lines of a record.
+
+    The line_bases and line_bytes are only set if every line but the last one
+    has the same length, otherwise a subsequence can not be located by its
+    coordinates.
+    '''
+    def __init__(self):
+        'It inits the layout'
+        self.offset = None
+        self.length = 0
+        self.line_bases = None
+        self.line_bytes = None
+        self._uniform = True
+        self._last_is_shorter = False
+
+    def add(self, offset, line):
+        'It adds a sequence line'
+        bases = len(line.rstrip())
+        if self.offset is None:
+            self.offset = offset
+            self.line_bases, self.line_bytes = bases, len(line)
+        elif self._last_is_shorter and bases:
+            self._uniform = False
+        if bases != self.line_bases or len(line) != self.line_bytes:
+            self._last_is_shorter = True
+            if bases > self.line_bases:
+                self._uniform = False
+        if ' ' in line.rstrip():
+            self._uniform = False
+        self.length += bases
+
+    def fields(self):
+        'It returns the sequence offset, length, line bases and line bytes'
+        if self.offset is None or not self._uniform:
+            return self.offset or 0, self.length, 0, 0
+        return self.offset, self.length, self.line_bases, self.line_bytes
+
+def _fasta_record_entries(fhand):
+    '''It yields an entry for every fasta record.
+
+    The entries are (name, offset, length, seq offset, seq length, line bases,
+    line bytes) tuples, the line bases and bytes are 0 if the sequence lines
+    have different lengths.
+    '''
+    name, start, seq_lines = None, None, None
+    for offset, line in _lines_with_offsets(fhand):
+        if line.startswith('>'):
+            if name is not None:
+                yield (name, start, offset - start) + seq_lines.fields()
+            name, start, seq_lines = _first_word(line[1:]), offset, _SeqLines()
+        elif name is not None:
+            seq_lines.add(offset, line)
+        end = offset + len(line)
+    if name is not None:
+        yield (name, start, end - start) + seq_lines.fields()
+
+def _fastq_record_entries(fhand):
+    '''It yields an entry for every fastq record.
+
+    The record ends when the quality is as long as the sequence, like in the
+    fastq parser.
+    '''
+    lines = _lines_with_offsets(fhand)
+    for start, line in lines:
+        if not line.rstrip():
+            continue
+        if not line.startswith('@'):
+            msg = "Records in Fastq files should start with '@' character"
+            raise ValueError(msg)
+        name = _first_word(line[1:])
+        seq_lines = _SeqLines()
+        for offset, line in lines:
+            if line.startswith('+'):
+                break
+            seq_lines.add(offset, line)
+        else:
+            raise ValueError('End of file without quality information.')
+        qual_length = 0
+        end = offset + len(line)
+        while qual_length < seq_lines.length:
+            try:
+                offset, line = lines.next()
+            except StopIteration:
+                break
+            qual_length += len(line.rstrip())
+            end = offset + len(line)
+        yield (name, start, end - start) + seq_lines.fields()
+
+def _pickle_record_entries(fhand):
+    '''It yields an entry for every pickled record.
+
+    The records are separated by empty lines, they are unpickled to know
+    their names.
+    '''
+    start, record = None, []
+    for offset, line in _lines_with_offsets(fhand):
+        if not line.rstrip():
+            if record:
+                name = pickle.loads(''.join(record)).name
+                yield name, start, offset - start, 0, 0, 0, 0
+                record = []
+            continue
+        if not record:
+            start = offset
+        record.append(line)
+    if record:
+        length = len(''.join(record))
+        yield pickle.loads(''.join(record)).name, start, length, 0, 0, 0, 0
+
+RECORD_ENTRY_SCANNERS = {'fasta': _fasta_record_entries,
+                         'fastq': _fastq_record_entries,
+                         'pickle': _pickle_record_entries}
+
+def record_entry_kind(file_format):
+    '''It returns the kind of record entries that can be scanned in the format.
+
+    It returns None if the records of the format can not be located by their
+    offsets.
+    '''
+    if file_format in ('fasta', 'pickle'):
+        return file_format
+    elif file_format in NATIVE_FORMATS:
+        return 'fastq'
+    return None
+
+def seq_from_record(record, file_format, qual_record=None, lazy=False,
+                    compact=False):
+    'It returns the sequence for the text of one record'
+    if file_format == 'pickle':
+        return pickle.loads(record)
+    qual_fhand = None if qual_record is None else StringIO(qual_record)
+    return _seqs_in_file_native(StringIO(record), file_format,
+                                qual_fhand=qual_fhand, lazy=lazy,
+                                compact=compact).next()
+
+def _read_record(fhand, offset, length):
+    'It returns the text of the record found at the given offset'
+    fhand.seek(offset)
+    return fhand.read(length)
+
+def _sample_seqs_by_offset(seq_fhand, file_format, sample_size,
+                           qual_fhand=None, lazy=False, compact=False):
+    '''It yields a random sample of the sequences found in the file.
+
+    Only the offsets of the records are scanned and sampled, the chosen
+    records are read afterwards seeking to them. The sequences are yielded in
+    the file order.
+    '''
+    seq_fhand.seek(0)
+    scan_entries = RECORD_ENTRY_SCANNERS[record_entry_kind(file_format)]
+    entries = ((entry[1:3], None) for entry in scan_entries(seq_fhand))
+    if qual_fhand is not None:
+        qual_fhand.seek(0)
+        qual_entries = (entry[1:3] for entry in
+                                            _fasta_record_entries(qual_fhand))
+        entries = izip((entry[0] for entry in entries), qual_entries)
+    for seq_entry, qual_entry in reservoir_sample(entries, sample_size):
+        record = _read_record(seq_fhand, *seq_entry)
+        qual_record = None
+        if qual_entry is not None:
+            qual_record = _read_record(qual_fhand, *qual_entry)
+        yield seq_from_record(record, file_format, qual_record=qual_record,
+                              lazy=lazy, compact=compact)
+
 def _seqs_in_file_with_bio(seq_fhand, file_format, qual_fhand=None):
     '''It yields a seqrecord for each of the sequences found in the seq file
     using biopython'''
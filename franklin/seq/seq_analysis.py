@@ -140,8 +140,8 @@ def look_for_similar_sequences(sequence, database, blast_program, filters=None):
     blast_fhand  = blast_runner(sequence)[blast_program]
     return similar_sequences_for_blast(blast_fhand, filters=filters)
 
-def similar_sequences_for_blast(blast_fhand, filters=None):
-    'It look fro similar sequences ina blast result'
+def _filter_similar_alignments(blast_fhand, filters=None):
+    'It returns the filtered alignments found in a blast result'
     #now we parse the blast
     blast_parser = get_alignment_parser('blast+')
     blast_result = blast_parser(blast_fhand)
@@ -157,11 +157,31 @@ def similar_sequences_for_blast(blast_fhand, filters=None):
                     'length_in_query' : True
                    }
                   ]
-    alignments = filter_alignments(blast_result, config=filters)
+    return filter_alignments(blast_result, config=filters)
+
+def similar_sequences_for_blast(blast_fhand, filters=None):
+    'It look fro similar sequences ina blast result'
+    alignments = _filter_similar_alignments(blast_fhand, filters=filters)
     try:
         alignment = alignments.next()
     except StopIteration:
         return []
+    return _similar_sequences_in_alignment(alignment)
+
+def similar_sequences_by_query_for_blast(blast_fhand, filters=None):
+    '''It looks for similar sequences for every query in a blast result.
+
+    It returns a dict with the query names as keys and the similar sequences
+    as values. The queries without similar sequences are not included.
+    '''
+    similar_seqs = {}
+    for alignment in _filter_similar_alignments(blast_fhand, filters=filters):
+        similar_seqs[alignment['query'].name] = \
+                                    _similar_sequences_in_alignment(alignment)
+    return similar_seqs
+
+def _similar_sequences_in_alignment(alignment):
+    'It returns the similar sequences found in an alignment'
     similar_seqs = []
     for match in alignment['matches']:
         #to which sequence our query is similar?
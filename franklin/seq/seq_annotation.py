@@ -24,7 +24,6 @@ Created on 15/01/2010
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
 from xml.parsers.expat import ExpatError
-from Bio import SeqIO
 from Bio.SeqFeature import  FeatureLocation
 from Bio.Alphabet import generic_dna, generic_protein
 
@@ -32,11 +31,11 @@ from franklin.seq.alignment_result import (BlastParser, filter_alignments,
                                            build_relations_from_aligment)
 from franklin.snv.snv_annotation import (INVARIANT, SNP, DELETION, INSERTION,
                                          SNV_TYPES)
-from franklin.utils.cmd_utils import  create_runner
+from franklin.utils.cmd_utils import  create_runner, create_batch_runner
 from franklin.seq.seqs import SeqFeature, get_seq_name, Seq
 from franklin.utils.seqio_utils import get_content_from_fasta
 from franklin.seq.seq_analysis import infer_introns_for_cdna, get_orthologs
-from franklin.seq.readers import guess_seq_file_format
+from franklin.seq.seq_index import index_seq_file
 from franklin.utils.misc_utils import get_fhand
 from franklin.coordsystem import CoordSystem
 from tempfile import NamedTemporaryFile
@@ -321,6 +320,40 @@ def create_microsatellite_annotator():
         return sequence
     return search_ssr
 
+def create_batch_microsatellite_annotator():
+    '''It creates a microsatellite annotator for lists of sequences.
+
+    It runs sputnik once for every list.
+    '''
+    runner = create_batch_runner(tool='sputnik')
+
+    def search_ssr(sequences):
+        'Do the actual search'
+        results, names = runner(sequences)
+        if results is None:
+            return sequences
+        lines_by_name = _group_sputnik_output(results['sputnik'])
+        for sequence, name in zip(sequences, names):
+            if sequence is None:
+                continue
+            for feature in _get_features_from_sputnik(lines_by_name.get(name,
+                                                                        [])):
+                sequence.features.append(feature)
+        return sequences
+    return search_ssr
+
+def _group_sputnik_output(fhand):
+    'It returns the sputnik output lines grouped by sequence name'
+    lines_by_name = {}
+    lines = None
+    for line in fhand:
+        if line.startswith('>'):
+            lines = []
+            lines_by_name[line[1:].split()[0]] = lines
+        elif lines is not None:
+            lines.append(line)
+    return lines_by_name
+
 def _get_features_from_sputnik(fhand):
     'It parses the sputnik output'
     for line in fhand:
@@ -354,29 +387,78 @@ def create_orf_annotator(parameters):
         # If there is no description, ther is no org
         if description is None:
             return sequence
+        _add_orf_feature(sequence, description, seq, pep)
+        return sequence
+    return annotate_orf
 
-        items = description.split()
-        start = int(items[1])
-        end = int(items[2])
-        seq = Seq(seq, generic_dna)
-        pep = Seq(pep, generic_protein)
-        qualifiers = {'dna':seq, 'pep':pep}
-        if start < end:
-            qualifiers['strand'] = 'forward'
-        else:
-            qualifiers['strand'] = 'reverse'
-        feature = SeqFeature(location=FeatureLocation(start, end), type='orf',
-                             qualifiers=qualifiers)
+def _add_orf_feature(sequence, description, seq, pep):
+    'It adds the orf found by estscan to the sequence features'
+    items = description.split()
+    start = int(items[1])
+    end = int(items[2])
+    seq = Seq(seq, generic_dna)
+    pep = Seq(pep, generic_protein)
+    qualifiers = {'dna':seq, 'pep':pep}
+    if start < end:
+        qualifiers['strand'] = 'forward'
+    else:
+        qualifiers['strand'] = 'reverse'
+    feature = SeqFeature(location=FeatureLocation(start, end), type='orf',
+                         qualifiers=qualifiers)
 
-        sequence.features.append(feature)
-        return sequence
+    sequence.features.append(feature)
+
+def _estscan_fasta_records(fhand):
+    '''It returns a dict with the description and sequence for every name
+    found in an estscan fasta output file'''
+    records = {}
+    seq = None
+    for line in fhand:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('>'):
+            items = line.split(' ', 1)
+            name = items[0][1:].rstrip(';')
+            description = items[1] if len(items) > 1 else None
+            seq = []
+            records[name] = (description, seq)
+        elif seq is not None:
+            seq.append(line)
+    return dict([(name, (description, ''.join(seq)))
+                             for name, (description, seq) in records.items()])
+
+def create_batch_orf_annotator(parameters):
+    '''It creates an orf annotator for lists of sequences.
+
+    It runs estscan once for every list.
+    '''
+    runner = create_batch_runner(tool='estscan', parameters=parameters)
+
+    def annotate_orf(sequences):
+        'It adds the orfs to the SeqFeatures'
+        results, names = runner(sequences)
+        if results is None:
+            return sequences
+        dna_fhand = results['dna']
+        prot_fhand = results['protein']
+        dnas = _estscan_fasta_records(dna_fhand)
+        peps = _estscan_fasta_records(prot_fhand)
+        prot_fhand.close()
+        dna_fhand.close()
+        for sequence, name in zip(sequences, names):
+            # If there is no description, ther is no orf
+            if sequence is None or name not in dnas or dnas[name][0] is None:
+                continue
+            description, seq = dnas[name]
+            _add_orf_feature(sequence, description, seq, peps[name][1])
+        return sequences
     return annotate_orf
 
 def create_cdna_intron_annotator(genomic_db, genomic_seqs_fhand):
     'It creates a function that annotates introns in cdna matching with genomic'
     genomic_seqs_fhand = get_fhand(genomic_seqs_fhand)
-    genomic_seqs_index = SeqIO.index(genomic_seqs_fhand.name,
-                                     guess_seq_file_format(genomic_seqs_fhand))
+    genomic_seqs_index = index_seq_file(genomic_seqs_fhand)
     def annotate_intron(sequence):
         'It adds the orf to the SeqFeatures'
         if sequence is None:
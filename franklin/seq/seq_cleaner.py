@@ -22,16 +22,24 @@ factory that will create the function that will do the actual job.
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
 import re, copy
-from itertools import tee
 
-from Bio import SeqIO
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-from franklin.utils.cmd_utils import create_runner
+from franklin.utils.cmd_utils import (create_runner, create_batch_runner,
+                                      seqs_with_batch_names)
 from franklin.utils.misc_utils import get_fhand
+from franklin.utils.itertools_ import SpillingBuffer
 from franklin.seq.seqs import copy_seq_with_quality, Seq
 from franklin.seq.readers import seqs_in_file, double_encode_color_space
+from franklin.seq.seq_index import index_seq_file
 from franklin.seq.alignment import match_words
-from franklin.seq.alignment import BlastAligner
+from franklin.seq.word_matcher import WordMatcher
+from franklin.seq.alignment import BlastAligner, SeedAligner
+from franklin.seq.vector_index import VectorIndexAligner, can_index_vectors
+from franklin.seq.dust import dust_segments, dust_segments_for_seqs
 from franklin.seq.alignment_result import _fix_match_start_end
 
 
@@ -75,18 +83,18 @@ def _mask_sequence(sequence, segments):
         return sequence
 
     segments = _get_all_segments(segments, len(sequence))
-    seq = str(sequence.seq)
-    new_seq = ''
+    seq = sequence.seq
+    new_seq = []
     for segment in segments:
         start = segment[0][0]
         end   = segment[0][1] + 1
-        seq_  = seq[start:end]
+        seq_  = str(seq[start:end])
 
         if segment[1]:
             seq_ = seq_.lower()
-        new_seq += seq_
-    return copy_seq_with_quality(sequence, seq=Seq(new_seq,
-                                                   sequence.seq.alphabet))
+        new_seq.append(seq_)
+    return copy_seq_with_quality(sequence, seq=Seq(''.join(new_seq),
+                                                   seq.alphabet))
 
 def create_seq_trim_and_masker(mask=True, trim=True, trim_as_mask=False):
     'It actually trims the sequence taking into account trimming recommendations'
@@ -223,20 +231,158 @@ def create_striper_by_quality(quality_treshold, min_quality_bases=None,
         start, end = _trim_bad_qual_extremes(boolean_quality_treshold,
                                              min_quality_bases_,
                                              only_3_end=only_3_end)
-        if start is None or end is None:
-            return None
-        if only_3_end:
-            segments = [(end + 1, len(sequence) -1)]
-        else:
-            segments = [(0, start -1), (end + 1, len(sequence) -1)]
-
-        _add_trim_segments(segments, sequence, vector=False)
-        if (end - start) < min_seq_length_:
-            return None
-        else:
-            return sequence
+        return _strip_bad_qual_extremes(sequence, start, end, min_seq_length_,
+                                        only_3_end)
     return strip_seq_by_quality
 
+def _strip_bad_qual_extremes(sequence, start, end, min_seq_length,
+                             only_3_end):
+    '''It adds the trim segments outside the good quality region.
+
+    It returns None if the good region is not found or it is too short.
+    '''
+    if start is None or end is None:
+        return None
+    if only_3_end:
+        segments = [(end + 1, len(sequence) -1)]
+    else:
+        segments = [(0, start -1), (end + 1, len(sequence) -1)]
+
+    _add_trim_segments(segments, sequence, vector=False)
+    if (end - start) < min_seq_length:
+        return None
+    else:
+        return sequence
+
+def create_batch_striper_by_quality(quality_treshold, min_quality_bases=None,
+                                    min_seq_length=None,
+                                    quality_window_width=None,
+                                    only_3_end=False):
+    '''It returns a function that strips the bad quality extremes of lists of
+    sequences.
+
+    The arguments and the trimmed sequences are the create_striper_by_quality
+    ones. The sequences that share the window width and the min quality bases
+    are packed in a matrix with their qualities, so the sliding window means
+    and the good quality regions are calculated with numpy for all of them
+    at once. Without numpy, or for the non integer qualities, every sequence
+    is stripped by itself.
+    '''
+    strip_seq_by_quality = create_striper_by_quality(quality_treshold,
+                                                     min_quality_bases,
+                                                     min_seq_length,
+                                                     quality_window_width,
+                                                     only_3_end=only_3_end)
+    def strip_seqs_by_quality(sequences):
+        'It strips the bad quality extremes of the sequences'
+        if numpy is None:
+            return [strip_seq_by_quality(sequence) for sequence in sequences]
+        stripped = [None] * len(sequences)
+        groups = {}
+        for index, sequence in enumerate(sequences):
+            if sequence is None:
+                continue
+            quality = getattr(sequence, 'qual_array', None)
+            if quality is None:
+                quality = sequence.qual
+            quality = None if quality is None else numpy.asarray(quality)
+            if quality is None or quality.dtype.kind not in 'iub':
+                stripped[index] = strip_seq_by_quality(sequence)
+                continue
+            min_quality_bases_, min_seq_length_, quality_window_width_ = \
+                  _trim_seq_by_quality_defaults(len(quality), min_quality_bases,
+                                                min_seq_length,
+                                                quality_window_width)
+            group = groups.setdefault((quality_window_width_,
+                                       min_quality_bases_), [])
+            group.append((index, quality, min_seq_length_))
+
+        for (window_width, min_quality_bases_), group in groups.items():
+            quals, lengths = _pack_quals([item[1] for item in group])
+            good = _good_quality_matrix(quals, lengths, quality_treshold,
+                                        window_width)
+            starts = _good_qual_starts(good, lengths, min_quality_bases_)
+            ends = _good_qual_starts(_reverse_rows(good, lengths), lengths,
+                                     min_quality_bases_)
+            for row, (index, quality, min_seq_length_) in enumerate(group):
+                start = 0 if only_3_end else starts[row]
+                start = None if start < 0 else int(start)
+                end = None if ends[row] < 0 else int(lengths[row] - ends[row]
+                                                     - 1)
+                stripped[index] = _strip_bad_qual_extremes(sequences[index],
+                                                           start, end,
+                                                           min_seq_length_,
+                                                           only_3_end)
+        return stripped
+    return strip_seqs_by_quality
+
+def _pack_quals(quals):
+    '''It returns a matrix with a row for every quality and the lengths.
+
+    The rows are padded with zeros up to the longest quality.
+    '''
+    lengths = numpy.array([len(qual) for qual in quals], dtype=numpy.int64)
+    matrix = numpy.zeros((len(quals), max(lengths.max(), 1)),
+                         dtype=numpy.int64)
+    for row, qual in enumerate(quals):
+        matrix[row, :len(qual)] = qual
+    return matrix, lengths
+
+def _good_quality_matrix(quals, lengths, quality_treshold,
+                         quality_window_width):
+    '''It returns a boolean matrix, True for the good quality positions.
+
+    It gives the same result than _calculate_sliding_window_qual and
+    _quality_to_boolean, the window sums are taken from the cumulative sums
+    of every row. The padding positions are False.
+    '''
+    num_rows, max_length = quals.shape
+    cum_quals = numpy.zeros((num_rows, max_length + 1), dtype=numpy.int64)
+    numpy.cumsum(quals, axis=1, out=cum_quals[:, 1:])
+    positions = numpy.arange(max_length)
+    starts = numpy.maximum(positions - quality_window_width, 0)
+    ends = numpy.minimum(positions + quality_window_width + 1,
+                         lengths[:, numpy.newaxis])
+    rows = numpy.arange(num_rows)[:, numpy.newaxis]
+    sums = cum_quals[rows, ends] - cum_quals[:, starts]
+    counts = numpy.maximum(ends - starts, 1).astype(float)
+    return (sums / counts > quality_treshold) & \
+                                    (positions < lengths[:, numpy.newaxis])
+
+def _reverse_rows(matrix, lengths):
+    'It reverses every row of the matrix up to its length'
+    positions = numpy.arange(matrix.shape[1])
+    reversed_positions = lengths[:, numpy.newaxis] - 1 - positions
+    rows = numpy.arange(matrix.shape[0])[:, numpy.newaxis]
+    return (matrix[rows, numpy.maximum(reversed_positions, 0)] &
+                                                    (reversed_positions >= 0))
+
+def _good_qual_starts(good, lengths, min_quality_bases):
+    '''It returns the start of the good quality region of every row.
+
+    It finds the same position than _trim_bad_qual_extremes, -1 if it finds
+    None. The scan stops once min_quality_bases good positions that follow
+    other good position, or that start the row, are found. The start is the
+    last good position that follows a bad one before the stop, or 0 if there
+    is none and the last scanned position is good.
+    '''
+    num_rows, max_length = good.shape
+    positions = numpy.arange(max_length)
+    previous = numpy.ones_like(good)
+    previous[:, 1:] = good[:, :-1]
+    counts = numpy.cumsum(good & previous, axis=1)
+    reached = (counts == min_quality_bases) & \
+                                        (positions < lengths[:, numpy.newaxis])
+    last_scanned = numpy.where(reached.any(axis=1), reached.argmax(axis=1),
+                               lengths - 1)
+    run_starts = good & ~previous & \
+                                (positions <= last_scanned[:, numpy.newaxis])
+    last_run_start = max_length - 1 - run_starts[:, ::-1].argmax(axis=1)
+    rows = numpy.arange(num_rows)
+    in_good = good[rows, numpy.maximum(last_scanned, 0)] | (lengths == 0)
+    return numpy.where(run_starts.any(axis=1), last_run_start,
+                       numpy.where(in_good, 0, -1))
+
 def _trim_bad_qual_extremes(bool_seq, min_quality_bases, only_3_end):
     '''It returns start and and of the new sequence. Givig the 0/1 string.'''
 
@@ -338,26 +484,53 @@ def _trim_seq_by_quality_defaults(seq_len, min_quality_bases, min_seq_length,
     return (min_quality_bases, min_seq_length, quality_window_width)
 
 def create_masker_for_low_complexity():
-    'It creates a masker function for low complexity sections that uses mdust'
-    mask_low_complex_by_seq = create_runner(tool='mdust')
+    'It creates a masker function for low complexity sections that uses DUST'
 
     def mask_low_complexity(sequence):
         '''It adds a mask to the sequence where low complexity is found
 
-        It uses mdust from the seqclean package
+        It finds the same regions as mdust from the seqclean package
         '''
         if sequence is None:
             return None
-        fhand = mask_low_complex_by_seq(sequence)['sequence']
-        segments = []
-        for line in fhand:
-            start, end = line.strip().split()[-2:]
-            segments.append((int(start) - 1, int(end) - 1))
+        segments = dust_segments(str(sequence.seq))
         _add_trim_segments(segments, sequence, trim=False)
 
         return sequence
     return mask_low_complexity
 
+def _group_lines_by_name(fhand):
+    '''It returns the non empty output lines grouped by the sequence name.
+
+    The name should be the first field of every line.
+    '''
+    lines_by_name = {}
+    for line in fhand:
+        if not line.strip():
+            continue
+        name = line.split()[0]
+        if name not in lines_by_name:
+            lines_by_name[name] = []
+        lines_by_name[name].append(line)
+    return lines_by_name
+
+def create_batch_masker_for_low_complexity():
+    '''It creates a masker for low complexity sections for lists of sequences.
+
+    The DUST scores of all the sequences in the list are calculated together.
+    '''
+    def mask_low_complexity(sequences):
+        'It adds a mask to the sequences where low complexity is found'
+        str_seqs = [str(sequence.seq) for sequence in sequences
+                                                      if sequence is not None]
+        segments_by_seq = iter(dust_segments_for_seqs(str_seqs))
+        for sequence in sequences:
+            if sequence is None:
+                continue
+            _add_trim_segments(segments_by_seq.next(), sequence, trim=False)
+        return sequences
+    return mask_low_complexity
+
 def create_masker_for_polia():
     'It creates a masker function that will mask poly-A tracks'
     parameters = {'min_score':'10', 'end':'x', 'incremental_dist':'20',
@@ -377,38 +550,64 @@ def create_masker_for_polia():
         return sequence
     return mask_polya
 
-def create_word_masker(words, beginning=True):
-    'It removes the given words if they are in the start of the seq'
-    if not beginning:
-        words = [re.compile(word) for word in words]
+def _add_trimpoly_segments_for_batch(run_trimpoly, sequences, vector=True,
+                                     trim=True):
+    '''It runs trimpoly once for all sequences and it adds the found segments.
+
+    run_trimpoly should be a batch runner.
+    '''
+    results, names = run_trimpoly(sequences)
+    if results is None:
+        return sequences
+    lines_by_name = _group_lines_by_name(results['sequence'])
+    for sequence, name in zip(sequences, names):
+        if sequence is None:
+            continue
+        lines = lines_by_name.get(name)
+        if not lines:
+            #trimpoly writes no line for some sequences, like the empty ones
+            continue
+        segments = _segments_from_trimpoly_line(lines[0], sequence)
+        _add_trim_segments(segments, sequence, vector=vector, trim=trim)
+    return sequences
+
+def create_batch_masker_for_polia():
+    '''It creates a masker of poly-A tracks for lists of sequences.
+
+    It runs trimpoly once for every list.
+    '''
+    parameters = {'min_score':'10', 'end':'x', 'incremental_dist':'20',
+                      'fixed_dist':None}
+    mask_polya_by_seqs = create_batch_runner(tool='trimpoly',
+                                             parameters=parameters)
+    def mask_polya(sequences):
+        'It adds a mask to the sequences where the poly-A is found'
+        return _add_trimpoly_segments_for_batch(mask_polya_by_seqs, sequences,
+                                                trim=False)
+    return mask_polya
+
+def create_word_masker(words, beginning=True, max_mismatches=0):
+    '''It masks the given words if they are in the start of the seq
+
+    If beginning is False the words are masked wherever they are found.
+    '''
+    if beginning:
+        words = ['^' + re.escape(word) for word in words]
+    matcher = WordMatcher(words, reverse_complement=False, ignore_case=False,
+                          max_mismatches=max_mismatches)
 
     def word_remover(sequence):
         'The remover'
         if sequence is None:
             return None
-        str_seq = str(sequence.seq)
-        for word in words:
-            segment = None
-            if beginning and str_seq.startswith(word):
-                segment = (0, len(word) - 1)
-            elif not beginning:
-                segment = _findallmatches(word, str_seq)
-
-            if segment:
-                _add_trim_segments(segment, sequence, trim=False)
+        segments = []
+        for locations in matcher.find_words(str(sequence.seq)):
+            segments.extend((start, end) for start, end, strand in locations)
+        _add_trim_segments(segments, sequence, trim=False)
         return sequence
 
     return word_remover
 
-def _findallmatches(regex, string):
-    '''Given a compiled regex it finds all matches in the string and return
-    their location'''
-    matches = regex.finditer(string)
-    if matches:
-        return [(match.start(), match.end() - 1) for match in matches]
-    else:
-        return []
-
 def create_striper_by_quality_trimpoly(ntrim_above_percent=2):
     '''It creates a function that removes bad quality regions.
 
@@ -437,11 +636,34 @@ def create_striper_by_quality_trimpoly(ntrim_above_percent=2):
         return sequence
     return strip_seq_by_quality_trimpoly
 
+def create_batch_striper_by_quality_trimpoly(ntrim_above_percent=2):
+    '''It creates a function that removes bad quality regions from lists of
+    sequences.
+
+    It runs trimpoly once for every list. The sequences shorter than 80 bp are
+    removed, like in create_striper_by_quality_trimpoly.
+    '''
+    parameters = {'only_n_trim':None,
+                  'ntrim_above_percent': '%.1f' % ntrim_above_percent}
+    strip_seqs_by_quality = create_batch_runner(tool='trimpoly',
+                                                parameters=parameters)
+    def strip_seqs_by_quality_trimpoly(sequences):
+        'It strips the sequences where low quality is found'
+        sequences = [sequence if sequence is not None and len(sequence) >= 80
+                                    else None for sequence in sequences]
+        return _add_trimpoly_segments_for_batch(strip_seqs_by_quality,
+                                                sequences, vector=False)
+    return strip_seqs_by_quality_trimpoly
+
 def _segments_from_trimpoly(fhand_trimpoly_out, sequence):
     '''It return new sequence giving that trimpoly output and the old sequence
      trim option is used to trim os mask the low quality sequence '''
+    return _segments_from_trimpoly_line(fhand_trimpoly_out.readline(),
+                                        sequence)
 
-    trimp_data = fhand_trimpoly_out.readline().split()
+def _segments_from_trimpoly_line(line, sequence):
+    'It returns the segments to remove from a trimpoly output line'
+    trimp_data = line.split()
     end5 = int(trimp_data[2]) - 1
     end3 = int(trimp_data[3])
     segments = [(0, end5 - 1)] if end5 else []
@@ -499,18 +721,24 @@ def create_striper_by_quality_lucy(parameters=None):
         will be removed as soon as they get out of scope.
         '''
         #pylint: disable-msg=W0612
+        #the sequences are read twice, the pipeline runner can give us a
+        #buffer with its own memory budget
+        if not isinstance(sequences, SpillingBuffer):
+            sequences = SpillingBuffer(sequences)
         #now we run lucy
-        sequences, sequences_for_lucy = tee(sequences, 2)
-        seq_out_fhand = run_lucy_for_seqs(sequences_for_lucy)['sequence'][0]
+        seq_out_fhand = run_lucy_for_seqs(sequences)['sequence'][0]
 
-        # index the lucy result
-        result_index = SeqIO.index(seq_out_fhand.name, "fasta")
+        # index the lucy result, it is a temporary file so the index is not
+        # written to disk
+        result_index = index_seq_file(seq_out_fhand, 'fasta', persist=False)
 
         # process each sequence and
         for sequence in sequences:
             yield _lucy_mapper(sequence, result_index)
 
+        result_index.close()
         seq_out_fhand.close()
+        sequences.close()
 
     return strip_seq_by_quality_lucy
 
@@ -537,37 +765,99 @@ def create_adaptor_striper(adaptors, elongate_match_to_complete_adaptor=True):
     '''It creates a function capable of detecting adaptor sequences.
 
     The adaptors should be a fhand to a fasta file with the adaptors in it.
-    The adaptors will be detected by using blastn-short.
+    The adaptors will be detected in process by the SeedAligner with the
+    blastn-short word size and thresholds.
     '''
     fhand = get_fhand(adaptors)
     check_sequences_length(fhand, MIN_ADAPTOR_LENGTH, MAX_ADAPTOR_LENGTH)
     return _create_vector_striper(vectors=adaptors,
-                                  aligner='blast_short',
+                                  aligner='seed',
                                   vectors_are_blastdb=False,
                                   seqs_are_short=True,
           elongate_match_to_complete_adaptor=elongate_match_to_complete_adaptor)
 
-def create_vector_striper(vectors, vectors_are_blastdb=False):
+def create_batch_adaptor_striper(adaptors,
+                                 elongate_match_to_complete_adaptor=True):
+    '''It creates a function that removes the adaptors from lists of sequences.
+
+    It works like create_adaptor_striper, but it takes lists of sequences.
+    '''
+    fhand = get_fhand(adaptors)
+    check_sequences_length(fhand, MIN_ADAPTOR_LENGTH, MAX_ADAPTOR_LENGTH)
+    return _create_vector_striper(vectors=adaptors,
+                                  aligner='seed',
+                                  vectors_are_blastdb=False,
+                                  seqs_are_short=True,
+          elongate_match_to_complete_adaptor=elongate_match_to_complete_adaptor,
+                                  for_batches=True)
+
+def create_vector_striper(vectors, vectors_are_blastdb=False,
+                          vector_index=False):
     '''It returns a function capable of detecting vector sequences.
 
     The vectors could be an fhand to a fasta file or a blast database.
-    The vectors will be detected by using blastn
+    The vectors will be detected by using blastn. If vector_index is True the
+    blast databases with their fasta file in the same path will be searched
+    with a VectorIndex instead.
     '''
     if not vectors_are_blastdb:
         check_sequences_length(get_fhand(vectors), MAX_ADAPTOR_LENGTH)
     return _create_vector_striper(vectors, aligner='blastn',
                                   vectors_are_blastdb=vectors_are_blastdb,
                                   seqs_are_short=False,
-                                  elongate_match_to_complete_adaptor=False)
+                                  elongate_match_to_complete_adaptor=False,
+                                  vector_index=vector_index)
+
+def create_batch_vector_striper(vectors, vectors_are_blastdb=False,
+                                vector_index=False):
+    '''It creates a function that removes the vectors from lists of sequences.
+
+    It works like create_vector_striper, but blast is run once for every list.
+    '''
+    if not vectors_are_blastdb:
+        check_sequences_length(get_fhand(vectors), MAX_ADAPTOR_LENGTH)
+    return _create_vector_striper(vectors, aligner='blastn',
+                                  vectors_are_blastdb=vectors_are_blastdb,
+                                  seqs_are_short=False,
+                                  elongate_match_to_complete_adaptor=False,
+                                  for_batches=True, vector_index=vector_index)
+
+def _strip_vector_with_alignments(sequence, alignments,
+                                  elongate_match_to_complete_adaptor):
+    '''It strips the vector from a sequence given its alignments.
+
+    It returns a striped sequence with the longest segment without vector.
+    '''
+    if elongate_match_to_complete_adaptor:
+        _elongate_matches_to_complete_subject(alignments)
+
+    alignment_matches = _get_non_matched_locations(alignments)
+
+    segments  = _get_longest_non_matched_seq_region_limits(sequence,
+                                                          alignment_matches)
+
+    if segments is None:
+        return None
+
+    segments  = _get_non_matched_from_matched_locations([segments],
+                                                        len(sequence))
+    _add_trim_segments(segments, sequence)
+    return sequence
 
 def _create_vector_striper(vectors, aligner, vectors_are_blastdb=False,
                            seqs_are_short=False,
-                           elongate_match_to_complete_adaptor=False):
+                           elongate_match_to_complete_adaptor=False,
+                           for_batches=False, vector_index=False):
     '''It creates a function which will remove vectors from the given sequence.
 
     It looks for the vectors comparing the sequence with a vector database. To
     do these alignments two programs can be used, exonerate and blast. Exonerate
     requires a fasta file with the vectors and blast and indexed blast database.
+    The short vectors can also be aligned in process by the seed aligner. If
+    vector_index is True the blast databases formatted in place from a fasta
+    file are searched with a VectorIndex instead of blast.
+    If for_batches is True the function will take a list of sequences and
+    the aligner will be run once for all of them.
     '''
     #exonerate fails with sequences below 20 bp
     #blast_short starts to fail bellow 15 bases with 2% errors (although not as
@@ -582,6 +872,11 @@ def _create_vector_striper(vectors, aligner, vectors_are_blastdb=False,
                                      'dust':'20 1 64'},
                   'blast_short': {'task': 'blastn-short', 'expect': '0.0001',
                                   'subject': vectors, 'alig_format':6},
+                  #the blastn-short word size, the errors and length
+                  #allowed by its filters and about the score required by
+                  #its expect for an adaptor in a read
+                  'seed': {'word_size': 7, 'max_error_rate': 0.11,
+                           'min_length': 13, 'min_score': 14},
                  }
 
     #They filter matches not match parts
@@ -602,7 +897,11 @@ def _create_vector_striper(vectors, aligner, vectors_are_blastdb=False,
         aligner = None
     elif aligner == 'blast_short' or aligner == 'blastn':
         seq_type = 'blast_short' if seqs_are_short else 'blast_long'
-        if vectors_are_blastdb:
+        if (vector_index and vectors_are_blastdb and
+            can_index_vectors(vectors.name)):
+            aligner = VectorIndexAligner(database=vectors.name,
+                                         filters=filters[seq_type])
+        elif vectors_are_blastdb:
             aligner = BlastAligner(database=vectors,
                                    parameters=parameters[seq_type],
                                    filters=filters[seq_type])
@@ -610,6 +909,9 @@ def _create_vector_striper(vectors, aligner, vectors_are_blastdb=False,
             aligner = BlastAligner(subject=vectors,
                                    parameters=parameters[seq_type],
                                    filters=filters[seq_type])
+    elif aligner == 'seed':
+        aligner = SeedAligner(subject=vectors, parameters=parameters['seed'],
+                              filters=filters['blast_short'])
 
     def strip_vector_by_alignment(sequence):
         '''It strips the vector from a sequence.
@@ -622,23 +924,32 @@ def _create_vector_striper(vectors, aligner, vectors_are_blastdb=False,
             return sequence
 
         alignments = list(aligner.do_alignment(sequence))
+        return _strip_vector_with_alignments(sequence, alignments,
+                                             elongate_match_to_complete_adaptor)
 
-        if elongate_match_to_complete_adaptor:
-            _elongate_matches_to_complete_subject(alignments)
-
-        alignment_matches = _get_non_matched_locations(alignments)
-
-        segments  = _get_longest_non_matched_seq_region_limits(sequence,
-                                                              alignment_matches)
-
-        if segments is None:
-            return None
-
-        segments  = _get_non_matched_from_matched_locations([segments],
-                                                            len(sequence))
-        _add_trim_segments(segments, sequence)
-        return sequence
-
+    def strip_vector_by_alignment_for_batch(sequences):
+        'It strips the vector from a list of sequences'
+        if vectors is None:
+            return sequences
+        renamed_seqs, names = seqs_with_batch_names(sequences)
+        alignments_by_name = {}
+        if renamed_seqs:
+            for alignment in aligner.do_alignment(renamed_seqs):
+                name = alignment['query'].name
+                if name not in alignments_by_name:
+                    alignments_by_name[name] = []
+                alignments_by_name[name].append(alignment)
+        striped_seqs = []
+        for sequence, name in zip(sequences, names):
+            if sequence is not None:
+                sequence = _strip_vector_with_alignments(sequence,
+                                            alignments_by_name.get(name, []),
+                                            elongate_match_to_complete_adaptor)
+            striped_seqs.append(sequence)
+        return striped_seqs
+
+    if for_batches:
+        return strip_vector_by_alignment_for_batch
     return strip_vector_by_alignment
 
 def _elongate_matches_to_complete_subject(alignments, max_elongation=5):
@@ -671,12 +982,16 @@ def _elongate_matches_to_complete_subject(alignments, max_elongation=5):
             del match['scores']
             _fix_match_start_end(match)
 
-def create_re_word_striper(words):
+def create_re_word_striper(words, max_mismatches=0):
     '''It creates a function which will remove words from the given sequence.
 
     It matches the words against the sequence and leaves the longest non-matched
     part (unless is the first part of the sequence).
+    The words and their reverse complements are found with a WordMatcher
+    built once for all the sequences.
     '''
+    if words:
+        words = WordMatcher(words, max_mismatches=max_mismatches)
     def strip_words_by_matching(sequence):
         '''It strips the given words from a sequence.
 
@@ -794,28 +1109,14 @@ def _get_non_matched_locations(alignments):
                                   match_part['query_end']))
     return locations
 
+_UNMASKED_REGION = re.compile('[A-Z]+')
+
 def _get_unmasked_locations(seq):
     '''It detects the unmasked regions of a sequence
 
     It returns a list of (start, end) tuples'''
-
-    locations = []
-    in_masked_section = True
-    for i, letter in enumerate(seq):
-        unmasked =  str(letter).isupper()
-        if unmasked and in_masked_section:
-            start = i
-            in_masked_section = False
-        elif not unmasked and not in_masked_section:
-            end = i - 1
-            locations.append((start, end))
-            in_masked_section = True
-    else:
-        if unmasked and not in_masked_section:
-            end = i
-            locations.append((start, end))
-
-    return locations
+    return [(match.start(), match.end() - 1) for match in
+                                   _UNMASKED_REGION.finditer(str(seq.seq))]
 
 def _get_all_segments(segments, seq_len):
     '''Given a set of some non overlaping regions it returns all regions.
@@ -881,13 +1182,15 @@ def _get_longest_non_matched_seq_region_limits(seq, locations):
 
 def _get_matched_locations(seq, locations, min_length):
     'It returns a seq iterator from a seq. To split the seq it uses the'
-
+    #the seq and the qual are taken only once, not once for every region
+    full_seq = seq.seq
+    full_qual = seq.qual
     for i, (start, end) in enumerate(locations):
-        seq1 = seq.seq[start:end+1]
-        if len(seq1) < min_length:
+        if end + 1 - start < min_length:
             continue
-        if seq.qual is not None:
-            qual = seq.qual[start:end+1]
+        seq1 = full_seq[start:end+1]
+        if full_qual is not None:
+            qual = full_qual[start:end+1]
         else:
             qual = None
         if seq.name is not None:
@@ -21,11 +21,12 @@ can also return None if no sequence is left after the filtering process.
 # You should have received a copy of the GNU Affero General Public License
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
-from franklin.utils.cmd_utils import create_runner
+from franklin.utils.cmd_utils import create_runner, create_batch_runner
 from franklin.seq.writers import temp_fasta_file
 from franklin.seq.alignment_result import (filter_alignments,
                                            get_alignment_parser)
-from franklin.seq.seq_analysis import look_for_similar_sequences
+from franklin.seq.seq_analysis import (look_for_similar_sequences,
+                                       similar_sequences_by_query_for_blast)
 
 def create_similar_seqs_filter(db, blast_program, reverse=False, filters=None):
     '''It creates a filter that looks for similar seqs in a database. It return
@@ -42,6 +43,35 @@ def create_similar_seqs_filter(db, blast_program, reverse=False, filters=None):
 
     return filter_by_similar_seqs
 
+def create_batch_similar_seqs_filter(db, blast_program, reverse=False,
+                                     filters=None):
+    '''It creates a filter that looks for similar seqs for lists of sequences.
+
+    It works like create_similar_seqs_filter, but blast is run once for every
+    list. It returns a list with the same length, the sequences that do not
+    pass the filter are replaced by None.
+    '''
+    run_blast_for_seqs = create_batch_runner(tool=blast_program,
+                                             parameters={'database': db})
+    def filter_by_similar_seqs(sequences):
+        'It returns the sequences that pass the filter or None'
+        results, names = run_blast_for_seqs(sequences)
+        if results is None:
+            similar_seqs = {}
+        else:
+            similar_seqs = similar_sequences_by_query_for_blast(
+                                                    results[blast_program],
+                                                    filters=filters)
+        filtered_seqs = []
+        for sequence, name in zip(sequences, names):
+            if sequence is not None:
+                has_similar_seqs = len(similar_seqs.get(name, [])) >= 1
+                if has_similar_seqs == reverse:
+                    sequence = None
+            filtered_seqs.append(sequence)
+        return filtered_seqs
+    return filter_by_similar_seqs
+
 def create_aligner_filter(aligner_cmd, cmd_parameters, match_filters=None,
                           environment=None):
     '''A function factory factory that creates aligner filters.
@@ -73,6 +103,32 @@ def create_aligner_filter(aligner_cmd, cmd_parameters, match_filters=None,
         return True
     return _filter
 
+def create_batch_aligner_filter(aligner_cmd, cmd_parameters, match_filters=None,
+                                environment=None):
+    '''It creates an aligner filter for lists of sequences.
+
+    It works like create_aligner_filter, but the aligner is run once for every
+    list. It returns a list with the same length, the sequences without a
+    match are replaced by None.
+    '''
+    parser = get_alignment_parser(aligner_cmd)
+
+    run_align_for_seqs = create_batch_runner(tool=aligner_cmd,
+                                             environment=environment,
+                                             parameters=cmd_parameters)
+    def _filter(sequences):
+        'It returns the sequences with a match or None'
+        results, names = run_align_for_seqs(sequences)
+        matched_names = set()
+        if results is not None:
+            alignments = parser(results[aligner_cmd])
+            for alignment in filter_alignments(alignments,
+                                               config=match_filters):
+                matched_names.add(alignment['query'].name)
+        return [sequence if name in matched_names else None
+                                  for sequence, name in zip(sequences, names)]
+    return _filter
+
 def create_length_filter(length, count_masked=True):
     '''It return a function that can check if the sequence is long enough '''
 
@@ -99,21 +155,22 @@ def _count_non_masked(sequence):
             sequence_length += 1
     return sequence_length
 
+# This filter are bases in seqclean defaults
+CONTAMINANT_MATCH_FILTERS = [{'kind'    : 'score_threshold',
+                              'score_key': 'similarity',
+                              'min_score': 96},
+                             {'kind'          : 'min_length',
+                              'min_percentage' :60,
+                              'length_in_query':False }]
+
 def create_comtaminant_filter(contaminant_db, environment=None):
     '''It creates a filter that return False if the sequence has a strong match
      with the database
     '''
-    # This filter are bases in seqclean defaults
     parameters     =  {'database':contaminant_db}
-    match_filters  = [{'kind'    : 'score_threshold',
-                      'score_key': 'similarity',
-                      'min_score': 96},
-                      {'kind'          : 'min_length',
-                       'min_percentage' :60,
-                       'length_in_query':False }]
     match_filter = create_aligner_filter(aligner_cmd='blastn',
                                     cmd_parameters=parameters,
-                                    match_filters=match_filters,
+                                    match_filters=CONTAMINANT_MATCH_FILTERS,
                                     environment=environment )
 
     def filter_(sequence):
@@ -121,6 +178,18 @@ def create_comtaminant_filter(contaminant_db, environment=None):
         return match_filter(sequence)
     return filter_
 
+def create_batch_comtaminant_filter(contaminant_db, environment=None):
+    '''It creates a contaminant filter for lists of sequences.
+
+    It works like create_comtaminant_filter, but blast is run once for every
+    list.
+    '''
+    parameters     =  {'database':contaminant_db}
+    return create_batch_aligner_filter(aligner_cmd='blastn',
+                                       cmd_parameters=parameters,
+                                       match_filters=CONTAMINANT_MATCH_FILTERS,
+                                       environment=environment)
+
 def create_solid_quality_filter(length=10, threshold=15, call_missing=True):
     '''It creates a filter that removes the sequences looking in the quality of
     the sequence.
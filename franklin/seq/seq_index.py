@@ -0,0 +1,247 @@
+'''
+It indexes the sequence files to get any sequence by its name.
+
+The index is similar to the samtools .fai one. It is a tab delimited file
+written next to the sequence file with the position of every record. It is
+built once and it is used again while the size and the modification time of
+the sequence file do not change. The sequences are taken from the file
+through mmap, so the sequence or a subsequence of any record can be fetched
+without reading the rest of the file. The fasta, fastq and pickle files can be
+indexed.
+
+Created on 17/10/2026
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import os, mmap, tempfile, random
+
+from franklin.seq.readers import (guess_seq_file_format, record_entry_kind,
+                                  seq_from_record, RECORD_ENTRY_SCANNERS)
+
+INDEX_EXTENSION = '.fidx'
+INDEX_VERSION = '1'
+INDEX_HEADER = '#franklin_seq_index'
+
+def _index_format(file_format):
+    'It returns the kind of index used for the given file format'
+    kind = record_entry_kind(file_format)
+    if kind is None:
+        msg = 'The %s sequence files can not be indexed' % file_format
+        raise ValueError(msg)
+    return kind
+
+def _file_signature(fpath):
+    'It returns the size and the modification time of the file as strings'
+    stat = os.stat(fpath)
+    return str(stat.st_size), '%.6f' % stat.st_mtime
+
+def build_seq_index(fpath, file_format, index_fpath=None):
+    '''It writes the index for the sequence file and it returns its path.
+
+    By default the index is written next to the sequence file. It is written
+    in a temporary file that is renamed at the end, so a process will never
+    read an unfinished index.
+    '''
+    if index_fpath is None:
+        index_fpath = fpath + INDEX_EXTENSION
+    size, mtime = _file_signature(fpath)
+    index_dir = os.path.dirname(index_fpath) or '.'
+    index_fhand = tempfile.NamedTemporaryFile(suffix=INDEX_EXTENSION,
+                                              dir=index_dir, delete=False)
+    try:
+        index_fhand.write('\t'.join([INDEX_HEADER, INDEX_VERSION, file_format,
+                                     size, mtime]) + '\n')
+        entries = RECORD_ENTRY_SCANNERS[_index_format(file_format)]
+        _write_index_entries(entries(open(fpath, 'rb')), index_fhand)
+        index_fhand.close()
+        os.rename(index_fhand.name, index_fpath)
+    except Exception:
+        index_fhand.close()
+        os.remove(index_fhand.name)
+        raise
+    return index_fpath
+
+def _read_index_header(index_fpath):
+    'It returns the format, size and mtime stored in the index'
+    header = open(index_fpath).readline().rstrip('\n').split('\t')
+    if len(header) != 5 or header[:2] != [INDEX_HEADER, INDEX_VERSION]:
+        return None
+    return header[2:]
+
+def _index_is_valid(fpath, file_format, index_fpath):
+    'It returns True if the index exists and the file has not been changed'
+    if not os.path.exists(index_fpath):
+        return False
+    header = _read_index_header(index_fpath)
+    if header is None:
+        return False
+    return header == [file_format] + list(_file_signature(fpath))
+
+def _read_index(index_fhand):
+    'It returns a dict with the index entries by name'
+    index_fhand.readline()
+    entries = {}
+    for line in index_fhand:
+        fields = line.rstrip('\n').split('\t')
+        entries[fields[0]] = tuple([int(field) for field in fields[1:]])
+    return entries
+
+def _write_index_entries(entries, index_fhand):
+    'It writes the index entries, one by line'
+    for entry in entries:
+        index_fhand.write('\t'.join([str(field) for field in entry]) + '\n')
+
+class SeqIndex(object):
+    '''It gives the sequences of an indexed file by name.
+
+    The index is written next to the file the first time, it will be rebuilt
+    if the file changes. If persist is False or the directory can not be
+    written the index is only kept in memory. The file is read with mmap, so
+    the index can be used by several threads at the same time. It can also
+    be pickled to be sent to other processes, they will reuse the same index
+    file.
+    '''
+    def __init__(self, fpath, file_format=None, index_fpath=None,
+                 persist=True):
+        'It inits the index, building it if required'
+        self.fpath = fpath
+        if file_format is None:
+            file_format = guess_seq_file_format(open(fpath))
+        self.file_format = file_format
+        self._kind = _index_format(file_format)
+        if index_fpath is None:
+            index_fpath = fpath + INDEX_EXTENSION
+        self.index_fpath = index_fpath
+        self._persist = persist
+        self._entries = self._load_entries()
+        self._fhand = open(fpath, 'rb')
+        if os.path.getsize(fpath):
+            self._mmap = mmap.mmap(self._fhand.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        else:
+            self._mmap = ''
+
+    def _load_entries(self):
+        'It reads the index, it builds it if it is not up to date'
+        fpath, index_fpath = self.fpath, self.index_fpath
+        if self._persist:
+            if not _index_is_valid(fpath, self.file_format, index_fpath):
+                try:
+                    build_seq_index(fpath, self.file_format, index_fpath)
+                except (IOError, OSError):
+                    self._persist = False
+            if self._persist:
+                return _read_index(open(index_fpath))
+        entries = RECORD_ENTRY_SCANNERS[self._kind](open(fpath, 'rb'))
+        return dict([(entry[0], entry[1:]) for entry in entries])
+
+    def __getstate__(self):
+        'It returns the state without the open file and the mmap'
+        return {'fpath': self.fpath, 'file_format': self.file_format,
+                'index_fpath': self.index_fpath, 'persist': self._persist}
+
+    def __setstate__(self, state):
+        'It opens the index again in the new process'
+        self.__init__(state['fpath'], file_format=state['file_format'],
+                      index_fpath=state['index_fpath'],
+                      persist=state['persist'])
+
+    def __len__(self):
+        'It returns the number of indexed sequences'
+        return len(self._entries)
+
+    def __contains__(self, name):
+        'It returns True if the sequence is in the index'
+        return name in self._entries
+
+    def __iter__(self):
+        'It yields the names of the indexed sequences'
+        return iter(self._entries)
+
+    def keys(self):
+        'It returns the names of the indexed sequences'
+        return self._entries.keys()
+
+    def get_raw(self, name):
+        'It returns the text of the record in the file'
+        offset, length = self._entries[name][:2]
+        return self._mmap[offset:offset + length]
+
+    def __getitem__(self, name):
+        'It returns the sequence with the given name'
+        return seq_from_record(self.get_raw(name), self.file_format)
+
+    def get(self, name, default=None):
+        'It returns the sequence or default if it is not in the index'
+        if name not in self._entries:
+            return default
+        return self[name]
+
+    def get_seq_length(self, name):
+        'It returns the length of the sequence without reading it'
+        if self._kind == 'pickle':
+            return len(self[name])
+        return self._entries[name][3]
+
+    def get_subseq(self, name, start=0, end=None):
+        '''It returns the sequence string between the given coordinates.
+
+        The coordinates are like the python slices. Only the bytes of the
+        subsequence are read if all the lines of the record have the same
+        length.
+        '''
+        entry = self._entries[name]
+        seq_offset, seq_length, line_bases, line_bytes = entry[2:]
+        if not line_bases:
+            return str(self[name].seq)[start:end]
+        start, end = slice(start, end).indices(seq_length)[:2]
+        if start >= end:
+            return ''
+        start_byte = (seq_offset + (start // line_bases) * line_bytes +
+                      start % line_bases)
+        end -= 1
+        end_byte = (seq_offset + (end // line_bases) * line_bytes +
+                    end % line_bases + 1)
+        subseq = self._mmap[start_byte:end_byte]
+        return subseq.replace('\n', '').replace('\r', '')
+
+    def sample(self, sample_size):
+        '''It yields a random sample of the indexed sequences.
+
+        The sequences are chosen by name and they are yielded in the file
+        order.
+        '''
+        names = self._entries.keys()
+        if sample_size < len(names):
+            names = random.sample(names, sample_size)
+        names.sort(key=lambda name: self._entries[name][0])
+        for name in names:
+            yield self[name]
+
+    def close(self):
+        'It closes the sequence file'
+        if self._mmap:
+            self._mmap.close()
+        self._fhand.close()
+
+def index_seq_file(fhand, file_format=None, persist=True):
+    '''It returns a SeqIndex for the given file or file path.
+
+    It can be used instead of the biopython SeqIO.index.
+    '''
+    fpath = fhand if isinstance(fhand, basestring) else fhand.name
+    return SeqIndex(fpath, file_format=file_format, persist=persist)
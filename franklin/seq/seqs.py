@@ -21,15 +21,17 @@ Created on 2009 mar 27
 
 from uuid import uuid4
 
-import copy
+import copy, math
+from array import array
 
-from Bio.SeqRecord import SeqRecord
+from Bio.SeqRecord import SeqRecord, _RestrictedDict
 from Bio.Seq import Seq as BioSeq
 from Bio.Seq import UnknownSeq
 from Bio.SeqFeature import SeqFeature as BioSeqFeature
 from Bio.SeqFeature import FeatureLocation
 from Bio.Alphabet import (DNAAlphabet, ProteinAlphabet, Alphabet,
-                          NucleotideAlphabet, SingleLetterAlphabet)
+                          NucleotideAlphabet, SingleLetterAlphabet,
+                          single_letter_alphabet)
 
 def copy_seq_with_quality(seqwithquality, seq=None, qual=None, name=None,
                           id_=None):
@@ -37,6 +39,8 @@ def copy_seq_with_quality(seqwithquality, seq=None, qual=None, name=None,
 
     This is necessary because our SeqWithQuality is inmutable
     '''
+    if isinstance(seqwithquality, CompactSeqWithQuality):
+        return seqwithquality.copy(seq=seq, qual=qual, name=name, id_=id_)
     if seq is None:
         seq = seqwithquality.seq
     if id_ is  None:
@@ -196,6 +200,17 @@ def fix_seq_struct_for_json(struct, alleles_to_string):
 
 def reverse_complement(seqrecord):
     'It return the reverse and complement sequence'
+    if isinstance(seqrecord, CompactSeqWithQuality):
+        return seqrecord.reverse_complement()
+    return _reverse_complement_seqrecord(seqrecord,
+                                  reverse_complement_str(str(seqrecord.seq)))
+
+def _reverse_complement_seqrecord(seqrecord, rev_seq):
+    '''It returns the reverse complemented seqrecord given its reversed seq.
+
+    Like the complement and the reverse slice done before it only keeps the
+    quality, the features and the annotations are lost.
+    '''
     try:
         qual = seqrecord.qual
     except AttributeError:
@@ -203,15 +218,39 @@ def reverse_complement(seqrecord):
             qual = seqrecord.letter_annotations['phred_quality']
         except:
             qual = None
-    seqwithqual =  SeqWithQuality(id=seqrecord.id, name=seqrecord.name,
-                                  description=seqrecord.description,
-                                  dbxrefs=seqrecord.dbxrefs,
-                                  features=seqrecord.features,
-                                  annotations=seqrecord.annotations,
-                                  qual=qual, seq=Seq(str(seqrecord.seq)))
-    seqwithqual = seqwithqual.complement()
+    if qual is not None:
+        qual = qual[::-1]
+    return SeqWithQuality(seq=Seq(rev_seq), id=seqrecord.id + '_complemented',
+                          name=seqrecord.name + '_complemented',
+                          description=seqrecord.description, qual=qual)
 
-    return seqwithqual[::-1]
+def reverse_complement_seqs(seqrecords):
+    '''It returns a list with the reverse complement of every seqrecord.
+
+    The sequences that use the same complement table are joined and they are
+    translated and reversed at once.
+    '''
+    seqrecords = list(seqrecords)
+    str_seqs = [str(seqrec.seq) for seqrec in seqrecords]
+    alphabets = [seqrec._alphabet if isinstance(seqrec, CompactSeqWithQuality)
+                                  else None for seqrec in seqrecords]
+    tables = set([_complement_table(str_seq, alphabet) for str_seq, alphabet
+                                                 in zip(str_seqs, alphabets)])
+    if len(tables) != 1:
+        return [reverse_complement(seqrec) for seqrec in seqrecords]
+    rev_seqs = ''.join(str_seqs).translate(tables.pop())[::-1]
+    rev_seqrecords = []
+    end = len(rev_seqs)
+    for seqrec, str_seq in zip(seqrecords, str_seqs):
+        start = end - len(str_seq)
+        rev_seq = rev_seqs[start:end]
+        end = start
+        if isinstance(seqrec, CompactSeqWithQuality):
+            rev_seqrecords.append(seqrec.reverse_complement(rev_seq))
+        else:
+            rev_seqrecords.append(_reverse_complement_seqrecord(seqrec,
+                                                                rev_seq))
+    return rev_seqrecords
 
 class SeqWithQuality(SeqRecord):
     '''A wrapper around Biopython's SeqRecord that adds a couple of convenience
@@ -387,6 +426,466 @@ class SeqWithQuality(SeqRecord):
         elif kind == 'description':
             self.description = UNKNOWN_DESCRIPTION
 
+_INVALID_QUAL = chr(255)
+
+def _solexa_to_phred(qual):
+    'It converts a solexa quality into a phred quality'
+    return int(10 * math.log(10 ** (qual / 10.0) + 1, 10))
+
+def _create_quality_table(offset, min_qual, max_qual, converter=None):
+    '''It returns a str.translate table that decodes a fastq quality string.
+
+    Every character is translated into the character whose code is its phred
+    quality. The characters out of the min_qual, max_qual range are translated
+    into _INVALID_QUAL.
+    '''
+    table = []
+    for code in range(256):
+        qual = code - offset
+        if min_qual <= qual <= max_qual:
+            if converter is not None:
+                qual = converter(qual)
+            table.append(chr(qual))
+        else:
+            table.append(_INVALID_QUAL)
+    return ''.join(table)
+
+#the tables for the fastq quality encodings
+QUALITY_TABLES = {'sanger': _create_quality_table(33, 0, 93),
+                  'illumina': _create_quality_table(64, 0, 62),
+                  'solexa': _create_quality_table(64, -5, 62,
+                                                  _solexa_to_phred)}
+
+def decode_quality(quality, encoding, as_array=False):
+    '''It returns the phred qualities encoded in the given string.
+
+    The encoding can be sanger, illumina or solexa for the fastq quality
+    strings or qual for the numbers found in a qual file. The negative numbers
+    of a qual file are changed to 0. If as_array is True an array('B') is
+    returned instead of a list.
+    '''
+    if encoding == 'qual':
+        quals = map(int, quality.split())
+        if quals and min(quals) < 0:
+            quals = [max(0, qual) for qual in quals]
+        return array('B', quals) if as_array else quals
+    decoded = quality.translate(QUALITY_TABLES[encoding])
+    if _INVALID_QUAL in decoded:
+        raise ValueError('Invalid character in quality string')
+    quals = array('B', decoded)
+    return quals if as_array else quals.tolist()
+
+class LazySeqWithQuality(SeqWithQuality):
+    '''A SeqWithQuality that builds its parts when they are first used.
+
+    The readers create it with from_raw giving the strings found in the file.
+    The sequence, the quality and the description are built when they are
+    accessed for the first time, so the steps that only look at the name or the
+    length do not pay for the rest.
+    '''
+    @classmethod
+    def from_raw(cls, name, title, seq, qual=None, qual_encoding=None):
+        '''It returns a new sequence from the strings read from a file.
+
+        The description is taken from the title, the words after the first
+        one. The qual is decoded with decode_quality and the qual_encoding.
+        '''
+        seqrec = cls.__new__(cls)
+        seqrec.__dict__.update({'id': name, 'name': name, 'dbxrefs': [],
+                                'annotations': {}, 'features': [],
+                                '_raw_title': title, '_raw_seq': seq,
+                                '_raw_qual': qual,
+                                '_qual_encoding': qual_encoding})
+        return seqrec
+
+    def __getattr__(self, name):
+        'It builds the sequence, the quality or the description if required'
+        state = self.__dict__
+        if name == '_seq' and '_raw_seq' in state:
+            self._seq = Seq(state['_raw_seq'], single_letter_alphabet)
+            del state['_raw_seq']
+            return self._seq
+        elif name == '_per_letter_annotations' and '_raw_qual' in state:
+            letter_annotations = _RestrictedDict(length=len(self))
+            if state['_raw_qual'] is not None:
+                letter_annotations['phred_quality'] = decode_quality(
+                                                     state['_raw_qual'],
+                                                     state['_qual_encoding'])
+            self._per_letter_annotations = letter_annotations
+            del state['_raw_qual']
+            del state['_qual_encoding']
+            return letter_annotations
+        elif name == 'description' and '_raw_title' in state:
+            self.description = ' '.join(state['_raw_title'].split(' ')[1:])
+            del state['_raw_title']
+            return self.description
+        raise AttributeError(name)
+
+    def __len__(self):
+        'It returns the length without building the sequence'
+        if '_raw_seq' in self.__dict__:
+            return len(self.__dict__['_raw_seq'])
+        return len(self.seq)
+
+    def materialize(self):
+        'It builds all the parts not built yet and it returns the sequence'
+        for name in ('_seq', '_per_letter_annotations', 'description'):
+            getattr(self, name)
+        return self
+
+    def __repr__(self):
+        'It writes the same representation as a SeqWithQuality'
+        toprint = SeqWithQuality.__repr__(self)
+        return 'SeqWithQuality' + toprint[len(self.__class__.__name__):]
+
+class CompactSeqWithQuality(object):
+    '''A SeqWithQuality like read that uses less memory.
+
+    The sequence is kept as a str and the quality as an array('B'), the
+    annotations, the letter annotations other than the quality, the dbxrefs
+    and the features are only created when they are used. It has the same
+    interface used by the cleaning steps: seq, qual, name, id, description,
+    annotations, features, slicing, upper, complement and reverse_complement.
+    The seq and qual properties build a Seq and a list every time they are
+    read, the steps that can should use str_seq and qual_array.
+
+    A slice is a view, it shares the str and the array of the read it comes
+    from and it only keeps the window limits. The window is copied the first
+    time str_seq or qual_array are used, so a read trimmed several times is
+    only copied once.
+    '''
+    __slots__ = ('_str_seq', '_qual_array', '_window', 'id', 'name',
+                 'description', '_alphabet', '_annotations', '_features',
+                 '_dbxrefs', '_letter_annotations')
+
+    def __init__(self, seq, id=UNKNOWN_ID, name=UNKNOWN_NAME,
+                 description=UNKNOWN_DESCRIPTION, dbxrefs=None,
+                 features=None, annotations=None, letter_annotations=None,
+                 qual=None, alphabet=None):
+        '''It inits the read.
+
+        The seq can be a str or a Seq and the qual any iterable with integers
+        between 0 and 255.
+        '''
+        if id == UNKNOWN_ID and name != UNKNOWN_NAME:
+            id = name
+        self.id = id
+        self.name = name
+        self.description = description
+        self._alphabet = alphabet
+        self._window = None
+        self._qual_array = None
+        self.seq = seq
+        self._letter_annotations = None
+        self._annotations = annotations or None
+        self._features = features or None
+        self._dbxrefs = dbxrefs or None
+        if letter_annotations:
+            self.letter_annotations = letter_annotations
+        if qual is not None:
+            self.qual = qual
+
+    @classmethod
+    def from_seq_with_quality(cls, seqrec):
+        'It returns a compact read with the contents of a SeqRecord'
+        return cls(seqrec.seq, id=seqrec.id, name=seqrec.name,
+                   description=seqrec.description, dbxrefs=seqrec.dbxrefs,
+                   features=seqrec.features, annotations=seqrec.annotations,
+                   letter_annotations=seqrec.letter_annotations)
+
+    def to_seq_with_quality(self):
+        'It returns a SeqWithQuality with the same contents'
+        return SeqWithQuality(self.seq, id=self.id, name=self.name,
+                              description=self.description,
+                              dbxrefs=self.dbxrefs, features=self.features,
+                              annotations=self.annotations,
+                              letter_annotations=self.letter_annotations)
+
+    def materialize(self):
+        'It copies the window of a view and it returns the read'
+        if self._window is not None:
+            start, stop = self._window
+            self._window = None
+            self._str_seq = self._str_seq[start:stop]
+            if self._qual_array is not None:
+                self._qual_array = self._qual_array[start:stop]
+        return self
+
+    def _get_str_seq(self):
+        'It returns the sequence str'
+        if self._window is not None:
+            self.materialize()
+        return self._str_seq
+    def _set_str_seq(self, str_seq):
+        'It sets the sequence str'
+        self.materialize()
+        self._str_seq = str_seq
+    str_seq = property(_get_str_seq, _set_str_seq)
+
+    def _get_qual_array(self):
+        'It returns the quality array'
+        if self._window is not None:
+            self.materialize()
+        return self._qual_array
+    def _set_qual_array(self, qual_array):
+        'It sets the quality array'
+        self.materialize()
+        self._qual_array = qual_array
+    qual_array = property(_get_qual_array, _set_qual_array)
+
+    def __getstate__(self):
+        'It returns the state to pickle the read, a view is copied'
+        self.materialize()
+        return dict([(slot, getattr(self, slot)) for slot in self.__slots__])
+
+    def __setstate__(self, state):
+        'It restores the pickled state'
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def _get_seq(self):
+        'It returns the sequence as a Seq'
+        if self._alphabet is None:
+            return Seq(self.str_seq, single_letter_alphabet)
+        return Seq(self.str_seq, self._alphabet)
+    def _set_seq(self, seq):
+        'It sets the sequence from a str or a Seq'
+        if isinstance(seq, basestring):
+            self.str_seq = str(seq)
+        else:
+            if seq.alphabet != single_letter_alphabet:
+                self._alphabet = seq.alphabet
+            self.str_seq = str(seq)
+    seq = property(_get_seq, _set_seq)
+
+    def _get_qual(self):
+        'It returns the quality as a list'
+        if self.qual_array is None:
+            return None
+        return self.qual_array.tolist()
+    def _set_qual(self, qual):
+        'It stores the quality in an array'
+        if qual is None:
+            self.qual_array = None
+            return
+        if len(qual) != len(self.str_seq):
+            msg = 'The quality and the sequence should have the same length'
+            raise ValueError(msg)
+        if isinstance(qual, array) and qual.typecode == 'B':
+            self.qual_array = qual
+        else:
+            self.qual_array = array('B', qual)
+    qual = property(_get_qual, _set_qual)
+
+    def _get_annotations(self):
+        'It returns the annotations dict, it is created when required'
+        if self._annotations is None:
+            self._annotations = {}
+        return self._annotations
+    def _set_annotations(self, annotations):
+        'It sets the annotations dict'
+        self._annotations = annotations
+    annotations = property(_get_annotations, _set_annotations)
+
+    def _get_features(self):
+        'It returns the features list, it is created when required'
+        if self._features is None:
+            self._features = []
+        return self._features
+    def _set_features(self, features):
+        'It sets the features list'
+        self._features = features
+    features = property(_get_features, _set_features)
+
+    def _get_dbxrefs(self):
+        'It returns the dbxrefs list, it is created when required'
+        if self._dbxrefs is None:
+            self._dbxrefs = []
+        return self._dbxrefs
+    def _set_dbxrefs(self, dbxrefs):
+        'It sets the dbxrefs list'
+        self._dbxrefs = dbxrefs
+    dbxrefs = property(_get_dbxrefs, _set_dbxrefs)
+
+    def _get_letter_annotations(self):
+        '''It returns a dict with the letter annotations.
+
+        The dict is a new one, the changes in it are not kept unless it is
+        set again.
+        '''
+        letter_annotations = _RestrictedDict(length=len(self))
+        if self._letter_annotations:
+            letter_annotations.update(self._letter_annotations)
+        if self._qual_array is not None:
+            letter_annotations['phred_quality'] = self.qual
+        return letter_annotations
+    def _set_letter_annotations(self, letter_annotations):
+        'It sets the letter annotations, the quality is kept as an array'
+        letter_annotations = dict(letter_annotations)
+        self.qual = letter_annotations.pop('phred_quality', None)
+        self._letter_annotations = letter_annotations or None
+    letter_annotations = property(_get_letter_annotations,
+                                  _set_letter_annotations)
+
+    def __len__(self):
+        'It returns the sequence length'
+        if self._window is not None:
+            return self._window[1] - self._window[0]
+        return len(self._str_seq)
+
+    def __nonzero__(self):
+        'A read is always True, even an empty one, like a SeqRecord'
+        return True
+
+    def __iter__(self):
+        'It yields the sequence letters'
+        return iter(self.str_seq)
+
+    def __contains__(self, char):
+        'It returns True if the string is in the sequence'
+        return str(char) in self.str_seq
+
+    def _new(self, str_seq, qual_array, id_, name, description=None,
+             letter_annotations=None, window=None):
+        'It returns a new read with the given parts'
+        new_seq = CompactSeqWithQuality.__new__(self.__class__)
+        new_seq._str_seq = str_seq
+        new_seq._qual_array = qual_array
+        new_seq._window = window
+        new_seq.id = id_
+        new_seq.name = name
+        if description is None:
+            description = self.description
+        new_seq.description = description
+        new_seq._alphabet = self._alphabet
+        new_seq._annotations = None
+        new_seq._features = None
+        new_seq._dbxrefs = None
+        new_seq._letter_annotations = letter_annotations
+        return new_seq
+
+    def __getitem__(self, index):
+        '''It returns a letter or a new read with the slice.
+
+        Like a SeqRecord slice the features fully included in the slice are
+        kept, the annotations and the dbxrefs are not. A slice with step 1 is
+        a view that shares the sequence and the quality with this read.
+        '''
+        length = len(self)
+        offset = 0 if self._window is None else self._window[0]
+        if isinstance(index, (int, long)):
+            if index < 0:
+                index += length
+            if not 0 <= index < length:
+                raise IndexError('sequence index out of range')
+            return self._str_seq[offset + index]
+        start, stop, step = index.indices(length)
+        letter_annotations = None
+        if self._letter_annotations:
+            letter_annotations = dict([(key, value[index]) for key, value in
+                                          self._letter_annotations.items()])
+        if step == 1:
+            stop = max(start, stop)
+            new_seq = self._new(self._str_seq, self._qual_array, self.id,
+                                self.name,
+                                letter_annotations=letter_annotations,
+                                window=(offset + start, offset + stop))
+        else:
+            qual = self.qual_array
+            if qual is not None:
+                qual = qual[index]
+            new_seq = self._new(self.str_seq[index], qual, self.id,
+                                self.name,
+                                letter_annotations=letter_annotations)
+        if step == 1 and self._features:
+            for feature in self._features:
+                if (start <= feature.location.nofuzzy_start and
+                    feature.location.nofuzzy_end <= stop):
+                    new_seq.features.append(feature._shift(-start))
+        return new_seq
+
+    def __add__(self, seq2):
+        'It returns a new read with both seq and qual joined'
+        qual = None
+        if self.qual_array is not None and seq2.qual is not None:
+            qual = self.qual_array + array('B', seq2.qual)
+        return self._new(self.str_seq + str(seq2.seq), qual,
+                         self.id + '+' + seq2.id, self.name + '+' + seq2.name,
+                         description=UNKNOWN_DESCRIPTION)
+
+    def _copy_annotations(self, new_seq):
+        'It shares the annotations, features and dbxrefs with the new read'
+        new_seq._annotations = self._annotations
+        new_seq._features = self._features
+        new_seq._dbxrefs = self._dbxrefs
+        return new_seq
+
+    def copy(self, seq=None, qual=None, name=None, id_=None):
+        '''It returns a new read with the seq, qual, name or id changed.
+
+        It is the copy_seq_with_quality for the compact reads.
+        '''
+        new_seq = self._copy_annotations(self._new(self._str_seq,
+                                           self._qual_array,
+                                           self.id if id_ is None else id_,
+                                           self.name if name is None else name,
+                                           letter_annotations=
+                                                 self._letter_annotations,
+                                           window=self._window))
+        if seq is not None:
+            new_seq.seq = seq
+        if qual is not None:
+            new_seq.qual = qual
+        return new_seq
+
+    def upper(self):
+        'It returns the sequence upper cased'
+        return self._copy_annotations(self._new(self.str_seq.upper(),
+                                                self.qual_array, self.id,
+                                                self.name,
+                                                letter_annotations=
+                                                 self._letter_annotations))
+
+    def complement(self):
+        'It returns a new read with the complementary strand of the seq'
+        complement = str(self.seq.complement())
+        return self._copy_annotations(self._new(complement, self.qual_array,
+                                                self.id + '_complemented',
+                                                self.name + '_complemented',
+                                                letter_annotations=
+                                                 self._letter_annotations))
+
+    def reverse_complement(self, rev_seq=None):
+        '''It returns a new read with the reverse complement of the seq.
+
+        Like the reverse_complement function it does not keep the features nor
+        the annotations. The reverse complemented str can be given if it is
+        already known.
+        '''
+        if rev_seq is None:
+            rev_seq = reverse_complement_str(self.str_seq, self._alphabet)
+        qual = self.qual_array
+        if qual is not None:
+            qual = qual[::-1]
+        letter_annotations = None
+        if self._letter_annotations:
+            letter_annotations = dict([(key, value[::-1]) for key, value in
+                                          self._letter_annotations.items()])
+        return self._new(rev_seq, qual, self.id + '_complemented',
+                         self.name + '_complemented',
+                         letter_annotations=letter_annotations)
+
+    def __repr__(self):
+        'It writes the same representation as a SeqWithQuality'
+        return repr(self.to_seq_with_quality())
+
+    #these methods only use the SeqRecord like interface
+    get_features = SeqWithQuality.get_features.im_func
+    get_sorted_features = SeqWithQuality.get_sorted_features.im_func
+    remove_annotations = SeqWithQuality.remove_annotations.im_func
+    _from_seq_to_struct = SeqWithQuality._from_seq_to_struct.im_func
+    struct = property(SeqWithQuality._get_struct.im_func)
+
 class SeqOnlyName(object):
     'A SeqWithQuality like without sequence or sequence length'
     def __init__(self, id=UNKNOWN_ID, name=UNKNOWN_NAME):
@@ -447,6 +946,32 @@ def _maketrans(complement_mapping) :
 _dna_complement_table = _maketrans(ambiguous_dna_complement)
 _rna_complement_table = _maketrans(ambiguous_rna_complement)
 
+def _complement_table(str_seq, alphabet=None):
+    '''It returns the translation table to complement the sequence.
+
+    The table depends on the alphabet, if it is not a DNA or RNA one it is
+    guessed from the letters found in the sequence.
+    '''
+    if alphabet is not None:
+        base = Alphabet._get_base_alphabet(alphabet)
+        if isinstance(base, Alphabet.ProteinAlphabet) :
+            raise ValueError("Proteins do not have complements!")
+        if isinstance(base, Alphabet.DNAAlphabet) :
+            return _dna_complement_table
+        elif isinstance(base, Alphabet.RNAAlphabet) :
+            return _rna_complement_table
+    if ('U' in str_seq or 'u' in str_seq) \
+       and ('T' in str_seq or 't' in str_seq):
+        #TODO - Handle this cleanly?
+        raise ValueError("Mixed RNA/DNA found")
+    elif 'U' in str_seq or 'u' in str_seq:
+        return _rna_complement_table
+    return _dna_complement_table
+
+def reverse_complement_str(str_seq, alphabet=None):
+    'It returns the reverse complement of a sequence str'
+    return str_seq.translate(_complement_table(str_seq, alphabet))[::-1]
+
 class Seq(BioSeq):
     'A biopython Seq with some extra functionality'
     def __eq__(self, seq):
@@ -485,25 +1010,17 @@ class Seq(BioSeq):
            ...
         ValueError: Proteins do not have complements!
         """
-        base = Alphabet._get_base_alphabet(self.alphabet)
-        if isinstance(base, Alphabet.ProteinAlphabet) :
-            raise ValueError("Proteins do not have complements!")
-        if isinstance(base, Alphabet.DNAAlphabet) :
-            ttable = _dna_complement_table
-        elif isinstance(base, Alphabet.RNAAlphabet) :
-            ttable = _rna_complement_table
-        elif ('U' in self._data or 'u' in self._data) \
-        and ('T' in self._data or 't' in self._data):
-            #TODO - Handle this cleanly?
-            raise ValueError("Mixed RNA/DNA found")
-        elif 'U' in self._data or 'u' in self._data:
-            ttable = _rna_complement_table
-        else:
-            ttable = _dna_complement_table
+        ttable = _complement_table(str(self), self.alphabet)
         #Much faster on really long sequences than the previous loop based one.
         #thx to Michael Palmer, University of Waterloo
         return self.__class__(str(self).translate(ttable), self.alphabet)
 
+    def reverse_complement(self):
+        'It returns the reverse complement sequence with only one copy'
+        return self.__class__(reverse_complement_str(str(self),
+                                                     self.alphabet),
+                              self.alphabet)
+
     def upper(self):
         'It returns the uppercased sequence'
         return self.__class__(str(self).upper(), self.alphabet)
@@ -0,0 +1,573 @@
+'''
+It looks for vectors in the sequences without running blast.
+
+The fasta file of a vector database, like UniVec, is indexed by the
+minimizers of its words. A minimizer is the word with the lowest hash in a
+window of consecutive words, so every match long enough to hold a window is
+seeded. The index is written next to the database the first time and it is
+rebuilt if the database changes. It is read with mmap, so the processes
+that look for vectors at the same time share the same pages. The minimizers
+of both strands of every sequence are looked up in the index. Like in blastn,
+only the seeds that are part of an exact match of WORD_SIZE bases, out of
+the low complexity regions of the sequence, are extended. The extensions
+are gapped and they use the match, mismatch and gap scores of the vecscreen
+blast search with an X-drop. The HSPs found are returned as blast alignments.
+
+numpy is required to build and to use the index.
+
+Created on 17/10/2026
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import os, tempfile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from Bio.Seq import UnknownSeq
+
+from franklin.seq.readers import seqs_in_file, guess_seq_file_format
+from franklin.seq.seqs import SeqWithQuality, reverse_complement_str
+from franklin.seq.alignment_result import filter_alignments, _fix_matches
+from franklin.seq.dust import dust_segments
+
+VECTOR_INDEX_EXTENSION = '.fvidx'
+VECTOR_INDEX_VERSION = '1'
+VECTOR_INDEX_HEADER = '#franklin_vector_index'
+#the sections start after the header, it is padded to this size
+_HEADER_SIZE = 4096
+
+#every exact match of 15 bp holds a window of three 13 bp words
+KMER_SIZE = 13
+WINDOW = 3
+
+#the word size of blastn, it is the megablast one
+WORD_SIZE = 28
+#the blastn dust level used by vecscreen
+DUST_LEVEL = 20
+
+MATCH_SCORE = 1
+MISMATCH_SCORE = -5
+GAP_OPEN = 3
+GAP_EXTEND = 3
+XDROP = 25
+
+def _base_codes():
+    'It returns the 2 bit code of every letter, -1 for the ambiguous ones'
+    codes = numpy.empty(256, dtype=numpy.int8)
+    codes.fill(-1)
+    for code, letter in enumerate('ACGT'):
+        codes[ord(letter)] = code
+    return codes
+
+_BASE_CODES = _base_codes() if numpy is not None else None
+
+def _hash_codes(codes):
+    'It scrambles the word codes, so the poly-A words are not the minimizers'
+    hashes = codes * numpy.uint64(0x9E3779B97F4A7C15)
+    return hashes ^ (hashes >> numpy.uint64(29))
+
+def _minimizers(str_seq, kmer_size=KMER_SIZE, window=WINDOW):
+    '''It returns the positions and codes of the minimizers of the sequence.
+
+    The words with ambiguous bases and the mono and dinucleotide repeats are
+    not used.
+    '''
+    bases = _BASE_CODES[numpy.frombuffer(str_seq, dtype=numpy.uint8)]
+    num_words = len(bases) - kmer_size + 1
+    num_windows = num_words - window + 1
+    if num_windows <= 0:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, numpy.uint64)
+    codes = numpy.zeros(num_words, dtype=numpy.uint64)
+    ambiguous = numpy.zeros(num_words, dtype=bool)
+    for offset in range(kmer_size):
+        word_bases = bases[offset:offset + num_words]
+        codes = (codes << numpy.uint64(2)) | (word_bases & 3).astype(
+                                                                  numpy.uint64)
+        ambiguous |= word_bases < 0
+    period_mask = numpy.uint64((1 << (2 * (kmer_size - 2))) - 1)
+    repeat = (codes >> numpy.uint64(4)) == (codes & period_mask)
+    hashes = _hash_codes(codes)
+    unused = ambiguous | repeat
+    hashes[unused] = numpy.iinfo(numpy.uint64).max
+
+    windows = numpy.vstack([hashes[offset:offset + num_windows]
+                                                for offset in range(window)])
+    positions = numpy.arange(num_windows) + windows.argmin(axis=0)
+    positions = numpy.unique(positions[~unused[positions]])
+    return positions, codes[positions]
+
+def _file_signature(fpath):
+    'It returns the size and the modification time of the file as strings'
+    stat = os.stat(fpath)
+    return str(stat.st_size), '%.6f' % stat.st_mtime
+
+def _build_sections(fpath):
+    '''It returns the index sections for the vectors in the fasta file.
+
+    The sections are the vector sequences joined, the vector starts in it,
+    the vector names, the minimizer codes sorted, the offsets of every code in
+    the positions and the positions of the minimizers in the joined vectors.
+    '''
+    str_seqs, names, starts = [], [], [0]
+    all_positions, all_codes = [], []
+    for seq in seqs_in_file(open(fpath)):
+        str_seq = str(seq.seq).upper()
+        positions, codes = _minimizers(str_seq)
+        all_positions.append(positions + starts[-1])
+        all_codes.append(codes)
+        str_seqs.append(str_seq)
+        names.append(seq.name)
+        starts.append(starts[-1] + len(str_seq))
+    if all_codes:
+        codes = numpy.concatenate(all_codes)
+        positions = numpy.concatenate(all_positions)
+    else:
+        codes = numpy.zeros(0, dtype=numpy.uint64)
+        positions = numpy.zeros(0, dtype=numpy.int64)
+    order = numpy.argsort(codes, kind='mergesort')
+    codes, positions = codes[order], positions[order]
+    codes, counts = numpy.unique(codes, return_counts=True)
+    offsets = numpy.zeros(len(codes) + 1, dtype=numpy.uint64)
+    offsets[1:] = numpy.cumsum(counts)
+    return [('seqs', numpy.frombuffer(''.join(str_seqs), dtype=numpy.uint8)),
+            ('starts', numpy.array(starts, dtype=numpy.uint64)),
+            ('names', numpy.frombuffer('\n'.join(names), dtype=numpy.uint8)),
+            ('codes', codes),
+            ('offsets', offsets),
+            ('positions', positions.astype(numpy.uint32))]
+
+def _section_header(sections, size, mtime):
+    'It returns the header with the offset of every section'
+    lines = ['\t'.join([VECTOR_INDEX_HEADER, VECTOR_INDEX_VERSION, size, mtime,
+                        str(KMER_SIZE), str(WINDOW)])]
+    offset = _HEADER_SIZE
+    for name, array_ in sections:
+        lines.append('\t'.join([name, array_.dtype.str, str(offset),
+                                str(len(array_))]))
+        offset += array_.nbytes
+        offset += -offset % 8
+    header = '\n'.join(lines) + '\n\n'
+    if len(header) > _HEADER_SIZE:
+        raise RuntimeError('The vector index header is too long')
+    return header.ljust(_HEADER_SIZE)
+
+def build_vector_index(fpath, index_fpath=None):
+    '''It writes the index for the vectors fasta file and it returns its path.
+
+    By default the index is written next to the vectors file. It is written
+    in a temporary file that is renamed at the end, so a process will never
+    read an unfinished index.
+    '''
+    if index_fpath is None:
+        index_fpath = fpath + VECTOR_INDEX_EXTENSION
+    size, mtime = _file_signature(fpath)
+    index_dir = os.path.dirname(index_fpath) or '.'
+    index_fhand = tempfile.NamedTemporaryFile(suffix=VECTOR_INDEX_EXTENSION,
+                                              dir=index_dir, delete=False)
+    try:
+        sections = _build_sections(fpath)
+        index_fhand.write(_section_header(sections, size, mtime))
+        for name, array_ in sections:
+            index_fhand.write(array_.tostring())
+            index_fhand.write('\0' * (-index_fhand.tell() % 8))
+        index_fhand.close()
+        os.rename(index_fhand.name, index_fpath)
+    except Exception:
+        index_fhand.close()
+        os.remove(index_fhand.name)
+        raise
+    return index_fpath
+
+def _read_index_header(index_fpath):
+    'It returns the signature fields and the section locations of the index'
+    lines = open(index_fpath, 'rb').read(_HEADER_SIZE).split('\n')
+    header = lines[0].split('\t')
+    if len(header) != 6 or header[:2] != [VECTOR_INDEX_HEADER,
+                                          VECTOR_INDEX_VERSION]:
+        return None, None
+    sections = {}
+    for line in lines[1:]:
+        if not line:
+            break
+        name, dtype, offset, length = line.split('\t')
+        sections[name] = (dtype, int(offset), int(length))
+    return header[2:], sections
+
+def _index_signature(fpath):
+    'It returns the signature that an up to date index should have'
+    return list(_file_signature(fpath)) + [str(KMER_SIZE), str(WINDOW)]
+
+def _index_is_valid(fpath, index_fpath):
+    'It returns True if the index exists and the file has not been changed'
+    if not os.path.exists(index_fpath):
+        return False
+    return _read_index_header(index_fpath)[0] == _index_signature(fpath)
+
+def _map_sections(index_fpath, locations):
+    'It returns the index sections mapped from the file'
+    sections = {}
+    for name, (dtype, offset, length) in locations.items():
+        if length:
+            sections[name] = numpy.memmap(index_fpath, dtype=dtype, mode='r',
+                                          offset=offset, shape=(length,))
+        else:
+            sections[name] = numpy.zeros(0, dtype=dtype)
+    return sections
+
+def _equal_bases(base1, base2):
+    'It returns True if the bases are equal and not ambiguous'
+    return base1 == base2 and base1 in 'ACGT'
+
+def _exact_core(str_seq, vector_seq, seq_position, vector_position):
+    '''It returns the exact match that includes the seed.
+
+    It returns its start and end in the sequence and in the vector, the ends
+    are not included.
+    '''
+    start, vector_start = seq_position, vector_position
+    while (start and vector_start and
+           _equal_bases(str_seq[start - 1], vector_seq[vector_start - 1])):
+        start -= 1
+        vector_start -= 1
+    end = seq_position + KMER_SIZE
+    vector_end = vector_position + KMER_SIZE
+    while (end < len(str_seq) and vector_end < len(vector_seq) and
+           _equal_bases(str_seq[end], vector_seq[vector_end])):
+        end += 1
+        vector_end += 1
+    return start, end, vector_start, vector_end
+
+def _in_segments(start, end, segments):
+    'It returns True if the start to end region overlaps any segment'
+    for segment_start, segment_end in segments:
+        if start <= segment_end and segment_start <= end:
+            return True
+    return False
+
+def _in_hsps(hsps, vector, seq_position, vector_position):
+    'It returns True if the seed is inside one of the HSPs'
+    for hsp in hsps:
+        if (hsp['vector'] == vector and
+            hsp['query_start'] <= seq_position <= hsp['query_end'] and
+            hsp['subject_start'] <= vector_position <= hsp['subject_end']):
+            return True
+    return False
+
+def _gap(cell, cost):
+    'It returns the cell after a gap column or None'
+    if cell is None:
+        return None
+    return (cell[0] - cost, cell[1], cell[2] + 1)
+
+def _best_cell(*cells):
+    'It returns the cell with the highest score or None'
+    cells = [cell for cell in cells if cell is not None]
+    return max(cells) if cells else None
+
+def _gapped_extension(query, subject):
+    '''It returns the best gapped extension from the start of both sequences.
+
+    It returns the score, the query and subject lengths of the extension, the
+    identical bases and the alignment columns. The cells that fall more than
+    XDROP below the best score are not extended.
+    '''
+    #every cell has the score, the identical bases and the columns
+    best_score, best = 0, (0, 0, 0, 0, 0)
+    prev_row, prev_gaps = {}, {}
+    for row in range(len(query) + 1):
+        if row:
+            if not prev_row and not prev_gaps:
+                break
+            columns = list(prev_row) + list(prev_gaps)
+            column, last_column = min(columns), max(columns)
+        else:
+            column, last_column = 0, 0
+        this_row, this_gaps = {}, {}
+        #the gap in the query that comes from the left
+        left_gap = None
+        while column <= len(subject):
+            floor = best_score - XDROP
+            cell = (0, 0, 0) if not row and not column else None
+            if row and column and column - 1 in prev_row:
+                diagonal = prev_row[column - 1]
+                equal = _equal_bases(query[row - 1], subject[column - 1])
+                score = MATCH_SCORE if equal else MISMATCH_SCORE
+                cell = (diagonal[0] + score, diagonal[1] + equal,
+                        diagonal[2] + 1)
+            if column:
+                left_gap = _best_cell(_gap(this_row.get(column - 1),
+                                           GAP_OPEN + GAP_EXTEND),
+                                      _gap(left_gap, GAP_EXTEND))
+                if left_gap is not None and left_gap[0] < floor:
+                    left_gap = None
+            up_gap = None
+            if row:
+                up_gap = _best_cell(_gap(prev_row.get(column),
+                                         GAP_OPEN + GAP_EXTEND),
+                                    _gap(prev_gaps.get(column), GAP_EXTEND))
+                if up_gap is not None and up_gap[0] >= floor:
+                    this_gaps[column] = up_gap
+            cell = _best_cell(cell, left_gap, up_gap)
+            if cell is not None and cell[0] >= floor:
+                this_row[column] = cell
+                if cell[0] > best_score:
+                    best_score = cell[0]
+                    best = (best_score, row, column, cell[1], cell[2])
+            column += 1
+            #nothing else can be reached in this row
+            if (column > last_column + 1 and left_gap is None and
+                column - 1 not in this_row):
+                break
+        prev_row, prev_gaps = this_row, this_gaps
+    return best
+
+class VectorIndex(object):
+    '''It finds the HSPs between a sequence and the indexed vectors.
+
+    The index is written next to the vectors fasta file the first time, it
+    will be rebuilt if the file changes. If persist is False or the directory
+    can not be written the index is only kept in memory. It can be pickled to
+    be sent to other processes, they will map the same index file.
+    '''
+    def __init__(self, fpath, index_fpath=None, persist=True):
+        'It inits the index, building it if required'
+        if numpy is None:
+            raise RuntimeError('numpy is required to index the vectors')
+        self.fpath = fpath
+        if index_fpath is None:
+            index_fpath = fpath + VECTOR_INDEX_EXTENSION
+        self.index_fpath = index_fpath
+        self._persist = persist
+        sections = self._load_sections()
+        self._seqs = sections['seqs']
+        self._starts = sections['starts']
+        self._codes = sections['codes']
+        self._offsets = sections['offsets']
+        self._positions = sections['positions']
+        names = sections['names'].tostring()
+        self._names = names.split('\n') if len(self._starts) > 1 else []
+
+    def _load_sections(self):
+        'It maps the index, it builds it if it is not up to date'
+        fpath, index_fpath = self.fpath, self.index_fpath
+        if self._persist:
+            if not _index_is_valid(fpath, index_fpath):
+                try:
+                    build_vector_index(fpath, index_fpath)
+                except (IOError, OSError):
+                    self._persist = False
+            if self._persist:
+                return _map_sections(index_fpath,
+                                     _read_index_header(index_fpath)[1])
+        return dict(_build_sections(fpath))
+
+    def __getstate__(self):
+        'It returns the state without the mapped sections'
+        return {'fpath': self.fpath, 'index_fpath': self.index_fpath,
+                'persist': self._persist}
+
+    def __setstate__(self, state):
+        'It maps the index again in the new process'
+        self.__init__(state['fpath'], index_fpath=state['index_fpath'],
+                      persist=state['persist'])
+
+    def __len__(self):
+        'It returns the number of indexed vectors'
+        return len(self._names)
+
+    def get_name(self, vector_index):
+        'It returns the name of the vector'
+        return self._names[vector_index]
+
+    def get_length(self, vector_index):
+        'It returns the length of the vector'
+        return int(self._starts[vector_index + 1] -
+                   self._starts[vector_index])
+
+    def _seeds(self, str_seq):
+        'It returns the positions in the sequence and vectors of the seeds'
+        positions, codes = _minimizers(str_seq)
+        code_indexes = numpy.searchsorted(self._codes, codes)
+        found = code_indexes < len(self._codes)
+        found[found] = self._codes[code_indexes[found]] == codes[found]
+        seq_positions, vector_positions = [], []
+        for position, code_index in zip(positions[found],
+                                        code_indexes[found]):
+            start = int(self._offsets[code_index])
+            end = int(self._offsets[code_index + 1])
+            seq_positions.extend([position] * (end - start))
+            vector_positions.extend(self._positions[start:end])
+        return (numpy.array(seq_positions, dtype=numpy.int64),
+                numpy.array(vector_positions, dtype=numpy.int64))
+
+    def _vector_seq(self, vector):
+        'It returns the sequence str of the vector'
+        start = int(self._starts[vector])
+        end = int(self._starts[vector + 1])
+        return self._seqs[start:end].tostring()
+
+    @staticmethod
+    def _extend_core(str_seq, vector_seq, core):
+        '''It returns the HSP found by extending the exact core with gaps.
+
+        The HSP is the sequence start and end, the vector start and end, the
+        score and the identity.
+        '''
+        start, end, vector_start, vector_end = core
+        core_length = end - start
+        right = _gapped_extension(str_seq[end:], vector_seq[vector_end:])
+        left = _gapped_extension(str_seq[:start][::-1],
+                                 vector_seq[:vector_start][::-1])
+        identical = core_length + left[3] + right[3]
+        columns = core_length + left[4] + right[4]
+        return {'query_start': start - left[1],
+                'query_end': end + right[1] - 1,
+                'subject_start': vector_start - left[2],
+                'subject_end': vector_end + right[2] - 1,
+                'score': core_length * MATCH_SCORE + left[0] + right[0],
+                'identity': identical / float(columns) * 100}
+
+    def find_hsps(self, str_seq):
+        '''It returns the HSPs between the sequence and the vectors.
+
+        Every HSP is a dict with the vector index, the query and subject
+        start and end, the subject strand, the score and the identity. The
+        coordinates are given in the forward strands.
+        '''
+        str_seq = str_seq.upper()
+        seq_len = len(str_seq)
+        hsps = []
+        if not len(self._codes):
+            return hsps
+        low_complexity = dust_segments(str_seq, level=DUST_LEVEL)
+        vector_seqs = {}
+        for strand, strand_seq in ((1, str_seq),
+                                   (-1, reverse_complement_str(str_seq))):
+            if strand == -1:
+                low_complexity = [(seq_len - end - 1, seq_len - start - 1)
+                                           for start, end in low_complexity]
+            seq_positions, vector_positions = self._seeds(strand_seq)
+            seeds = sorted(zip(seq_positions.tolist(),
+                               vector_positions.tolist()))
+            strand_hsps = []
+            for seq_position, vector_position in seeds:
+                if _in_segments(seq_position, seq_position + KMER_SIZE - 1,
+                                low_complexity):
+                    continue
+                vector = int(numpy.searchsorted(self._starts, vector_position,
+                                                side='right')) - 1
+                vector_position -= int(self._starts[vector])
+                #the seeds inside an HSP do not need to be extended
+                if _in_hsps(strand_hsps, vector, seq_position,
+                            vector_position):
+                    continue
+                if vector not in vector_seqs:
+                    vector_seqs[vector] = self._vector_seq(vector)
+                vector_seq = vector_seqs[vector]
+                core = _exact_core(strand_seq, vector_seq, seq_position,
+                                   vector_position)
+                if core[1] - core[0] < WORD_SIZE:
+                    continue
+                hsp = self._extend_core(strand_seq, vector_seq, core)
+                hsp['vector'] = vector
+                hsp['subject_strand'] = strand
+                strand_hsps.append(hsp)
+            for hsp in strand_hsps:
+                if strand == -1:
+                    hsp['query_start'], hsp['query_end'] = (
+                                              seq_len - hsp['query_end'] - 1,
+                                              seq_len - hsp['query_start'] - 1)
+                hsps.append(hsp)
+        return hsps
+
+def can_index_vectors(database):
+    '''It returns True if the vectors can be looked for with a VectorIndex.
+
+    numpy should be installed and the database should be a fasta file, like
+    the blast databases formatted from a fasta file in the same path.
+    '''
+    if numpy is None or not os.path.isfile(database):
+        return False
+    return guess_seq_file_format(open(database)) == 'fasta'
+
+class VectorIndexAligner(object):
+    'An aligner that looks for the vectors in a VectorIndex'
+    def __init__(self, database, parameters=None, filters=None):
+        '''It inits the class.
+
+        The database is the vectors fasta file. Like blast only the
+        max_subjects vectors with the best HSPs are reported.
+        '''
+        if parameters is None:
+            parameters = {}
+        self._max_subjects = parameters.get('max_subjects', 20)
+        self._filters = filters
+        self._index = VectorIndex(database)
+
+    def _align(self, query):
+        'It returns the alignment for one query or None'
+        query_length = len(query)
+        matches = {}
+        for hsp in self._index.find_hsps(str(query.seq)):
+            vector = hsp['vector']
+            if vector not in matches:
+                subject = SeqWithQuality(name=self._index.get_name(vector),
+                     seq=UnknownSeq(length=self._index.get_length(vector)))
+                matches[vector] = {'subject': subject, 'match_parts': [],
+                                   'score': hsp['score']}
+            match = matches[vector]
+            match['score'] = max(match['score'], hsp['score'])
+            match['match_parts'].append({'query_start': hsp['query_start'],
+                                         'query_end': hsp['query_end'],
+                                         'query_strand': 1,
+                                       'subject_start': hsp['subject_start'],
+                                         'subject_end': hsp['subject_end'],
+                                   'subject_strand': hsp['subject_strand'],
+                                   'scores': {'identity': hsp['identity'],
+                                              'score': hsp['score']}})
+        if not matches:
+            return None
+        matches = sorted(matches.values(), key=lambda match: match['score'],
+                         reverse=True)[:self._max_subjects]
+        for match in matches:
+            del match['score']
+            match['match_parts'].sort(key=lambda x: x['scores']['score'],
+                                      reverse=True)
+        #the query is given as in the blast results
+        query = SeqWithQuality(name=query.name,
+                               seq=UnknownSeq(length=query_length))
+        alignment = {'query': query, 'matches': matches}
+        return _fix_matches(alignment, score_keys=['identity', 'score'])
+
+    def do_alignment(self, query):
+        '''It returns the alignments for the query.
+
+        The query can be a sequence or a list of sequences.
+        '''
+        if not isinstance(query, list) and not isinstance(query, tuple):
+            query = [query]
+        alignments = []
+        for seq in query:
+            alignment = self._align(seq)
+            if alignment is not None:
+                alignments.append(alignment)
+        if self._filters is not None:
+            alignments = filter_alignments(alignments, config=self._filters)
+        return alignments
@@ -0,0 +1,262 @@
+'''
+It finds a set of short words in the sequences with Aho-Corasick automata.
+
+All the words and their reverse complements are looked for in a single pass
+over the sequence. The words anchored with '^' are only looked for in the
+beginning of the sequence, or in its end for the reverse complements.
+
+The mismatches are allowed by splitting every word in one piece more than
+the mismatches allowed. At least one of the pieces should match exactly, so
+the automaton finds the pieces and the candidate words are compared base by
+base with the sequence.
+
+The words that are not made only by letters are taken as regular
+expressions and they are matched with the re module.
+
+Created on 17/10/2026
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import re
+from collections import deque
+
+from franklin.seq.seqs import reverse_complement_str
+
+class _Automaton(object):
+    'It is an Aho-Corasick automaton that finds a set of strings'
+    def __init__(self, strings):
+        'It builds the automaton for the given strings'
+        goto = [{}]
+        outputs = [[]]
+        for string_index, string in enumerate(strings):
+            state = 0
+            for char in string:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(string_index)
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                outputs[next_state] = (outputs[next_state] +
+                                       outputs[fail[next_state]])
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+
+    def find(self, text):
+        '''It returns the strings found in the text.
+
+        They are given as (end, string index) tuples with the end included.
+        '''
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        found = []
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for string_index in outputs[state]:
+                found.append((index, string_index))
+        return found
+
+def _split_in_pieces(string, num_pieces):
+    'It returns the (offset, piece) tuples that cover the string'
+    piece_len = len(string) // num_pieces
+    pieces = []
+    for index in range(num_pieces):
+        start = index * piece_len
+        end = start + piece_len if index < num_pieces - 1 else len(string)
+        pieces.append((start, string[start:end]))
+    return pieces
+
+def _matches_with_mismatches(text, start, pattern, max_mismatches):
+    'It returns True if the pattern is in the text with the mismatches allowed'
+    mismatches = 0
+    for index, char in enumerate(pattern):
+        if text[start + index] != char:
+            mismatches += 1
+            if mismatches > max_mismatches:
+                return False
+    return True
+
+def _non_overlapping(locations, strand):
+    '''It keeps the locations that the re module would find for a word.
+
+    The reverse locations are found from the end of the sequence as they are
+    found in the reverse complemented sequence.
+    '''
+    kept = []
+    if strand == 1:
+        for start, end in sorted(locations):
+            if not kept or start > kept[-1][1]:
+                kept.append((start, end))
+    else:
+        for start, end in sorted(locations, key=lambda x: x[1], reverse=True):
+            if not kept or end < kept[-1][0]:
+                kept.append((start, end))
+        kept.reverse()
+    return kept
+
+def _is_plain_word(word):
+    'It returns True if the word has only letters after the anchor'
+    if word.startswith('^'):
+        word = word[1:]
+    return word.isalpha()
+
+class WordMatcher(object):
+    '''It finds a set of words and their reverse complements in sequences.
+
+    The automata are built once and they are used for every sequence.
+    '''
+    def __init__(self, words, reverse_complement=True, ignore_case=True,
+                 max_mismatches=0):
+        '''It builds the automata for the words.
+
+        The words starting with '^' are anchored to the sequence beginning.
+        '''
+        self.words = words
+        self._reverse_complement = reverse_complement
+        self._ignore_case = ignore_case
+        self._max_mismatches = max_mismatches
+        self._regexes = []
+        #the patterns for the automata not anchored, anchored to the start
+        #and anchored to the end
+        patterns = {'any': [], 'start': [], 'end': []}
+        for word_index, word in enumerate(words):
+            if not _is_plain_word(word):
+                flags = re.IGNORECASE if ignore_case else 0
+                self._regexes.append((word_index, re.compile(word, flags)))
+                continue
+            anchored = word.startswith('^')
+            if anchored:
+                word = word[1:]
+            if len(word) <= max_mismatches:
+                msg = 'The words should be longer than the mismatches allowed'
+                raise ValueError(msg)
+            if ignore_case:
+                word = word.upper()
+            patterns['start' if anchored else 'any'].append((word_index, 1,
+                                                              word))
+            if reverse_complement:
+                rev_word = reverse_complement_str(word)
+                patterns['end' if anchored else 'any'].append((word_index,
+                                                               -1, rev_word))
+        self._automata = {}
+        for kind, kind_patterns in patterns.items():
+            if kind_patterns:
+                self._automata[kind] = self._build_automaton(kind_patterns)
+
+    def _build_automaton(self, patterns):
+        '''It returns the automaton with the pieces of the patterns.
+
+        For every piece it is kept the patterns that include it and where.
+        '''
+        piece_indexes = {}
+        piece_patterns = []
+        for pattern in patterns:
+            for offset, piece in _split_in_pieces(pattern[2],
+                                                  self._max_mismatches + 1):
+                if piece not in piece_indexes:
+                    piece_indexes[piece] = len(piece_patterns)
+                    piece_patterns.append([])
+                piece_end = offset + len(piece)
+                piece_patterns[piece_indexes[piece]].append((pattern,
+                                                             piece_end))
+        pieces = sorted(piece_indexes, key=piece_indexes.get)
+        longest = max(len(pattern[2]) for pattern in patterns)
+        return _Automaton(pieces), piece_patterns, longest
+
+    def _find_patterns(self, kind, str_seq, locations):
+        'It adds the locations of the patterns found with the given automaton'
+        automaton, piece_patterns, longest = self._automata[kind]
+        seq_len = len(str_seq)
+        offset = 0
+        if kind == 'start':
+            text = str_seq[:longest]
+        elif kind == 'end':
+            offset = max(seq_len - longest, 0)
+            text = str_seq[offset:]
+        else:
+            text = str_seq
+        for piece_end, piece_index in automaton.find(text):
+            for pattern, piece_end_in_pattern in piece_patterns[piece_index]:
+                word_index, strand, pattern_str = pattern
+                start = piece_end + 1 - piece_end_in_pattern
+                end = start + len(pattern_str) - 1
+                if start < 0 or end >= len(text):
+                    continue
+                if (self._max_mismatches and
+                    not _matches_with_mismatches(text, start, pattern_str,
+                                                 self._max_mismatches)):
+                    continue
+                start += offset
+                end += offset
+                if ((kind == 'start' and start != 0) or
+                    (kind == 'end' and end != seq_len - 1)):
+                    continue
+                locations[word_index][strand].add((start, end))
+
+    def _find_regexes(self, str_seq, locations):
+        'It adds the locations of the words matched as regular expressions'
+        seq_len = len(str_seq)
+        rev_seq = reverse_complement_str(str_seq)
+        for word_index, regex in self._regexes:
+            for match in regex.finditer(str_seq):
+                locations[word_index][1].add((match.start(), match.end() - 1))
+            if not self._reverse_complement:
+                continue
+            for match in regex.finditer(rev_seq):
+                locations[word_index][-1].add((seq_len - match.end(),
+                                               seq_len - match.start() - 1))
+
+    def find_words(self, str_seq):
+        '''It returns the locations of every word in the given sequence str.
+
+        For every word a list with the (start, end, strand) found is returned,
+        the forward locations first. As with the re module the locations of a
+        word in the same strand do not overlap.
+        '''
+        if self._ignore_case:
+            str_seq = str_seq.upper()
+        locations = [{1: set(), -1: set()} for word in self.words]
+        for kind in self._automata:
+            self._find_patterns(kind, str_seq, locations)
+        if self._regexes:
+            self._find_regexes(str_seq, locations)
+        word_locations = []
+        for word_index in range(len(self.words)):
+            found = []
+            for strand in (1, -1):
+                if not locations[word_index][strand]:
+                    continue
+                for start, end in _non_overlapping(
+                                      locations[word_index][strand], strand):
+                    found.append((start, end, strand))
+            word_locations.append(found)
+        return word_locations
@@ -27,9 +27,10 @@ import re
 from Bio import SeqIO
 
 from franklin.seq.seqs import (get_seq_name, fix_seq_struct_for_json,
-                               reverse_complement)
+                               reverse_complement, CompactSeqWithQuality)
 from franklin.seq.readers import (BIOPYTHON_FORMATS, guess_seq_file_format,
                                   seqs_in_file)
+from franklin.seq.binary_format import BinarySeqWriter
 
 class OrthologWriter(object):
     'It writes the orthoolog annotation into a file'
@@ -206,13 +207,23 @@ class SamWriter(object):
 
 
 class SequenceWriter(object):
-    'It writes sequences one by one'
-    def __init__(self, fhand, file_format, qual_fhand=None):
+    '''It writes sequences one by one.
+
+    The binary files should be closed with the close method, that writes the
+    footer, the file handler is not closed. If compress is True the binary
+    records are compressed.
+    The gzip files are written with a BgzfWriter fhand, that should be closed
+    once the sequences are written.
+    '''
+    def __init__(self, fhand, file_format, qual_fhand=None, compress=False):
         'It inits the class'
         self.fhand = fhand
         self.qual_fhand = qual_fhand
         self._format = file_format
         self.num_features = 0
+        self._binary_writer = None
+        if file_format == 'binary':
+            self._binary_writer = BinarySeqWriter(fhand, compress=compress)
 
     def write(self, sequence):
         'It writes one sequence to the given file'
@@ -229,7 +240,13 @@ class SequenceWriter(object):
         elif format_ == 'pickle':
             string = pickle.dumps(sequence)
             self.fhand.write(string + '\n\n')
+        elif format_ == 'binary':
+            record = pickle.dumps(sequence, pickle.HIGHEST_PROTOCOL)
+            self._binary_writer.write(record)
         else:
+            #biopython only writes SeqRecords
+            if isinstance(sequence, CompactSeqWithQuality):
+                sequence = sequence.to_seq_with_quality()
             SeqIO.write([sequence], self.fhand, BIOPYTHON_FORMATS[format_])
             if self.qual_fhand and format_ == 'fasta':
                 SeqIO.write([sequence], self.qual_fhand, 'qual')
@@ -237,6 +254,43 @@ class SequenceWriter(object):
         if self.qual_fhand:
             self.qual_fhand.flush()
 
+    def close(self):
+        'It finishes the binary files, the file handlers are not closed'
+        if self._binary_writer is not None:
+            self._binary_writer.close()
+
+class PairedSequenceWriter(object):
+    '''It writes pairs of sequences.
+
+    Every pair is a (mate1, mate2) tuple. The first mates are written with
+    the writer and the second ones with the mate_writer. If there is no
+    mate_writer both mates are written one after the other with the writer,
+    interleaved. Both mates are written or none of them is, so the files
+    always hold the same pairs.
+    '''
+    def __init__(self, writer, mate_writer=None):
+        'It inits the class'
+        self.writer = writer
+        self.mate_writer = writer if mate_writer is None else mate_writer
+        self.num_features = 0
+
+    def write(self, pair):
+        'It writes both mates of the pair'
+        self.num_features += 1
+        if pair is None:
+            return
+        mate1, mate2 = pair
+        if mate1 is None or mate2 is None:
+            return
+        self.writer.write(mate1)
+        self.mate_writer.write(mate2)
+
+    def close(self):
+        'It closes the writers that require it'
+        for writer in set([self.writer, self.mate_writer]):
+            if 'close' in dir(writer):
+                writer.close()
+
 def write_seqs_in_file(seqs, seq_fhand, qual_fhand=None, format='fasta',
                        default_quality=25):
     '''It writes the given sequences in the given files.
@@ -251,6 +305,7 @@ def write_seqs_in_file(seqs, seq_fhand, qual_fhand=None, format='fasta',
                                 file_format=format)
         for seq in seqs:
             writer.write(seq)
+        writer.close()
 
 def _write_fasta_file(seqs, fhand_seq, default_quality=None, fhand_qual=None):
     '''Given a Seq and its default name it returns a fasta file in a
@@ -19,14 +19,13 @@ Created on 19/02/2010
 # You should have received a copy of the GNU Affero General Public License
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
-from Bio import SeqIO
 
 from franklin.utils.cmd_utils import create_runner
 from franklin.seq.alignment_result import (filter_alignments,
                                            get_alignment_parser)
 from franklin.seq.seq_analysis import (infer_introns_for_cdna,
                                        similar_sequences_for_blast)
-from franklin.seq.readers import guess_seq_file_format
+from franklin.seq.seq_index import index_seq_file
 from franklin.snv.snv_annotation import (calculate_maf_frequency,
                                          snvs_in_window, calculate_snv_kind,
                                          calculate_cap_enzymes,
@@ -318,9 +317,7 @@ def create_unique_contiguous_region_filter(distance, genomic_db,
     if not genomic_db:
         msg = 'No genomic blast database defined for unique SNV filter'
         raise ValueError(msg)
-    genomic_seqs_fhand = open(genomic_seqs_fpath)
-    genomic_seqs_index = SeqIO.index(genomic_seqs_fhand.name,
-                                     guess_seq_file_format(genomic_seqs_fhand))
+    genomic_seqs_index = index_seq_file(genomic_seqs_fpath)
 
     def unique_contiguous_region_filter(sequence):
         '''It filters out the snv in regions repeated in the genome or
@@ -19,12 +19,14 @@ This module provides utilities to run external commands into franklin
 # You should have received a copy of the GNU Affero General Public License
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
-import subprocess, signal, tempfile, os, itertools
+import subprocess, signal, tempfile, os
 import StringIO, logging, copy, shutil, platform
 
 from franklin.seq.writers import temp_fasta_file, temp_qual_file
+from franklin.seq.seqs import SeqWithQuality
 from franklin.utils.misc_utils import (NamedTemporaryDir, DisposableFile,
                                        get_franklin_ext_dir, OrderedDict)
+from franklin.utils.itertools_ import SpillingBuffer
 
 def _locate_file(fpath):
     cmd = ['locate', fpath]
@@ -259,18 +261,28 @@ def _param_to_str(param):
 
 def _prepare_input_files(inputs, seqs):
     'It prepares inputs taking into account the format'
-    for key, value in inputs.items():
-        files_format = value['files_format']
-        inputs[key]['fhands'] = []
-        inputs[key]['fpaths'] = []
-        seqs, seqs_qual = itertools.tee(seqs, 2)
-        for file_format in files_format:
-            if file_format == 'fasta':
-                fhand = temp_fasta_file(seqs=seqs)
-            elif file_format == 'qual':
-                fhand = temp_qual_file(seqs=seqs_qual)
-            inputs[key]['fhands'].append(fhand)
-            inputs[key]['fpaths'].append(fhand.name)
+    num_files = sum([len(value['files_format']) for value in inputs.values()])
+    #if the sequences are written in several files they are kept in a buffer
+    #that goes to disk when the memory budget is exceeded
+    buffer_ = None
+    if num_files > 1 and not isinstance(seqs, SpillingBuffer):
+        seqs = buffer_ = SpillingBuffer(seqs)
+    try:
+        for key, value in inputs.items():
+            files_format = value['files_format']
+            inputs[key]['fhands'] = []
+            inputs[key]['fpaths'] = []
+            for file_format in files_format:
+                if file_format == 'fasta':
+                    fhand = temp_fasta_file(seqs=iter(seqs))
+                elif file_format == 'qual':
+                    fhand = temp_qual_file(seqs=iter(seqs))
+                inputs[key]['fhands'].append(fhand)
+                inputs[key]['fpaths'].append(fhand.name)
+    finally:
+        #the buffer is not required once the input files are written
+        if buffer_ is not None:
+            buffer_.close()
 
 def _get_mktemp_fpaths(num_fpaths):
     'It returns the name of some temp file'
@@ -437,6 +449,45 @@ def create_runner(tool, parameters=None, environment=None):
         return returns
     return run_cmd_for_sequence
 
+BATCH_SEQ_NAME = 'batch_seq_%d'
+
+def seqs_with_batch_names(sequences):
+    '''It returns the sequences renamed to be given to a program in one batch.
+
+    It returns the renamed sequences and a list with the name given to every
+    input sequence. The name is taken from the sequence position in the batch,
+    so the results can be assigned back to the sequences even if the original
+    names are repeated or if the program modifies them. The None sequences are
+    not included in the renamed sequences and their name is None.
+    '''
+    renamed_seqs, names = [], []
+    for index, sequence in enumerate(sequences):
+        if sequence is None:
+            names.append(None)
+            continue
+        name = BATCH_SEQ_NAME % index
+        renamed_seqs.append(SeqWithQuality(seq=sequence.seq, name=name))
+        names.append(name)
+    return renamed_seqs, names
+
+def create_batch_runner(tool, parameters=None, environment=None):
+    '''It creates a runner that runs the program once for several sequences.
+
+    The created function takes a list of sequences and it returns the program
+    results and the names given to the sequences (look at
+    seqs_with_batch_names). If there are no sequences to run the results are
+    None.
+    '''
+    run_cmd = create_runner(tool, parameters=parameters,
+                            environment=environment)
+    def run_cmd_for_sequences(sequences):
+        'It returns the results for the given sequences and their names'
+        renamed_seqs, names = seqs_with_batch_names(sequences)
+        if not renamed_seqs:
+            return None, names
+        return run_cmd(renamed_seqs), names
+    return run_cmd_for_sequences
+
 def _which_binary(binary):
     'It return the full path of the binary if exists'
     stdout = subprocess.PIPE
@@ -510,7 +561,8 @@ def call(cmd, environment=None, stdin=None, raise_on_error=False,
     try:
         process = subprocess.Popen(cmd, stdout=stdout, stderr=stderr,
                                    env=environment, stdin=pstdin,
-                                   preexec_fn=subprocess_setup)
+                                   preexec_fn=subprocess_setup,
+                                   close_fds=True)
     except OSError:
         #if it fails let's be sure that the binary is not on the system
         binary = _which_binary(binary_name)
@@ -525,7 +577,8 @@ def call(cmd, environment=None, stdin=None, raise_on_error=False,
 
         process = subprocess.Popen(cmd, stdout=stdout, stderr=stderr,
                                        env=environment, stdin=pstdin,
-                                       preexec_fn=subprocess_setup)
+                                       preexec_fn=subprocess_setup,
+                                       close_fds=True)
 
     if stdin is None:
         stdout_str, stderr_str = process.communicate()
@@ -0,0 +1,484 @@
+'''
+Transparent reading and writing of gzip and BGZF compressed files.
+
+The readers show the decompressed content as a read only file whose seek and
+tell positions are uncompressed offsets, so the sequence readers and the file
+splitters can use them as they use the plain files. The decompressed data
+already read is kept in a buffer, the first lines can be read again to guess
+the file format without decompressing the stream again.
+A BGZF file is a gzip file made of independent blocks of at most 64 KB. Any
+gzip reader can read it and, with the size of every block, any uncompressed
+position can be reached decompressing only one block. The BGZF files can be
+split at the block boundaries for the parallel readers, a plain gzip file can
+only be read from its start.
+The compressed files are written as BGZF files, the blocks are compressed in
+a pool of threads.
+
+Created on 17/10/2026
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import struct, zlib, multiprocessing
+from bisect import bisect_right
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+GZIP_MAGIC = '\x1f\x8b'
+COMPRESSED_EXTENSIONS = ('gz', 'bgz', 'bgzf')
+#a gzip header with an extra field, method deflate and the BC subfield
+_BLOCK_HEADER = struct.Struct('<4sI2BH2sHH')
+_BLOCK_FOOTER = struct.Struct('<II')
+_BGZF_MAGIC = '\x1f\x8b\x08\x04'
+#samtools uses this size, the compressed block always fits in 64 KB
+BGZF_BLOCK_SIZE = 0xff00
+#the compressed data read at once from the gzip files
+_CHUNK_SIZE = 64 * 1024
+#the decompressed data kept behind the current position
+_KEEP_SIZE = 256 * 1024
+
+def _compress_block(data, compress_level=6):
+    'It returns the BGZF block with the given data'
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED,
+                                  -zlib.MAX_WBITS)
+    compressed = compressor.compress(data) + compressor.flush()
+    block_size = _BLOCK_HEADER.size + len(compressed) + _BLOCK_FOOTER.size
+    header = _BLOCK_HEADER.pack(_BGZF_MAGIC, 0, 0, 255, 6, 'BC', 2,
+                                block_size - 1)
+    footer = _BLOCK_FOOTER.pack(zlib.crc32(data) & 0xffffffff, len(data))
+    return header + compressed + footer
+
+#the empty block that marks the end of the file
+BGZF_EOF = _compress_block('')
+
+def _file_header(fhand, size):
+    '''It returns the first bytes of the file and it leaves it at its start.
+
+    The streams with a peek method, that can not be rewound, are not moved.
+    '''
+    if 'peek' in dir(fhand):
+        return fhand.peek(size)[:size]
+    fhand.seek(0)
+    data = fhand.read(size)
+    fhand.seek(0)
+    return data
+
+def compression_kind(fhand):
+    '''It returns bgzf or gzip if the file is compressed and None otherwise.
+
+    Only the header is read.
+    '''
+    if isinstance(fhand, _DecompressedFile):
+        return None
+    header = _file_header(fhand, _BLOCK_HEADER.size)
+    if header[:len(GZIP_MAGIC)] != GZIP_MAGIC:
+        return None
+    if (len(header) == _BLOCK_HEADER.size and
+        header[:len(_BGZF_MAGIC)] == _BGZF_MAGIC and header[12:14] == 'BC'):
+        return 'bgzf'
+    return 'gzip'
+
+class _DecompressedFile(object):
+    '''A read only file with the decompressed content of a compressed one.
+
+    The positions are uncompressed offsets. The subclasses yield the
+    decompressed data in chunks and they move the decompression to a new
+    position. The data behind the current position is dropped once it is
+    bigger than _KEEP_SIZE. Closing it closes the compressed file.
+    '''
+    def __init__(self, fhand):
+        'It inits the file with the compressed one'
+        self._fhand = fhand
+        self.name = getattr(fhand, 'name', None)
+        self._buffer = ''
+        self._buffer_start = 0
+        self._position = 0
+        self.closed = False
+
+    def _next_chunk(self):
+        'It returns the next decompressed chunk, an empty one at the end'
+        raise NotImplementedError
+
+    def _restart(self, position):
+        'It prepares the decompression to reach a position not buffered'
+        raise NotImplementedError
+
+    def _get_size(self):
+        'It returns the uncompressed size'
+        raise NotImplementedError
+
+    def _buffer_end(self):
+        'It returns the position after the buffered data'
+        return self._buffer_start + len(self._buffer)
+
+    def _fill(self, end):
+        '''It decompresses until the given position is buffered.
+
+        It returns False if the end of the file is found before.
+        '''
+        if not self._buffer_start <= self._position <= self._buffer_end():
+            self._restart(self._position)
+        while self._buffer_end() < end:
+            chunk = self._next_chunk()
+            if not chunk:
+                return False
+            consumed = min(self._position, self._buffer_end())
+            if consumed - self._buffer_start > _KEEP_SIZE:
+                self._buffer = self._buffer[consumed - self._buffer_start:]
+                self._buffer_start = consumed
+            self._buffer += chunk
+        return True
+
+    def _take(self, end):
+        'It returns the data from the position to the given end'
+        start = self._position - self._buffer_start
+        data = self._buffer[start:end - self._buffer_start]
+        self._position += len(data)
+        return data
+
+    def read(self, size=-1):
+        'It reads up to size bytes, all the remaining ones by default'
+        if size is None or size < 0:
+            while self._fill(self._buffer_end() + 1):
+                pass
+            return self._take(self._buffer_end())
+        self._fill(self._position + size)
+        return self._take(min(self._position + size, self._buffer_end()))
+
+    def readline(self, size=-1):
+        'It reads one line'
+        if size is None:
+            size = -1
+        self._fill(self._position)
+        searched = self._position
+        while True:
+            index = self._buffer.find('\n', searched - self._buffer_start)
+            if index >= 0:
+                end = self._buffer_start + index + 1
+                break
+            searched = self._buffer_end()
+            if ((size >= 0 and searched - self._position >= size) or
+                not self._fill(searched + 1)):
+                end = self._buffer_end()
+                break
+        if size >= 0:
+            end = min(end, self._position + size)
+        return self._take(end)
+
+    def peek(self, size=1):
+        'It returns the next bytes without moving the position'
+        self._fill(self._position + size)
+        start = self._position - self._buffer_start
+        return self._buffer[start:start + size]
+
+    def tell(self):
+        'It returns the uncompressed position'
+        return self._position
+
+    def seek(self, offset, whence=0):
+        'It moves to the given uncompressed position'
+        if whence == 1:
+            offset += self._position
+        elif whence == 2:
+            offset += self._get_size()
+        if offset < 0:
+            raise IOError('Invalid position in a compressed file')
+        self._position = offset
+
+    def __iter__(self):
+        'Part of the iterator protocol'
+        return self
+
+    def next(self):
+        'It returns the next line'
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        'It closes the compressed file'
+        self.closed = True
+        self._buffer = ''
+        self._fhand.close()
+
+class GzipReader(_DecompressedFile):
+    '''It reads a gzip file, that can have several members.
+
+    The file can only be decompressed from its start, so seeking to a
+    position behind the buffered data decompresses the file again.
+    '''
+    def __init__(self, fhand):
+        'It inits the reader'
+        super(GzipReader, self).__init__(fhand)
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._unused = ''
+        self._size = None
+
+    def _next_chunk(self):
+        'It returns the next decompressed chunk, an empty one at the end'
+        while self._decompressor is not None:
+            data = self._unused or self._fhand.read(_CHUNK_SIZE)
+            self._unused = ''
+            if not data:
+                chunk = self._decompressor.flush()
+                self._decompressor = None
+                return chunk
+            chunk = self._decompressor.decompress(data)
+            unused = self._decompressor.unused_data
+            #the padding found after the last member is ignored
+            if unused.strip('\x00'):
+                chunk += self._decompressor.flush()
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                self._unused = unused
+            if chunk:
+                return chunk
+        return ''
+
+    def _restart(self, position):
+        'It decompresses the file again if the position is behind the buffer'
+        if position >= self._buffer_start:
+            return
+        self._fhand.seek(0)
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._unused = ''
+        self._buffer = ''
+        self._buffer_start = 0
+
+    def _get_size(self):
+        'It decompresses the whole file to know its size'
+        if self._size is None:
+            self._fill(self._position)
+            size = self._buffer_end()
+            chunk = self._next_chunk()
+            if chunk:
+                #the decompressed data is not kept
+                while chunk:
+                    size += len(chunk)
+                    chunk = self._next_chunk()
+                self._buffer = ''
+                self._buffer_start = size
+            self._size = size
+        return self._size
+
+class BgzfReader(_DecompressedFile):
+    '''It reads a BGZF file.
+
+    The blocks are read in order while the file is read sequentially. A
+    seek to a position not buffered reads only the block that holds it, the
+    index with the uncompressed start of every block is built the first
+    time it is required, only the block headers and footers are read.
+    '''
+    def __init__(self, fhand):
+        'It inits the reader'
+        super(BgzfReader, self).__init__(fhand)
+        self._block_starts = None
+        self._block_offsets = None
+        self._size = None
+
+    def _read_block(self):
+        '''It returns the decompressed data of the next block.
+
+        It returns None at the end of the file.
+        '''
+        header = self._fhand.read(_BLOCK_HEADER.size)
+        if not header:
+            return None
+        if (len(header) < _BLOCK_HEADER.size or
+            header[:len(_BGZF_MAGIC)] != _BGZF_MAGIC or
+            header[12:14] != 'BC'):
+            raise ValueError('Corrupted BGZF block in ' + str(self.name))
+        block_size = _BLOCK_HEADER.unpack(header)[-1] + 1
+        body = self._fhand.read(block_size - _BLOCK_HEADER.size)
+        if len(body) < block_size - _BLOCK_HEADER.size:
+            raise ValueError('The BGZF file is truncated: ' + str(self.name))
+        crc, size = _BLOCK_FOOTER.unpack(body[-_BLOCK_FOOTER.size:])
+        data = zlib.decompress(body[:-_BLOCK_FOOTER.size], -zlib.MAX_WBITS)
+        if len(data) != size or zlib.crc32(data) & 0xffffffff != crc:
+            raise ValueError('Corrupted BGZF block in ' + str(self.name))
+        return data
+
+    def _next_chunk(self):
+        'It returns the next decompressed block, an empty one at the end'
+        data = self._read_block()
+        #the empty blocks mark the end of the concatenated files
+        while data == '':
+            data = self._read_block()
+        return data or ''
+
+    def _build_index(self):
+        'It finds the compressed offset and uncompressed start of the blocks'
+        position = self._fhand.tell()
+        self._fhand.seek(0)
+        starts, offsets = [], []
+        start, offset = 0, 0
+        while True:
+            header = self._fhand.read(_BLOCK_HEADER.size)
+            if len(header) < _BLOCK_HEADER.size:
+                break
+            block_size = _BLOCK_HEADER.unpack(header)[-1] + 1
+            self._fhand.seek(offset + block_size - 4)
+            size = struct.unpack('<I', self._fhand.read(4))[0]
+            if size:
+                starts.append(start)
+                offsets.append(offset)
+            start += size
+            offset += block_size
+        self._block_starts, self._block_offsets = starts, offsets
+        self._size = start
+        self._fhand.seek(position)
+
+    def block_starts(self):
+        'It returns the uncompressed position of every block start'
+        if self._block_starts is None:
+            self._build_index()
+        return self._block_starts
+
+    def _restart(self, position):
+        'It moves to the block that holds the position'
+        starts = self.block_starts()
+        if not starts or position >= self._size:
+            self._fhand.seek(0, 2)
+            self._buffer, self._buffer_start = '', self._size
+            return
+        index = max(bisect_right(starts, position) - 1, 0)
+        self._fhand.seek(self._block_offsets[index])
+        self._buffer, self._buffer_start = '', starts[index]
+
+    def _get_size(self):
+        'It returns the uncompressed size'
+        if self._size is None:
+            self._build_index()
+        return self._size
+
+def uncompressed_fhand(fhand):
+    '''It returns a reader with the decompressed content of the file.
+
+    If the file is not compressed it is returned. The compressed file is read
+    from its start.
+    '''
+    kind = compression_kind(fhand)
+    if kind == 'bgzf':
+        return BgzfReader(fhand)
+    elif kind == 'gzip':
+        return GzipReader(fhand)
+    return fhand
+
+def has_random_access(fhand):
+    'It returns True if any position of the file can be read quickly'
+    return not isinstance(fhand, GzipReader)
+
+def is_compressed_fpath(fpath):
+    'It returns True if the file extension is a compressed one'
+    return fpath.rsplit('.', 1)[-1] in COMPRESSED_EXTENSIONS
+
+def open_compressed_file(fpath, mode='r', threads=None, compress_level=6):
+    '''It opens a file that can be compressed.
+
+    The files are read decompressed if they are gzip or BGZF files, whatever
+    their extension is. The files are written as BGZF files if their
+    extension is gz, bgz or bgzf, threads is the number of threads that
+    compress the blocks.
+    '''
+    if 'r' in mode:
+        return uncompressed_fhand(open(fpath, 'rb'))
+    if is_compressed_fpath(fpath):
+        return BgzfWriter(open(fpath, mode.replace('b', '') + 'b'),
+                          threads=threads, compress_level=compress_level)
+    return open(fpath, mode)
+
+class BgzfWriter(object):
+    '''It writes a BGZF file.
+
+    The data is cut in blocks that are compressed by a pool of threads, zlib
+    releases the GIL while it compresses. The blocks are written in order as
+    they are done. The file is only complete once the writer is closed, flush
+    does not cut the block being filled. Closing it closes the file.
+    '''
+    def __init__(self, fhand, threads=None, compress_level=6):
+        'It inits the writer'
+        self._fhand = fhand
+        self.name = getattr(fhand, 'name', None)
+        self._compress_level = compress_level
+        if threads is None:
+            threads = multiprocessing.cpu_count()
+        self._pool = ThreadPool(threads) if threads > 1 else None
+        self._max_pending = 2 * threads
+        self._pending = deque()
+        self._buffer = []
+        self._buffer_size = 0
+        self._position = 0
+        self.closed = False
+
+    def write(self, string):
+        'It writes the string'
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+        self._buffer.append(string)
+        self._buffer_size += len(string)
+        self._position += len(string)
+        if self._buffer_size >= BGZF_BLOCK_SIZE:
+            data = ''.join(self._buffer)
+            full_size = len(data) - len(data) % BGZF_BLOCK_SIZE
+            for start in xrange(0, full_size, BGZF_BLOCK_SIZE):
+                self._add_block(data[start:start + BGZF_BLOCK_SIZE])
+            rest = data[full_size:]
+            self._buffer = [rest] if rest else []
+            self._buffer_size = len(rest)
+
+    def _add_block(self, data):
+        'It compresses the block and it writes the ones already compressed'
+        if self._pool is None:
+            self._fhand.write(_compress_block(data, self._compress_level))
+            return
+        self._pending.append(self._pool.apply_async(_compress_block,
+                                               (data, self._compress_level)))
+        while len(self._pending) > self._max_pending:
+            self._fhand.write(self._pending.popleft().get())
+
+    def tell(self):
+        'It returns the uncompressed position'
+        return self._position
+
+    def flush(self):
+        'It writes the blocks already compressed'
+        while self._pending and self._pending[0].ready():
+            self._fhand.write(self._pending.popleft().get())
+        self._fhand.flush()
+
+    def close(self):
+        'It writes the remaining blocks and the end of file mark'
+        if self.closed:
+            return
+        if self._buffer_size:
+            self._add_block(''.join(self._buffer))
+        self._buffer = []
+        while self._pending:
+            self._fhand.write(self._pending.popleft().get())
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+        self._fhand.write(BGZF_EOF)
+        self._fhand.close()
+        self.closed = True
+
+    def __enter__(self):
+        'It returns the writer'
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        'It closes the writer'
+        self.close()
@@ -23,10 +23,40 @@ Created on 04/09/2009
 from __future__  import division
 import tempfile
 
-import itertools, random
+import itertools, random, resource, math, operator
 import cPickle as pickle
 
-from tempfile import TemporaryFile
+from tempfile import TemporaryFile, NamedTemporaryFile
+
+#the default memory budget for the spilling buffers in bytes
+DEFAULT_MEMORY_BUDGET = 4 * 1024 ** 3
+#every how many items the memory used is checked
+MEMORY_CHECK_INTERVAL = 1000
+
+def get_memory_usage():
+    'It returns the resident memory used by this process in bytes'
+    try:
+        fhand = open('/proc/self/statm')
+        try:
+            resident_pages = int(fhand.read().split()[1])
+        finally:
+            fhand.close()
+        return resident_pages * resource.getpagesize()
+    except (IOError, IndexError, ValueError):
+        #without /proc we use the peak memory, ru_maxrss is in KB in linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def get_peak_memory_usage(children=False):
+    '''It returns the peak resident memory used by this process in bytes.
+
+    If children is True the largest peak of the finished child processes is
+    also taken into account.
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if children:
+        peak = max(peak,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak * 1024
 
 def list_consecutive_pairs_iter(items):
     'Given a list it yields all consecutive pairs (1,2, 2,3, 3,4)'
@@ -45,20 +75,50 @@ def take_sample(iterator, sample_size, num_items_in=None):
     '''This function takes a sample of size sample size from the given iterator.
 
     Optionaly the function offers the possibility to give the num of items in
-    the iterator to improve velocity
+    the iterator. Otherwise a reservoir sample is taken, only sample_size
+    items are kept in memory.
     '''
 
     if num_items_in is None:
-        iterator, iterator2 = itertools.tee(iterator, 2)
-        num_items_in = 0
-        for item in iterator2:
-            num_items_in += 1
+        return iter(reservoir_sample(iterator, sample_size))
 
     if num_items_in < sample_size:
         return iterator
     else:
         return _take_sample(iterator, sample_size, num_items_in)
 
+def _random_no_zero():
+    'It returns a random number in the (0, 1) interval'
+    while True:
+        number = random.random()
+        if number:
+            return number
+
+def reservoir_sample(items, sample_size):
+    '''It returns a list with a random sample of the given items.
+
+    The items are read only once and only the sampled ones are kept in memory.
+    The items are returned in the order in which they were found. It uses the
+    algorithm L by Li, it jumps over the items that will not be sampled, so
+    only a few random numbers are required for long iterators.
+    '''
+    items = iter(items)
+    reservoir = list(enumerate(itertools.islice(items, sample_size)))
+    if len(reservoir) == sample_size and sample_size:
+        weight = math.exp(math.log(_random_no_zero()) / sample_size)
+        index = sample_size - 1
+        not_found = object()
+        while True:
+            skip = int(math.log(_random_no_zero()) / math.log(1 - weight))
+            item = next(itertools.islice(items, skip, None), not_found)
+            if item is not_found:
+                break
+            index += skip + 1
+            reservoir[random.randrange(sample_size)] = (index, item)
+            weight *= math.exp(math.log(_random_no_zero()) / sample_size)
+    reservoir.sort(key=operator.itemgetter(0))
+    return [item for index, item in reservoir]
+
 def _take_sample(iterator, sample_size, num_items_in):
     '''This function takes a sample of size sample size from the given iterator.
 
@@ -147,6 +207,86 @@ class store():
         'Part of the iterator protocol'
         return self
 
+class SpillingBuffer(object):
+    '''It keeps the items of an iterator so they can be iterated several times.
+
+    The items are kept in memory while the resident memory of the process is
+    below max_memory (in bytes). Once it is exceeded the following items are
+    pickled in a temporary file. Several iterators can be taken from the buffer
+    and used at the same time, like with itertools.tee. If max_memory is None
+    the items are never written to disk.
+    '''
+    def __init__(self, items, max_memory=DEFAULT_MEMORY_BUDGET,
+                 check_interval=MEMORY_CHECK_INTERVAL):
+        'It inits the buffer, the items are taken when they are required'
+        self._items = iter(items)
+        self.max_memory = max_memory
+        self._check_interval = check_interval
+        self._in_memory = []
+        self._spill_fhand = None
+        self.num_spilled = 0
+        self._exhausted = False
+
+    def _get_spilled(self):
+        'It returns True if the items are being written to disk'
+        return self._spill_fhand is not None
+    spilled = property(_get_spilled)
+
+    def _check_memory(self):
+        'It starts to spill the items if the memory budget is exceeded'
+        if (self.max_memory is not None and
+            not (len(self._in_memory) - 1) % self._check_interval and
+            get_memory_usage() > self.max_memory):
+            self._spill_fhand = NamedTemporaryFile(suffix='.spill')
+
+    def _fetch(self):
+        'It stores one more item and it returns False if there are no more'
+        if self._exhausted:
+            return False
+        try:
+            item = self._items.next()
+        except StopIteration:
+            self._exhausted = True
+            return False
+        if self._spill_fhand is None:
+            self._in_memory.append(item)
+            self._check_memory()
+        else:
+            pickle.dump(item, self._spill_fhand, pickle.HIGHEST_PROTOCOL)
+            self.num_spilled += 1
+        return True
+
+    def __len__(self):
+        'It returns the number of items stored so far'
+        return len(self._in_memory) + self.num_spilled
+
+    def __iter__(self):
+        'It yields all the items from the first one'
+        index = 0
+        while True:
+            if index < len(self._in_memory):
+                yield self._in_memory[index]
+                index += 1
+            elif self.spilled or not self._fetch():
+                break
+        if not self.spilled:
+            return
+        read_fhand = open(self._spill_fhand.name, 'rb')
+        try:
+            num_read = 0
+            while num_read < self.num_spilled or self._fetch():
+                self._spill_fhand.flush()
+                yield pickle.load(read_fhand)
+                num_read += 1
+        finally:
+            read_fhand.close()
+
+    def close(self):
+        'It removes the stored items and the temporary file'
+        self._in_memory = []
+        if self._spill_fhand is not None:
+            self._spill_fhand.close()
+
 def classify(items, classifier):
     '''Given an iterator and a classifier function it returns several iterators
 
@@ -172,3 +312,15 @@ def ungroup(items, ungrouper):
         subitems = ungrouper(item)
         for subitem in subitems:
             yield subitem
+
+def group_in_batches(items, batch_size):
+    '''It yields lists with batch_size items taken from the given iterator.
+
+    The last list can be shorter than batch_size.
+    '''
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, batch_size))
+        if not batch:
+            break
+        yield batch
@@ -23,6 +23,7 @@ import tempfile, shutil
 import os, re, math, subprocess
 from UserDict import DictMixin
 import franklin
+from franklin.utils.compressed_files import open_compressed_file
 
 DATA_DIR = os.path.join(os.path.split(franklin.__path__[0])[0], 'franklin',
                          'data')
@@ -456,11 +457,78 @@ class DisposableFile(file):
         file.close(self)
         os.remove(self.name)
 
+class FileSection(object):
+    '''A read only file that only shows a byte range of another file.
+
+    The positions used by seek and tell are relative to the section start.
+    '''
+    def __init__(self, fhand, start, end):
+        'It inits the section with the file and the start and end offsets'
+        self._fhand = fhand
+        self._start = start
+        self._end = end
+        self.name = fhand.name
+        fhand.seek(start)
+
+    def tell(self):
+        'It returns the position in the section'
+        return self._fhand.tell() - self._start
+
+    def seek(self, offset, whence=0):
+        'It moves to the given position in the section'
+        if whence == 0:
+            position = self._start + offset
+        elif whence == 1:
+            position = self._fhand.tell() + offset
+        else:
+            position = self._end + offset
+        position = min(max(position, self._start), self._end)
+        self._fhand.seek(position)
+
+    def _remaining(self, size):
+        'It returns the number of bytes that can be read'
+        remaining = self._end - self._fhand.tell()
+        if size is not None and 0 <= size < remaining:
+            return size
+        return remaining
+
+    def read(self, size=-1):
+        'It reads up to size bytes from the section'
+        remaining = self._remaining(size)
+        if remaining <= 0:
+            return ''
+        return self._fhand.read(remaining)
+
+    def readline(self, size=-1):
+        'It reads one line from the section'
+        remaining = self._remaining(size)
+        if remaining <= 0:
+            return ''
+        return self._fhand.readline(remaining)
+
+    def __iter__(self):
+        'Part of the iterator protocol'
+        return self
+
+    def next(self):
+        'It returns the next line'
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        'It closes the underlying file'
+        self._fhand.close()
+
 def get_fhand(file_, writable=False):
-    'Given an fhand or and fpath it returns an fhand'
+    '''Given an fhand or and fpath it returns an fhand
+
+    The gzip and BGZF files are opened with open_compressed_file.
+    '''
     if isinstance(file_, basestring):
         mode = 'w' if  writable else 'r'
-        file_ = open(file_, mode)
+        file_ = open_compressed_file(file_, mode)
     return file_
 
 def _common_base(path1, path2):
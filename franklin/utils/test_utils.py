@@ -25,7 +25,7 @@ def create_random_seqwithquality(length, gc=50, qual_range=40):
     'It returns a random seqwithquality'
     if isinstance(qual_range, int):
         qual_range = [qual_range, qual_range]
-        quals = []
+    quals = []
     for index in range(length):
         qual = random.randint(qual_range[0], qual_range[1])
         quals.append(qual)
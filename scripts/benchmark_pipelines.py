@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+'It times the cleaning pipelines with synthetic reads'
+
+import sys
+from optparse import OptionParser
+
+from franklin.benchmark.pipeline_benchmark import (run_benchmarks,
+                                                   write_benchmark_results,
+                                                   read_benchmark_results,
+                                                   compare_benchmark_results,
+                                                   DEFAULT_NUM_READS)
+from franklin.benchmark.read_generators import DEFAULT_SEED
+
+def parse_options():
+    'It parses the command line arguments'
+    parser = OptionParser()
+    parser.add_option('-n', '--num_reads', dest='num_reads', type='int',
+                      default=DEFAULT_NUM_READS,
+                      help='number of reads for every benchmark')
+    parser.add_option('-s', '--seed', dest='seed', type='int',
+                      default=DEFAULT_SEED,
+                      help='seed for the read generators')
+    parser.add_option('-p', '--pipelines', dest='pipelines', default=None,
+                      help='comma separated pipelines to time (default all)')
+    parser.add_option('--no_steps', dest='steps', action='store_false',
+                      default=True, help='do not time every step alone')
+    parser.add_option('-t', '--processes', dest='processes', type='int',
+                      default=False, help='number of processes to use')
+    parser.add_option('-o', '--outfile', dest='outfile', default=None,
+                      help='JSON file for the results')
+    parser.add_option('-c', '--compare', dest='compare', default=None,
+                      help='JSON results of a previous run to compare with')
+    return parser
+
+def main():
+    'The main function'
+    options = parse_options().parse_args()[0]
+    pipelines = options.pipelines
+    if pipelines is not None:
+        pipelines = pipelines.split(',')
+
+    results = run_benchmarks(num_reads=options.num_reads, seed=options.seed,
+                             pipelines=pipelines, steps=options.steps,
+                             processes=options.processes,
+                             log_fhand=sys.stderr)
+    if options.outfile:
+        write_benchmark_results(results, open(options.outfile, 'w'))
+    if options.compare:
+        old_results = read_benchmark_results(open(options.compare))
+        print compare_benchmark_results(old_results, results)
+
+if __name__ == '__main__':
+    main()
@@ -177,8 +177,7 @@ SCRIPTS_DIR = 'scripts'
 MODULES= {'ngs_backbone': {'Bio':        {'required': True},
                            'configobj':  {'required': True},
                            'pysam':      {'msg':'SNP calling will fail'},
-                           'matplotlib': {'msg':'some statistics will fail'},
-               'psubprocess':{'msg':'no parallel processing will be possible'}},
+                           'matplotlib': {'msg':'some statistics will fail'}},
           'clean_reads': {'Bio': {'required': True}}
            }
 
@@ -213,7 +212,6 @@ dist = setup(
     data_files = data_files,
     cmdclass = { 'install_data':    wx_smart_install_data,
                 'install_manpage':install_manpages },
-    requires=['BioPython', 'matplotlib', 'configobj',
-              'pysam', 'psubprocess'],
+    requires=['BioPython', 'matplotlib', 'configobj', 'pysam'],
     scripts=scripts,
 )
@@ -0,0 +1,129 @@
+'''
+Created on 17/10/2026
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest, os
+from StringIO import StringIO
+
+from franklin.benchmark.read_generators import (generate_reads,
+                                                quality_profile,
+                                                DEFAULT_ADAPTOR)
+from franklin.benchmark.pipeline_benchmark import (run_benchmarks,
+                                                   get_benchmark_steps,
+                                                   write_benchmark_results,
+                                                   read_benchmark_results,
+                                                   compare_benchmark_results,
+                                                   run_isolated_benchmark,
+                                                   _format_result)
+
+def _create_process_killer():
+    'It returns a mapper that ends its process without cleaning up'
+    def kill_process(sequence):
+        'It ends the process like a crash would do'
+        os._exit(3)
+    return kill_process
+
+class ReadGeneratorTest(unittest.TestCase):
+    'It tests the synthetic read generators'
+    @staticmethod
+    def test_quality_profile():
+        'It tests the mean quality along a read'
+        profile = quality_profile(10, 10, 40, 20, ramp=0.2, decay=0.5)
+        assert profile[0] == 10
+        assert profile[2:5] == [40, 40, 40]
+        assert profile[-1] == 20
+
+    @staticmethod
+    def test_generate_reads():
+        'It tests that the reads are deterministic'
+        reads = list(generate_reads('illumina', 50, seed=3))
+        assert len(reads) == 50
+        assert reads[0].name == 'illumina_0000000'
+        for read in reads:
+            assert len(read) == 100
+            assert len(read.qual) == 100
+        reads2 = list(generate_reads('illumina', 50, seed=3))
+        assert [str(read.seq) for read in reads] == \
+                                            [str(read.seq) for read in reads2]
+        assert [read.qual for read in reads] == [read.qual for read in reads2]
+        reads3 = list(generate_reads('illumina', 50, seed=4))
+        assert [str(read.seq) for read in reads] != \
+                                            [str(read.seq) for read in reads3]
+
+        #the contaminations
+        reads = list(generate_reads('454', 20, adaptor_freq=1.0,
+                                    polya_freq=1.0, with_quality=False))
+        for read in reads:
+            assert str(read.seq).startswith(DEFAULT_ADAPTOR)
+            assert str(read.seq).endswith('A' * 25)
+            assert read.qual is None
+
+        reads = list(generate_reads('sanger', 20, length=300,
+                                    profile={'length_sd': 0}))
+        assert set([len(read) for read in reads]) == set([300])
+
+class PipelineBenchmarkTest(unittest.TestCase):
+    'It tests the pipeline benchmarks'
+    @staticmethod
+    def test_benchmark_steps():
+        'Every step is benchmarked once'
+        steps = get_benchmark_steps()
+        names = [step[0] for step in steps]
+        assert len(names) == len(set(names))
+        assert 'mask_low_complex' in names
+        assert 'solid' in [step[2] for step in steps]
+
+    @staticmethod
+    def test_run_benchmarks():
+        'It times some pipelines and it compares the results'
+        log = StringIO()
+        results = run_benchmarks(num_reads=20, pipelines=['solid'],
+                                 steps=False, log_fhand=log)
+        result = results['pipelines']['solid']
+        assert result['reads_in'] == 20
+        assert result['reads_per_second'] > 0
+        assert result['peak_rss_kb'] > 0
+        assert 'solid_quality' in result['steps']
+        assert 'solid' in log.getvalue()
+
+        fhand = StringIO()
+        write_benchmark_results(results, fhand)
+        fhand.seek(0)
+        old_results = read_benchmark_results(fhand)
+        assert old_results['num_reads'] == 20
+        report = compare_benchmark_results(old_results, results)
+        assert '+0.0%' in report
+
+    @staticmethod
+    def test_failed_benchmarks():
+        'A benchmark process that dies or a zero time do not break the run'
+        step = {'function': _create_process_killer, 'arguments': {},
+                'type': 'mapper', 'name': 'killer',
+                'comment': 'It kills the benchmark process'}
+        result = run_isolated_benchmark([step], {'platform': 'sanger'}, 5,
+                                        configuration={})
+        assert 'exit code 3' in result['error']
+        assert 'failed' in _format_result('killer', result)
+
+        result = {'reads_per_second': None, 'wall_time': 0.0,
+                  'peak_rss_kb': 100}
+        assert 'n/a reads/s' in _format_result('instant', result)
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -19,16 +19,27 @@ Created on 2009 uzt 30
 # You should have received a copy of the GNU Affero General Public License
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
-import unittest, os
+import unittest, os, copy, time, threading, gzip
 from tempfile import NamedTemporaryFile
 
 from franklin.pipelines.pipelines import  (configure_pipeline,
                                          seq_pipeline_runner,
-                                         _pipeline_builder)
+                                         _pipeline_builder, PipelineStats,
+                                         _parallel_process_sequences)
+from franklin.pipelines.step_cache import StepResultCache
+from franklin.utils.itertools_ import SpillingBuffer
 from franklin.utils.seqio_utils import seqs_in_file
-from franklin.seq.writers import SequenceWriter, create_temp_seq_file
-from franklin.utils.misc_utils import TEST_DATA_DIR
+from franklin.seq.writers import (SequenceWriter, create_temp_seq_file,
+                                  PairedSequenceWriter)
+from franklin.seq.seqs import CompactSeqWithQuality, SeqWithQuality, Seq
+from franklin.utils.misc_utils import TEST_DATA_DIR, NamedTemporaryDir
+from franklin.utils.compressed_files import open_compressed_file
 from franklin.utils.test_utils import create_random_seqwithquality
+from franklin.pipelines.seq_pipeline_steps import (up_case, strip_quality,
+                                                   edge_remover,
+                                                   sequence_trimmer,
+                                                   filter_short_seqs,
+                                                   filter_similar_seqs)
 
 
 ADAPTORS = '''>adaptor1
@@ -50,6 +61,79 @@ ATGCATCAGATGCATGCATGACTACGACTACGATCAGCATCAGCGATCAGCATCGATACGATCATCGACTGCATCGATGA
 AACCGTTTGACTTACGATATTTGCCCATTGTGATTCTAGTCGATTTGCATAACGTGTACGTATCGGTATTGTGACTGATTCGATGCTATTGCAAACAGTTTTGATTGTGTGATCGTGATGCATGCTAGTCTGATCGAGTCTGATCGTAGTCTAGTCGTAGTCGATGTCGATTTATCAGTAGTCGATGCTAGTCTAGTCTAGTCTACTAGTCTAGTCATGCTAGTCGAGTCGAT
 '''
 
+def _create_batch_lengths_filter(min_length):
+    'It returns a batch mapper that removes the short seqs of every batch'
+    def remove_short(sequences):
+        'It removes the short seqs and it records the batch length'
+        for sequence in sequences:
+            if sequence is not None:
+                sequence.description = str(len(sequences))
+        return [sequence if sequence is not None and len(sequence) >= min_length
+                                         else None for sequence in sequences]
+    return remove_short
+
+_CALLS = []
+
+def _create_call_counter_filter(mark):
+    'It returns a filter that annotates the seqs and counts its calls'
+    def call_counter_filter(sequence):
+        'It marks the sequence in the description'
+        _CALLS.append(sequence.name)
+        sequence.description = mark
+        return True
+    return call_counter_filter
+
+def _create_slow_tool(running, step_type):
+    '''It returns a step function that waits like an external program.
+
+    It records in running the number of calls that are running at the same
+    time.
+    '''
+    lock = threading.Lock()
+    def slow_tool(item):
+        'It waits a little'
+        with lock:
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+        time.sleep(0.02)
+        with lock:
+            running['now'] -= 1
+        if step_type == 'filter':
+            return len(item) >= 50
+        elif step_type == 'batch_mapper':
+            return [seq.upper() for seq in item]
+        return item.upper()
+    return slow_tool
+
+def _create_two_pass_processor(buffers):
+    '''It returns a bulk processor that reads the sequences twice.
+
+    It removes the sequences shorter than the mean length and it appends the
+    items it gets to buffers.
+    '''
+    def remove_shorter_than_mean(sequences):
+        'It calculates the mean length and it yields the longer seqs'
+        buffers.append(sequences)
+        lengths = [len(sequence) for sequence in sequences]
+        mean = sum(lengths) / float(len(lengths))
+        for sequence in sequences:
+            if len(sequence) >= mean:
+                yield sequence
+    return remove_shorter_than_mean
+
+class _FailingWriter(object):
+    'A writer that fails after writing some sequences'
+    def __init__(self, num_seqs):
+        'It inits the writer'
+        self.num_features = 0
+        self._num_seqs = num_seqs
+
+    def write(self, sequence):
+        'It counts the sequence and it fails if there are enough'
+        self.num_features += 1
+        if self.num_features > self._num_seqs:
+            raise ValueError('Too many sequences')
+
 class PipelineTests(unittest.TestCase):
     'It test pipeline related functions'
 
@@ -193,6 +277,526 @@ class PipelineTests(unittest.TestCase):
         result_seq = out_fhand.read()
         assert result_seq.count('>') == 3
 
+    @staticmethod
+    def test_pipeline_multiprocessing():
+        'The mapper and filter steps run in a pool of processes'
+        pipeline = [copy.deepcopy(step) for step in (up_case, strip_quality,
+                                                     edge_remover,
+                                                     sequence_trimmer,
+                                                     filter_short_seqs)]
+        configuration = {'edge_removal': {'left_length': 5,
+                                          'right_length': 5},
+                         'remove_short': {'length': 50}}
+        seqs = [create_random_seqwithquality(100, qual_range=[10, 50])
+                                                          for index in range(57)]
+        #one of them will be filtered out
+        seqs.append(create_random_seqwithquality(40, qual_range=40))
+
+        def _process(processes, ordered=True):
+            'It runs the pipeline with a copy of the seqs'
+            seqs_ = iter(copy.deepcopy(seqs))
+            return list(_pipeline_builder(pipeline, seqs_, configuration,
+                                          processes=processes,
+                                          ordered=ordered, batch_size=5))
+        expected = [(seq.name, str(seq.seq)) for seq in _process(False)]
+        assert len(expected) == 57
+
+        result = [(seq.name, str(seq.seq)) for seq in _process(2)]
+        assert result == expected
+
+        result = [(seq.name, str(seq.seq)) for seq in _process(3,
+                                                               ordered=False)]
+        assert sorted(result) == sorted(expected)
+
+    @staticmethod
+    def test_seq_pipeline_file_sections():
+        'The input file is split in sections processed in parallel'
+        pipeline = [copy.deepcopy(step) for step in (up_case, edge_remover)]
+        configuration = {'edge_removal': {'left_length': 3,
+                                          'right_length': 3}}
+        seqs = [create_random_seqwithquality(60, qual_range=[10, 50])
+                                                          for index in range(23)]
+        for format in ('fastq', 'qual'):
+            inseq_fhand, inqual_fhand = create_temp_seq_file(seqs,
+                                                             format=format)
+
+            def _run(processes):
+                'It runs the pipeline and returns the written sequences'
+                in_fhands = {'in_seq': open(inseq_fhand.name)}
+                if inqual_fhand is not None:
+                    in_fhands['in_qual'] = open(inqual_fhand.name)
+                out_fhand = NamedTemporaryFile()
+                writer = SequenceWriter(out_fhand, file_format='fastq')
+                seq_pipeline_runner(pipeline, configuration, in_fhands,
+                                    processes=processes,
+                                    writers={'seq': writer})
+                return open(out_fhand.name).read()
+            expected = _run(False)
+            assert expected.count('@') >= len(seqs)
+            assert _run(3) == expected
+
+    @staticmethod
+    def test_section_workers_wait():
+        'The section workers send more batches than the queues can keep'
+        pipeline = [copy.deepcopy(up_case)]
+        seqs = [create_random_seqwithquality(60, qual_range=[10, 50])
+                                                       for index in range(200)]
+        inseq_fhand = create_temp_seq_file(seqs, format='fastq')[0]
+        processed = _parallel_process_sequences(open(inseq_fhand.name), None,
+                                                'fastq', pipeline, {},
+                                                processes=3, batch_size=1)
+        assert [seq.name for seq in processed] == [seq.name for seq in seqs]
+
+    @staticmethod
+    def test_seq_pipeline_compressed():
+        'The gzip and BGZF files are read and written'
+        pipeline = [copy.deepcopy(step) for step in (up_case, edge_remover)]
+        configuration = {'edge_removal': {'left_length': 3,
+                                          'right_length': 3}}
+        seqs = [create_random_seqwithquality(200, qual_range=[10, 50])
+                                                       for index in range(600)]
+        plain_fhand = create_temp_seq_file(seqs, format='fastq')[0]
+        content = open(plain_fhand.name).read()
+        bgzf_fhand = NamedTemporaryFile(suffix='.fastq.gz')
+        writer = open_compressed_file(bgzf_fhand.name, 'w', threads=2)
+        writer.write(content)
+        writer.close()
+        gzip_fhand = NamedTemporaryFile(suffix='.fastq.gz')
+        writer = gzip.GzipFile(fileobj=gzip_fhand, mode='w')
+        writer.write(content)
+        writer.close()
+        gzip_fhand.flush()
+
+        def _run(in_fhand, processes):
+            'It runs the pipeline and returns the written sequences'
+            out_fhand = NamedTemporaryFile(suffix='.fastq.gz')
+            compressed_out_fhand = open_compressed_file(out_fhand.name, 'w')
+            writer = SequenceWriter(compressed_out_fhand, file_format='fastq')
+            seq_pipeline_runner(pipeline, configuration,
+                                {'in_seq': open(in_fhand.name)},
+                                processes=processes, writers={'seq': writer})
+            compressed_out_fhand.close()
+            return open_compressed_file(out_fhand.name).read()
+        expected = _run(plain_fhand, False)
+        assert expected.count('\n') == 4 * len(seqs)
+        for in_fhand in (bgzf_fhand, gzip_fhand):
+            for processes in (False, 3):
+                assert _run(in_fhand, processes) == expected
+
+    def test_seq_pipeline_paired(self):
+        'The pairs are filtered and written together'
+        pipeline = [copy.deepcopy(step) for step in (up_case, edge_remover,
+                                                     sequence_trimmer,
+                                                     filter_short_seqs)]
+        configuration = {'edge_removal': {'left_length': 5,
+                                          'right_length': 5},
+                         'remove_short': {'length': 30}}
+        mates1, mates2 = [], []
+        for index in range(30):
+            length2 = 30 if index % 4 == 0 else 60
+            for length, mate, mates in ((60, 1, mates1), (length2, 2, mates2)):
+                seq = create_random_seqwithquality(length, qual_range=[10, 50])
+                seq.id = seq.name = 'seq%d/%d' % (index, mate)
+                mates.append(seq)
+        inseq_fhand1 = create_temp_seq_file(mates1, format='fastq')[0]
+        inseq_fhand2 = create_temp_seq_file(mates2, format='fastq')[0]
+        interleaved = create_temp_seq_file(sum(zip(mates1, mates2), ()),
+                                           format='fastq')[0]
+
+        def _run(processes, interleaved_input):
+            'It runs the pipeline and it returns the names of both outputs'
+            if interleaved_input:
+                in_fhands = {'in_seq': open(interleaved.name)}
+            else:
+                in_fhands = {'in_seq': open(inseq_fhand1.name),
+                             'in_mates': open(inseq_fhand2.name)}
+            out_fhands = NamedTemporaryFile(), NamedTemporaryFile()
+            writer = PairedSequenceWriter(*[SequenceWriter(out_fhand,
+                                                           file_format='fastq')
+                                                  for out_fhand in out_fhands])
+            seq_pipeline_runner(pipeline, configuration, in_fhands,
+                                processes=processes, writers={'seq': writer},
+                                paired=True)
+            return [[seq.name for seq in seqs_in_file(open(out_fhand.name))]
+                                                   for out_fhand in out_fhands]
+        names1, names2 = _run(False, False)
+        assert len(names1) == 22
+        assert [name[:-2] for name in names1] == [name[:-2] for name in names2]
+        assert names1[0] == 'seq1/1' and names2[0] == 'seq1/2'
+        for processes, interleaved_input in ((3, False), (False, True),
+                                             (4, True)):
+            assert _run(processes, interleaved_input) == [names1, names2]
+
+        #the bulk processors can not process the pairs
+        step = {'name': 'two_pass', 'function': _create_two_pass_processor,
+                'arguments': {'buffers': []}, 'type': 'bulk_processor',
+                'comment': 'It reads the sequences twice'}
+        try:
+            _pipeline_builder([step], iter([]), paired=True)
+            self.fail('ValueError expected')
+        except ValueError:
+            pass
+
+    @staticmethod
+    def test_pipeline_stats():
+        'The items and the time spent by every step are recorded'
+        pipeline = [copy.deepcopy(step) for step in (up_case, edge_remover,
+                                                     filter_short_seqs)]
+        configuration = {'edge_removal': {'left_length': 5,
+                                          'right_length': 5},
+                         'remove_short': {'length': 50}}
+        seqs = [create_random_seqwithquality(100, qual_range=[10, 50])
+                                                          for index in range(9)]
+        seqs.append(create_random_seqwithquality(40, qual_range=40))
+
+        for processes in (False, 2):
+            stats = PipelineStats()
+            result = list(_pipeline_builder(pipeline, iter(copy.deepcopy(seqs)),
+                                            configuration, processes=processes,
+                                            batch_size=3, stats=stats))
+            assert len(result) == 9
+            assert [step.name for step in stats.steps] == ['up_case',
+                                                           'edge_removal',
+                                                           'remove_short']
+            filter_stats = stats['remove_short']
+            assert filter_stats.items_in == 10
+            assert filter_stats.items_out == 9
+            assert filter_stats.dropped == 1
+            assert stats['up_case'].dropped == 0
+            assert len(filter_stats.slowest) == 5
+            assert 'remove_short' in stats.report()
+
+        #a bulk processor
+        def double(items):
+            'It yields every item twice'
+            for item in items:
+                yield item
+                yield item
+        bulk_step = {'function':lambda: double, 'arguments':{},
+                     'type':'bulk_processor', 'name':'double',
+                     'comment': 'It doubles the items'}
+        stats = PipelineStats()
+        result = list(_pipeline_builder([bulk_step], iter(range(4)),
+                                        stats=stats))
+        assert len(result) == 8
+        assert stats['double'].items_in == 4
+        assert stats['double'].items_out == 8
+        assert stats['double'].dropped == 0
+
+    @staticmethod
+    def test_pipeline_batch_mapper():
+        'The batch mappers get lists of sequences'
+        batch_step = {'function':_create_batch_lengths_filter,
+                      'arguments':{'min_length':50}, 'type':'batch_mapper',
+                      'batch_size': 4, 'name':'batch_remove_short',
+                      'comment': 'It removes the short seqs by batches'}
+        seqs = [create_random_seqwithquality(100, qual_range=[10, 50])
+                                                          for index in range(9)]
+        seqs.insert(3, create_random_seqwithquality(40, qual_range=40))
+
+        def _process(processes):
+            'It runs the pipeline with a copy of the seqs'
+            pipeline = [copy.deepcopy(step) for step in (up_case, batch_step)]
+            stats = PipelineStats()
+            result = _pipeline_builder(pipeline, iter(copy.deepcopy(seqs)),
+                                       processes=processes, batch_size=5,
+                                       stats=stats)
+            #the removed seqs are returned as None, like with the mappers
+            result = [seq for seq in result if seq is not None]
+            assert stats['batch_remove_short'].items_in == 10
+            assert stats['batch_remove_short'].items_out == 9
+            return result
+        result = _process(False)
+        assert len(result) == 9
+        assert [seq.description for seq in result] == ['4'] * 7 + ['2'] * 2
+        expected = [(seq.name, str(seq.seq)) for seq in result]
+        assert expected == [(seq.name, str(seq.seq).upper())
+                                            for seq in seqs if len(seq) >= 50]
+
+        result = _process(2)
+        assert [(seq.name, str(seq.seq)) for seq in result] == expected
+
+    @staticmethod
+    def test_step_cache():
+        'The step results are stored in the cache'
+        work_dir = NamedTemporaryDir()
+        cache = StepResultCache(os.path.join(work_dir.name, 'cache.sqlite'),
+                                max_size=1000)
+        found, value = cache.get('a')
+        assert not found and value is None
+        for index in range(10):
+            cache.set('key%d' % index, 'x' * 50)
+        cache.get('key0')
+        assert len(cache) == 10
+        assert cache.get('key3') == (True, 'x' * 50)
+        #the least recently used results are removed
+        for index in range(10, 20):
+            cache.set('key%d' % index, 'x' * 50)
+        assert len(cache) < 20
+        assert cache.get('key0')[0]
+        assert not cache.get('key1')[0]
+        assert cache.get('key19')[0]
+        cache.close()
+        work_dir.close()
+
+    @staticmethod
+    def test_pipeline_cache():
+        'The cached results are used instead of running the steps'
+        counter = {'function':_create_call_counter_filter,
+                   'arguments':{'mark':'counted'}, 'type':'filter',
+                   'name':'counter', 'comment': 'It counts the items'}
+        configuration = {'edge_removal': {'left_length': 5,
+                                          'right_length': 5},
+                         'remove_short': {'length': 50}}
+        seqs = [create_random_seqwithquality(100, qual_range=[10, 50])
+                                                          for index in range(9)]
+        seqs.append(create_random_seqwithquality(40, qual_range=40))
+        work_dir = NamedTemporaryDir()
+        cache = StepResultCache(os.path.join(work_dir.name, 'cache.sqlite'))
+
+        def _run(processes=False):
+            'It runs the pipeline with a copy of the seqs'
+            pipeline = [copy.deepcopy(step) for step in (up_case, counter,
+                                                         edge_remover,
+                                                         sequence_trimmer,
+                                                         filter_short_seqs)]
+            seqs_ = iter(copy.deepcopy(seqs))
+            return [(seq.name, str(seq.seq), seq.description) for seq in
+                      _pipeline_builder(pipeline, seqs_, configuration,
+                                        processes=processes, cache=cache)]
+        expected = _run()
+        assert len(expected) == 9
+        assert len(_CALLS) == 10
+        assert cache.misses and not cache.hits
+
+        #the results and the annotations done by the filter are cached
+        assert _run() == expected
+        assert len(_CALLS) == 10
+        assert cache.hits
+        assert _run(processes=2) == expected
+
+        #only the steps with a new configuration are run again
+        configuration['remove_short']['length'] = 10
+        assert len(_run()) == 10
+        counter['arguments']['mark'] = 'counted_again'
+        result = _run()
+        assert len(_CALLS) == 20
+        assert result[0][2] == 'counted_again'
+
+        #the compact reads are also cached
+        seqs[:] = [CompactSeqWithQuality.from_seq_with_quality(seq)
+                                                              for seq in seqs]
+        hits = cache.hits
+        expected = _run()
+        assert _run() == expected
+        assert cache.hits > hits
+
+        #nothing is cached if a batch step does not return every item
+        def remove_short(sequences):
+            'It returns only the long sequences'
+            return [sequence for sequence in sequences if len(sequence) >= 50]
+        batch_step = {'function':lambda: remove_short, 'arguments':{},
+                      'type':'batch_mapper', 'name':'batch_remove_short',
+                      'comment': 'It removes the short seqs'}
+        num_cached = len(cache)
+        try:
+            list(_pipeline_builder([batch_step], iter(copy.deepcopy(seqs)),
+                                   cache=cache))
+            raise AssertionError('ValueError expected')
+        except ValueError:
+            pass
+        assert len(cache) == num_cached
+        cache.close()
+        work_dir.close()
+
+    @staticmethod
+    def test_filter_similar_seqs_batches():
+        'The filtered seqs keep their slot in the cache and in the pairs'
+        similar  = 'AATCACCGAGCTCAAGGGTATTCAGGTGAAGAAATTCTTTATTTGGCTCGATGTCGA'
+        similar += 'TGAGATCAAGGTCGATCTTCCACCTTCTGATTCAATCTACTTCAAAGTTGGCTTTATC'
+        similar += 'AATAAGAAGCTTGATATTGACCAGTTTAAGACTATACATTCTTGTCACGATAATGGTG'
+        db = os.path.join(TEST_DATA_DIR, 'blast', 'arabidopsis_genes+')
+        configuration = {'filter_similar_seqs': {'db': db,
+                                                 'blast_program': 'blastn'}}
+        seqs = [create_random_seqwithquality(100, qual_range=[10, 50])
+                                                         for index in range(3)]
+        seqs[1] = SeqWithQuality(seq=Seq(similar), qual=[30] * len(similar))
+        for index, seq in enumerate(seqs):
+            seq.name = 's%d' % index
+        work_dir = NamedTemporaryDir()
+        cache = StepResultCache(os.path.join(work_dir.name, 'cache.sqlite'))
+
+        def _run(seqs_, paired=False):
+            'It runs the filter and it returns the names of the kept items'
+            pipeline = [copy.deepcopy(filter_similar_seqs)]
+            result = _pipeline_builder(pipeline, iter(copy.deepcopy(seqs_)),
+                                       configuration, cache=cache,
+                                       paired=paired)
+            if paired:
+                return [(pair[0].name, pair[1].name) for pair in result
+                                                           if pair is not None]
+            return [seq.name for seq in result if seq is not None]
+        assert _run(seqs) == ['s1']
+        assert _run(seqs) == ['s1']
+        assert cache.hits
+        #a cached result is not given to another seq
+        assert _run(seqs[:1]) == []
+        assert _run(seqs[1:]) == ['s1']
+
+        #a pair is removed if any mate is removed
+        pairs = [(seqs[0], seqs[1]), (seqs[1], seqs[1]), (seqs[2], seqs[0])]
+        assert _run(pairs, paired=True) == [('s1', 's1')]
+        cache.close()
+        work_dir.close()
+
+    @staticmethod
+    def test_pipeline_tool_threads():
+        'The steps with external programs run several programs at once'
+        seqs = [create_random_seqwithquality(100, qual_range=[10, 50])
+                                                          for index in range(30)]
+        seqs.insert(4, create_random_seqwithquality(40, qual_range=40))
+        expected = [(seq.name, str(seq.seq).upper()) for seq in seqs
+                                                             if len(seq) >= 50]
+        for step_type in ('mapper', 'filter', 'batch_mapper'):
+            running = {'now': 0, 'max': 0}
+            slow_step = {'function':_create_slow_tool,
+                         'arguments':{'running':running,
+                                      'step_type': step_type},
+                         'type':step_type, 'external_program': True,
+                         'batch_size': 3, 'name':'slow_tool',
+                         'comment': 'It looks like an external program'}
+            pipeline = [copy.deepcopy(step) for step in (up_case,
+                                                         filter_short_seqs)]
+            pipeline.insert(1, slow_step)
+            configuration = {'remove_short': {'length': 50}}
+            stats = PipelineStats()
+            result = _pipeline_builder(pipeline, iter(copy.deepcopy(seqs)),
+                                       configuration, tool_threads=3,
+                                       stats=stats)
+            result = [(seq.name, str(seq.seq)) for seq in result]
+            assert result == expected
+            assert running['max'] == 3
+            assert stats['slow_tool'].items_in == 31
+
+    @staticmethod
+    def test_seq_pipeline_threaded_writers():
+        'Every writer can write in its own thread'
+        pipeline = [copy.deepcopy(step) for step in (up_case, edge_remover)]
+        configuration = {'edge_removal': {'left_length': 3,
+                                          'right_length': 3}}
+        seqs = [create_random_seqwithquality(60, qual_range=[10, 50])
+                                                       for index in range(300)]
+        inseq_fhand = create_temp_seq_file(seqs, format='fastq')[0]
+
+        def _run(threaded_writers, writers=None):
+            'It runs the pipeline and returns the written files'
+            in_fhands = {'in_seq': open(inseq_fhand.name)}
+            out_fhands = [NamedTemporaryFile(), NamedTemporaryFile()]
+            if writers is None:
+                writers = {'fastq': SequenceWriter(out_fhands[0],
+                                                   file_format='fastq'),
+                           'fasta': SequenceWriter(out_fhands[1],
+                                                   file_format='fasta')}
+            counter = seq_pipeline_runner(pipeline, configuration, in_fhands,
+                                          writers=writers,
+                                          threaded_writers=threaded_writers)
+            return counter, [open(fhand.name).read() for fhand in out_fhands]
+        expected = _run(False)
+        assert expected[0] == {'fastq': 300, 'fasta': 300}
+        assert _run(True) == expected
+
+        #the writer errors are raised
+        writers = {'fasta': SequenceWriter(NamedTemporaryFile(),
+                                           file_format='fasta'),
+                   'failing': _FailingWriter(10)}
+        try:
+            _run(True, writers)
+            raise AssertionError('ValueError expected')
+        except ValueError:
+            pass
+
+    @staticmethod
+    def test_seq_pipeline_memory_budget():
+        'The bulk processors get a buffer that goes to disk'
+        buffers = []
+        step = {'name': 'two_pass', 'function': _create_two_pass_processor,
+                'arguments': {'buffers': buffers}, 'type': 'bulk_processor',
+                'comment': 'It reads the sequences twice'}
+        seqs = [create_random_seqwithquality(length, qual_range=[10, 50])
+                                            for length in range(10, 110, 10)]
+        inseq_fhand = create_temp_seq_file(seqs, format='fastq')[0]
+        out_fhand = NamedTemporaryFile()
+        stats = PipelineStats()
+        counter = seq_pipeline_runner([step], {},
+                                      {'in_seq': open(inseq_fhand.name)},
+                                      writers={'seq': SequenceWriter(out_fhand,
+                                                       file_format='fasta')},
+                                      stats=stats, memory_budget=1)
+        assert counter == {'seq': 5}
+        assert isinstance(buffers[0], SpillingBuffer)
+        assert buffers[0].spilled
+        assert stats.peak_memory > 0
+        assert 'Peak memory' in stats.report()
+        lengths = [len(seq) for seq in seqs_in_file(open(out_fhand.name))]
+        assert lengths == [60, 70, 80, 90, 100]
+
+    @staticmethod
+    def test_pipeline_checkpoints():
+        'The pipeline resumes after the last completed step'
+        configuration = {'edge_removal': {'left_length': 5,
+                                          'right_length': 5},
+                         'remove_short': {'length': 50}}
+        seqs = [create_random_seqwithquality(100, qual_range=[10, 50])
+                                                          for index in range(9)]
+        seqs.append(create_random_seqwithquality(40, qual_range=40))
+        calls = []
+        def count_calls(items):
+            'It counts the items processed by the step'
+            for item in items:
+                calls.append(item.name)
+                yield item
+        counter = {'function':lambda: count_calls, 'arguments':{},
+                   'type':'bulk_processor', 'name':'counter',
+                   'comment': 'It counts the items'}
+
+        def _run(steps, processes=False, input_signature='seqs'):
+            'It runs the pipeline with a copy of the seqs'
+            pipeline = [copy.deepcopy(step) for step in steps]
+            seqs_ = iter(copy.deepcopy(seqs))
+            return [(seq.name, str(seq.seq)) for seq in
+                      _pipeline_builder(pipeline, seqs_, configuration,
+                                        processes=processes,
+                                        checkpoint_dir=checkpoint_dir,
+                                        input_signature=input_signature)]
+        work_dir = NamedTemporaryDir()
+        checkpoint_dir = os.path.join(work_dir.name, 'checkpoints')
+        steps = [up_case, counter, edge_remover, sequence_trimmer,
+                 filter_short_seqs]
+        expected = _run(steps)
+        assert len(expected) == 9
+        assert len(calls) == 10
+        assert os.path.exists(os.path.join(checkpoint_dir, 'manifest.json'))
+
+        #nothing has to be run again
+        assert _run(steps) == expected
+        assert len(calls) == 10
+
+        #the steps after a changed one are run again
+        configuration['edge_removal']['left_length'] = 3
+        result = _run(steps, processes=2)
+        assert len(calls) == 10
+        assert result != expected
+
+        #only the last step is run again
+        configuration['remove_short']['length'] = 10
+        assert len(_run(steps)) == 10
+        assert len(calls) == 10
+
+        #a new input invalidates all the steps
+        _run(steps, input_signature='other_seqs')
+        assert len(calls) == 20
+        work_dir.close()
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'PipelineTests.test_seq_pipeline_parallel_run']
     unittest.main()
@@ -5,8 +5,9 @@ Created on 06/04/2011
 '''
 import unittest
 
-from franklin.seq.alignment import BlastAligner, sw_align, match_words
-from franklin.seq.seqs import SeqWithQuality, Seq
+from franklin.seq.alignment import (BlastAligner, sw_align, match_words,
+                                    SeedAligner)
+from franklin.seq.seqs import SeqWithQuality, Seq, reverse_complement_str
 
 class PairwiseAlignmentTest(unittest.TestCase):
     'It tests the different classes of Pairwise alignments'
@@ -57,6 +58,91 @@ class PairwiseAlignmentTest(unittest.TestCase):
         subject = SeqWithQuality(Seq('TCCTGAGT'))
         sw_align(query, subject)
 
+    @staticmethod
+    def test_seed_alignment():
+        'We can align short subjects in process'
+        seq1 = 'ACTACGGTTACACACGTGTATCAGTTACACAGTGTTGTCATCACTATCTAGTCAGTAGTCTAG'
+        adaptor = 'CACGCTAGTCGTAGTCGCTAGT'
+        subject = SeqWithQuality(name='adaptor', seq=Seq(adaptor))
+        filters = [{'kind':'score_threshold', 'score_key': 'identity',
+                    'min_score': 89}]
+        aligner = SeedAligner(subject=[subject], filters=filters)
+
+        #one mismatch
+        query = seq1[:20] + adaptor[:10] + 'T' + adaptor[11:] + seq1[20:]
+        query = SeqWithQuality(name='query', seq=Seq(query))
+        alignments = list(aligner.do_alignment(query))
+        match = alignments[0]['matches'][0]
+        assert match['subject'].name == 'adaptor'
+        assert match['start'] == 20
+        assert match['end'] == 41
+        assert 95 < match['scores']['identity'] < 96
+
+        #the reverse complement cut by the query start
+        query = reverse_complement_str(adaptor)[5:] + seq1
+        query = SeqWithQuality(name='query', seq=Seq(query))
+        match_part = list(aligner.do_alignment(query))[0]['matches'][0]
+        match_part = match_part['match_parts'][0]
+        assert match_part['query_start'] == 0
+        assert match_part['query_end'] == 16
+        assert match_part['subject_start'] == 5
+        assert match_part['subject_end'] == 21
+        assert match_part['subject_strand'] == -1
+
+        #with a deletion, cut by the query end and a list of queries
+        query1 = seq1 + adaptor[:8] + adaptor[9:18]
+        query1 = SeqWithQuality(name='query1', seq=Seq(query1))
+        query2 = SeqWithQuality(name='query2', seq=Seq(seq1))
+        alignments = list(aligner.do_alignment([query1, query2]))
+        assert len(alignments) == 1
+        assert alignments[0]['query'].name == 'query1'
+        match_part = alignments[0]['matches'][0]['match_parts'][0]
+        assert match_part['query_start'] == 63
+        assert match_part['query_end'] == 79
+        assert match_part['subject_start'] == 0
+        assert match_part['subject_end'] == 17
+
+    @staticmethod
+    def test_seed_partial_alignment():
+        'We can find a part of the subject inside the query'
+        seq1 = 'ACTACGGTTACACACGTGTATCAGTTACACAGTGTTGTCATCACTATCTAGTCAGTAGTCTAG'
+        adaptor = 'CACGCTAGTCGTAGTCGCTAGTGATCCGAA'
+        subject = SeqWithQuality(name='adaptor', seq=Seq(adaptor))
+        filters = [{'kind':'score_threshold', 'score_key': 'identity',
+                    'min_score': 89}]
+        aligner = SeedAligner(subject=[subject], filters=filters)
+
+        #20 residues of the 30 residue adaptor in the middle of the query
+        query = seq1[:20] + adaptor[5:25] + seq1[20:]
+        query = SeqWithQuality(name='query', seq=Seq(query))
+        match_part = list(aligner.do_alignment(query))[0]['matches'][0]
+        match_part = match_part['match_parts'][0]
+        assert match_part['query_start'] == 20
+        assert match_part['query_end'] == 39
+        assert match_part['subject_start'] == 5
+        assert match_part['subject_end'] == 24
+        assert match_part['scores']['identity'] == 100
+
+        #a part with a mismatch is also found
+        query = seq1[:20] + adaptor[3:13] + 'A' + adaptor[14:23] + seq1[20:]
+        query = SeqWithQuality(name='query', seq=Seq(query))
+        match_part = list(aligner.do_alignment(query))[0]['matches'][0]
+        match_part = match_part['match_parts'][0]
+        assert match_part['query_start'] == 20
+        assert match_part['query_end'] == 39
+        assert match_part['subject_start'] == 3
+        assert match_part['subject_end'] == 22
+
+        #a part shorter than the min_length is not reported
+        query = seq1[:20] + adaptor[5:16] + seq1[20:]
+        query = SeqWithQuality(name='query', seq=Seq(query))
+        assert not list(aligner.do_alignment(query))
+
+        #nor a short part with a mismatch, it could be found by chance
+        query = seq1[:20] + adaptor[5:12] + 'C' + adaptor[13:19] + seq1[20:]
+        query = SeqWithQuality(name='query', seq=Seq(query))
+        assert not list(aligner.do_alignment(query))
+
 class WordMatchTest(unittest.TestCase):
     'It test that we can match words against sequences'
 
@@ -0,0 +1,99 @@
+'''
+Created on 17/10/2026
+
+@author: jose
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from tempfile import NamedTemporaryFile
+
+from franklin.seq.binary_format import (BinarySeqWriter, binary_records,
+                                        num_binary_records,
+                                        binary_file_sections,
+                                        sample_binary_records)
+from franklin.seq.writers import SequenceWriter
+from franklin.seq.readers import (seqs_in_file, guess_seq_file_format,
+                                  num_seqs_in_file, seq_file_sections)
+from franklin.seq.seqs import SeqWithQuality, Seq
+from franklin.utils.misc_utils import FileSection
+
+class BinaryFormatTest(unittest.TestCase):
+    'It tests the binary container'
+    @staticmethod
+    def test_binary_container():
+        'It writes and reads the records'
+        records = [('record%d' % index) * (index % 5 + 1)
+                                                      for index in range(100)]
+        for compress in (False, True):
+            fhand = NamedTemporaryFile(suffix='.bin')
+            writer = BinarySeqWriter(fhand, compress=compress)
+            for record in records:
+                writer.write(record)
+            writer.close()
+            in_fhand = open(fhand.name)
+            assert list(binary_records(in_fhand)) == records
+            assert num_binary_records(in_fhand) == 100
+
+            sections = binary_file_sections(in_fhand, 3)
+            assert len(sections) == 3
+            section_records = []
+            for start, end in sections:
+                section = FileSection(open(fhand.name), start, end)
+                section_records.extend(binary_records(section))
+            assert section_records == records
+
+            sample = list(sample_binary_records(in_fhand, 10))
+            assert len(sample) == 10
+            assert sample == sorted(sample, key=records.index)
+
+        #without footer the file is scanned
+        fhand = NamedTemporaryFile(suffix='.bin')
+        writer = BinarySeqWriter(fhand)
+        for record in records[:10]:
+            writer.write(record)
+        fhand.flush()
+        in_fhand = open(fhand.name)
+        assert list(binary_records(in_fhand)) == records[:10]
+        assert num_binary_records(in_fhand) == 10
+        assert len(binary_file_sections(in_fhand, 2)) == 2
+        assert sample_binary_records(in_fhand, 2) is None
+
+    @staticmethod
+    def test_binary_seq_files():
+        'It writes and reads sequences with the binary file format'
+        seqs = [SeqWithQuality(Seq('ACTG' * index), name='seq%d' % index,
+                               qual=[30] * 4 * index) for index in range(1, 6)]
+        fhand = NamedTemporaryFile(suffix='.pickle')
+        writer = SequenceWriter(fhand, file_format='binary')
+        for seq in seqs:
+            writer.write(seq)
+        writer.close()
+
+        in_fhand = open(fhand.name)
+        assert guess_seq_file_format(in_fhand) == 'binary'
+        assert num_seqs_in_file(in_fhand) == 5
+        read_seqs = list(seqs_in_file(in_fhand))
+        assert [seq.name for seq in read_seqs] == [seq.name for seq in seqs]
+        assert str(read_seqs[2].seq) == str(seqs[2].seq)
+        assert read_seqs[2].qual == seqs[2].qual
+        assert len(list(seqs_in_file(in_fhand, sample_size=2))) == 2
+        assert len(seq_file_sections(in_fhand, 'binary', 2)) == 2
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
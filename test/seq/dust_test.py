@@ -0,0 +1,73 @@
+'''
+Created on 17/10/2026
+
+@author: jose
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest, random
+
+from franklin.seq import dust
+from franklin.seq.dust import dust_segments, dust_segments_for_seqs
+
+class DustTest(unittest.TestCase):
+    'It tests the low complexity masking with DUST'
+    @staticmethod
+    def test_dust_segments():
+        'It finds the low complexity segments'
+        seq = 'CCCCTCAAACCCCTCAAACCCCTCAAACCCCTCAAACCCCTCAAACCCCTCAAACCCC'
+        seq += 'TCAAACCCCTCAAACCCCTCAAACCCCTCAAACCCCTCAAACCCCTCAAACCCCTCAAA'
+        assert dust_segments(seq) == [(0, 114)]
+        seq = 'GCACATGAGATTCGATCGAATCCTGCATTTGACGTAGCTAAGGCAT'
+        assert dust_segments(seq) == []
+        assert dust_segments('') == []
+
+        #the segments given by mdust -v 25 -c
+        seq = 'AAACCATGGATTACGGTCTGCGTTGGAATCAGCGTCGTCGTCGTCGTCGTCGTCGTCGTC'
+        seq += 'GTCGTAGTGCAGTAGTGTAGTGTAGTGTAGTGTAGTGTAGTGTAGTGTAGTGTAGTGTAG'
+        seq += 'TGTAGTGTAGTTATTTGTGGCATGAGCCCGGGCAAAGTTTTCTGAA'
+        assert dust_segments(seq) == [(32, 63), (64, 130)]
+        seq = 'ACCCTCATGCTATAAATATCAGGCGGAGCGGAGCGGAGCGGAGCGGAGCGGAGCGGAGCG'
+        seq += 'GAGCGGAGCGGATATATTATGTCCTTCTGTATCTGTATCTGTATCTGTAAGGGGCCAGGG'
+        seq += 'TGGGTCGTCGGTGTTGCAGCGGTGTTTCGGGGTACCGTCACTCCCCTCCCCTCCCCTCCC'
+        seq += 'CTCCCCTCCCCTCCCCTCCCGCCAGCCAGCCAGCCAGCCAGCCAGCCAGCCAGCCA'
+        assert dust_segments(seq) == [(22, 71), (160, 190), (192, 199),
+                                      (200, 235)]
+        assert dust_segments_for_seqs([]) == []
+
+    @staticmethod
+    def test_dust_without_numpy():
+        'The same segments are found with and without numpy'
+        seqs = []
+        for index in range(30):
+            repeat_len = random.randint(1, 5)
+            repeat = ''.join(random.choice('ACGT')
+                                             for index in range(repeat_len))
+            seq = ''.join(random.choice('ACGTN') for index in range(50))
+            seq += repeat * random.randint(1, 40)
+            seq += ''.join(random.choice('ACGT') for index in range(50))
+            seqs.append(seq)
+        numpy_segments = dust_segments_for_seqs(seqs)
+        numpy_module = dust.numpy
+        dust.numpy = None
+        try:
+            assert dust_segments_for_seqs(seqs) == numpy_segments
+        finally:
+            dust.numpy = numpy_module
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,8 @@ Created on 11/05/2010
 @author: peio
 '''
 from franklin.utils.misc_utils import TEST_DATA_DIR
-import unittest, StringIO, tempfile, os
+import unittest, StringIO, tempfile, os, copy
+import cPickle as pickle
 
 from Bio.Alphabet import SingleLetterAlphabet, DNAAlphabet
 from Bio.SeqFeature import ExactPosition, FeatureLocation
@@ -12,8 +13,13 @@ from Bio.SeqFeature import ExactPosition, FeatureLocation
 from franklin.seq.writers import write_seqs_in_file
 from franklin.seq.readers import (seqs_in_file, guess_seq_file_format,
                                   guess_seq_type, num_seqs_in_file,
-                                  _cast_to_class, fasta_contents_in_file)
-from franklin.seq.seqs import Seq, SeqWithQuality, SeqFeature
+                                  _cast_to_class, fasta_contents_in_file,
+                                  seq_file_sections, _seqs_in_file_native,
+                                  _seqs_in_file_with_bio, paired_seqs_in_file,
+                                  paired_file_sections)
+from franklin.seq.seqs import (Seq, SeqWithQuality, SeqFeature,
+                               CompactSeqWithQuality)
+from franklin.utils.misc_utils import FileSection
 from os.path import join
 
 class GuessFormatSeqFileTest(unittest.TestCase):
@@ -309,6 +315,147 @@ class SeqsInFileTests(unittest.TestCase):
         assert fastas[0][0] == 'seq1'
         assert fastas[1][1] == 'polya'
         assert 'TAGTCTATGATGCATCAGATGCATGA' in fastas[2][2]
+class NativeParserTest(unittest.TestCase):
+    'It tests the parsers that do not use biopython'
+    @staticmethod
+    def _parse(content, file_format, qual_content=None, native=True):
+        'It returns the seqs read from the contents or the error message'
+        fhand = StringIO.StringIO(content)
+        qual_fhand = None
+        if qual_content is not None:
+            qual_fhand = StringIO.StringIO(qual_content)
+        parser = _seqs_in_file_native if native else _seqs_in_file_with_bio
+        try:
+            seqs = parser(fhand, file_format, qual_fhand=qual_fhand)
+            return [(str(seq.seq), seq.name, seq.description, seq.qual)
+                                                            for seq in seqs]
+        except ValueError:
+            return 'error'
+
+    def test_native_parsers(self):
+        'The native parsers give the same seqs as biopython'
+        cases = [('fastq', '@seq1 desc  1\nACGT\n+\n!!II\n@seq2\tx\nAC\n'
+                           'GT\n+seq2\tx\nII\nII\n'),
+                 ('fastq-illumina', '@seq1\nACGT\n+\n@@hh\n'),
+                 ('fastq-solexa', '@seq1\nACGT\n+\n;;hh\n'),
+                 ('fastq', '@seq1\r\nACGT\r\n+\r\nIIII\r\n\n'),
+                 ('fastq', '@seq1\nACGT\n+\n!!I\n'),
+                 ('fastq-illumina', '@seq1\nACGT\n+\n!!II\n'),
+                 ('fastq', '@seq1\nACGT\n+seq2\nIIII\n'),
+                 ('fasta', 'comment\n>seq1 desc\tx\nAC GT\r\n\nTT\n>seq2\n'),
+                 ('fasta', '')]
+        for file_format, content in cases:
+            native = self._parse(content, file_format)
+            assert native == self._parse(content, file_format, native=False)
+        assert self._parse(cases[0][1], 'fastq')[1] == ('ACGT', 'seq2', '',
+                                                        [40, 40, 40, 40])
+        assert self._parse(cases[2][1], 'fastq-solexa')[0][3] == [1, 1, 40, 40]
+        assert self._parse(cases[4][1], 'fastq') == 'error'
+
+        #fasta and qual
+        seqs = '>seq1 desc\nACGT\n>seq2\nAA\n'
+        quals = '>seq1 desc\n10 20\n30 -1\n>seq2\n1 2\n'
+        native = self._parse(seqs, 'fasta', quals)
+        assert native == self._parse(seqs, 'fasta', quals, native=False)
+        assert native[0][3] == [10, 20, 30, 0]
+        assert self._parse(seqs, 'fasta', '>seq1\n1 2 3 4\n') == 'error'
+        assert self._parse(seqs, 'fasta', '>seq3\n1 2 3 4\n') == 'error'
+
+    @staticmethod
+    def test_lazy_seqs():
+        'The lazy seqs build their parts when they are used'
+        content = '@seq1 desc 1\nACGT\n+\n!!II\n@seq2\nAC\n+\nII\n'
+        seqs = list(seqs_in_file(StringIO.StringIO(content), format='fastq',
+                                 lazy=True))
+        seq = seqs[0]
+        assert seq.name == 'seq1' and len(seq) == 4
+        assert '_raw_qual' in seq.__dict__ and '_raw_seq' in seq.__dict__
+        assert seq.qual == [0, 0, 40, 40]
+        assert '_raw_seq' in seq.__dict__
+        assert str(seq.seq) == 'ACGT'
+        assert seq.description == 'desc 1'
+        assert isinstance(seq, SeqWithQuality)
+        assert str(seqs[1][:1].seq) == 'A'
+        assert seqs[1][:1].qual == [40]
+
+        #they can be copied and pickled before being built
+        pickled_seq = pickle.loads(pickle.dumps(seqs[1]))
+        for seq in (copy.deepcopy(seqs[1]), pickled_seq):
+            assert seq.qual == [40, 40]
+
+        #fasta and qual
+        seqs = seqs_in_file(StringIO.StringIO('>seq1\nACGT\n'),
+                            StringIO.StringIO('>seq1\n1 2 -1 4\n'),
+                            format='fasta', lazy=True)
+        assert seqs.next().qual == [1, 2, 0, 4]
+
+        #the invalid qualities are found when the quality is used
+        content = '@seq1\nACGT\n+\n!! I\n'
+        seq = seqs_in_file(StringIO.StringIO(content), format='fastq',
+                           lazy=True).next()
+        assert str(seq.seq) == 'ACGT'
+        try:
+            seq.qual
+            raise AssertionError('ValueError expected')
+        except ValueError:
+            pass
+
+    @staticmethod
+    def test_compact_seqs():
+        'It reads compact seqs'
+        content = '@seq1 desc 1\nACGT\n+\n!!II\n@seq2\nAC\n+\nII\n'
+        seqs = list(seqs_in_file(StringIO.StringIO(content), format='fastq',
+                                 compact=True))
+        assert isinstance(seqs[0], CompactSeqWithQuality)
+        assert seqs[0].str_seq == 'ACGT'
+        assert seqs[0].qual == [0, 0, 40, 40]
+        assert seqs[0].description == 'desc 1'
+        assert seqs[1][1:].qual == [40]
+
+        seqs = seqs_in_file(StringIO.StringIO('>seq1\nACGT\n'),
+                            StringIO.StringIO('>seq1\n1 2 -1 4\n'),
+                            format='fasta', compact=True, lazy=True)
+        assert seqs.next().qual == [1, 2, 0, 4]
+
+        #they are written as any other seq
+        fhand = StringIO.StringIO(content)
+        seqs = seqs_in_file(fhand, format='fastq', compact=True)
+        out_fhand = StringIO.StringIO()
+        write_seqs_in_file(seqs, out_fhand, format='fastq')
+        assert out_fhand.getvalue() == content
+
+class SampleSeqsInFileTest(unittest.TestCase):
+    'It tests the sampling of the sequences found in a file'
+    @staticmethod
+    def test_sample_seqs_in_file():
+        'It takes a sample reading only the chosen records'
+        names = ['seq%d' % index for index in range(100)]
+        fasta = ''.join(['>%s\nACTG\n' % name for name in names])
+        qual = ''.join(['>%s\n30 30 30 30\n' % name for name in names])
+        fastq = ''.join(['@%s\nACTG\n+\n5555\n' % name for name in names])
+        for content, qual_content, format_ in ((fasta, None, 'fasta'),
+                                               (fasta, qual, 'fasta'),
+                                               (fastq, None, 'fastq')):
+            seq_fhand = StringIO.StringIO(content)
+            qual_fhand = None
+            if qual_content is not None:
+                qual_fhand = StringIO.StringIO(qual_content)
+            seqs = list(seqs_in_file(seq_fhand, qual_fhand, format=format_,
+                                     sample_size=10))
+            assert len(seqs) == 10
+            sampled_names = [seq.name for seq in seqs]
+            assert sampled_names == sorted(sampled_names,
+                                           key=lambda name: int(name[3:]))
+            assert str(seqs[0].seq) == 'ACTG'
+            if format_ == 'fasta' and qual_fhand is None:
+                assert seqs[0].qual is None
+            else:
+                assert seqs[0].qual in ([30] * 4, [20] * 4)
+
+        #a sample bigger than the file
+        seqs = list(seqs_in_file(StringIO.StringIO(fasta), sample_size=200))
+        assert len(seqs) == 100
+
 class TestNumSeqsInFile(unittest.TestCase):
     'tests num_seqs_in_file'
 
@@ -321,6 +468,150 @@ class TestNumSeqsInFile(unittest.TestCase):
         fastq_fhand = open(join(TEST_DATA_DIR, 'solexa.fastq'))
         assert num_seqs_in_file(fastq_fhand, format='sfastq') == 3
 
+class SeqFileSectionsTest(unittest.TestCase):
+    'It tests the split of the sequence files by byte offsets'
+
+    @staticmethod
+    def _seqs_in_sections(fhand, file_format, num_sections, qual_fhand=None):
+        'It returns the names of the sequences found in every section'
+        sections = seq_file_sections(fhand, file_format, num_sections,
+                                     qual_fhand=qual_fhand)
+        names = []
+        for section in sections:
+            if qual_fhand is None:
+                seq_section, qual_section = section, None
+            else:
+                seq_section, qual_section = section
+            seq_fhand = FileSection(open(fhand.name), *seq_section)
+            if qual_section is None:
+                qual_fhand_ = None
+            else:
+                qual_fhand_ = FileSection(open(qual_fhand.name), *qual_section)
+            seqs = seqs_in_file(seq_fhand, qual_fhand_, format=file_format)
+            names.append([seq.name for seq in seqs])
+        return names
+
+    def test_fastq_sections(self):
+        'It splits a fastq file'
+        seqs = [SeqWithQuality(Seq('ACTGACTG'), name='seq%d' % index,
+                               qual=[31, 32, 33, 34, 31, 10, 11, 31])
+                                                     for index in range(20)]
+        fhand = tempfile.NamedTemporaryFile(suffix='.sfastq')
+        write_seqs_in_file(seqs, fhand, format='fastq')
+        names = self._seqs_in_sections(fhand, 'fastq', 3)
+        assert len(names) == 3
+        assert sum(names, []) == ['seq%d' % index for index in range(20)]
+
+    def test_fasta_qual_sections(self):
+        'It splits a fasta file and its qual file by the same sequences'
+        seq_fhand = open(join(TEST_DATA_DIR, 'seq.fasta'))
+        qual_fhand = open(join(TEST_DATA_DIR, 'qual.fasta'))
+        names = self._seqs_in_sections(seq_fhand, 'fasta', 4, qual_fhand)
+        assert len(names) > 1
+        all_names = [seq.name for seq in seqs_in_file(seq_fhand, qual_fhand)]
+        assert sum(names, []) == all_names
+
+    def test_pickle_sections(self):
+        'It splits a pickle file'
+        seqs = [SeqWithQuality(Seq('ACTG'), name='seq%d' % index)
+                                                     for index in range(10)]
+        fhand = tempfile.NamedTemporaryFile(suffix='.pickle')
+        write_seqs_in_file(seqs, fhand, format='pickle')
+        names = self._seqs_in_sections(fhand, 'pickle', 4)
+        assert len(names) == 4
+        assert sum(names, []) == ['seq%d' % index for index in range(10)]
+
+    @staticmethod
+    def test_unknown_format():
+        'A file without a splitter can not be split'
+        fhand = open(join(TEST_DATA_DIR, 'seq.fasta'))
+        try:
+            seq_file_sections(fhand, 'genbank', 2)
+            assert False
+        except NotImplementedError:
+            pass
+
+class PairedSeqsInFileTest(unittest.TestCase):
+    'It tests the reading of the paired sequences'
+    @staticmethod
+    def _write_pairs(num_pairs, interleaved=False):
+        'It writes the mates in two fastq files or in one interleaved'
+        mates = []
+        for index in range(num_pairs):
+            mates.append([SeqWithQuality(Seq('ACTG' * (index % 3 + 1)),
+                                         name='seq%d/%d' % (index, mate),
+                                         qual=[20] * 4 * (index % 3 + 1))
+                                                         for mate in (1, 2)])
+        if interleaved:
+            fhand = tempfile.NamedTemporaryFile(suffix='.fastq')
+            write_seqs_in_file(sum(mates, []), fhand, format='fastq')
+            return fhand, None
+        fhands = []
+        for mate in (0, 1):
+            fhand = tempfile.NamedTemporaryFile(suffix='.fastq')
+            write_seqs_in_file([pair[mate] for pair in mates], fhand,
+                               format='fastq')
+            fhands.append(fhand)
+        return fhands
+
+    def test_paired_seqs_in_file(self):
+        'It reads the mates in lockstep'
+        fhand1, fhand2 = self._write_pairs(5)
+        pairs = list(paired_seqs_in_file(open(fhand1.name),
+                                         open(fhand2.name)))
+        assert len(pairs) == 5
+        assert [(mate1.name, mate2.name) for mate1, mate2 in pairs][1] == \
+                                                        ('seq1/1', 'seq1/2')
+        interleaved = self._write_pairs(5, interleaved=True)[0]
+        pairs2 = list(paired_seqs_in_file(open(interleaved.name),
+                                          compact=True))
+        assert [(mate1.name, mate2.name) for mate1, mate2 in pairs2] == \
+                  [(mate1.name, mate2.name) for mate1, mate2 in pairs]
+
+        #the mates should match
+        for content2 in ('@seq0/2\nA\n+\nI\n@seq2/2\nA\n+\nI\n',
+                         '@seq0/2\nA\n+\nI\n'):
+            content1 = '@seq0/1\nA\n+\nI\n@seq1/1\nA\n+\nI\n'
+            try:
+                list(paired_seqs_in_file(StringIO.StringIO(content1),
+                                         StringIO.StringIO(content2),
+                                         format='fastq'))
+                self.fail('ValueError expected')
+            except ValueError:
+                pass
+
+    def test_paired_sections(self):
+        'The sections of the paired files hold both mates'
+        tmp_fhand1, tmp_fhand2 = self._write_pairs(20)
+        fhand1, fhand2 = open(tmp_fhand1.name), open(tmp_fhand2.name)
+        tmp_interleaved = self._write_pairs(20, interleaved=True)[0]
+        interleaved = open(tmp_interleaved.name)
+        expected = [('seq%d/1' % index, 'seq%d/2' % index)
+                                                        for index in range(20)]
+        for num_sections in range(2, 9):
+            sections = paired_file_sections(fhand1, 'fastq', num_sections,
+                                            mate_fhand=fhand2)
+            assert len(sections) > 1
+            names = []
+            for section, mate_section in sections:
+                pairs = paired_seqs_in_file(
+                               FileSection(open(fhand1.name), *section),
+                               FileSection(open(fhand2.name), *mate_section),
+                               format='fastq')
+                names.extend([(mate1.name, mate2.name)
+                                                  for mate1, mate2 in pairs])
+            assert names == expected
+
+            names = []
+            for section in paired_file_sections(interleaved, 'fastq',
+                                                num_sections):
+                pairs = paired_seqs_in_file(
+                           FileSection(open(interleaved.name), *section),
+                           format='fastq')
+                names.extend([(mate1.name, mate2.name)
+                                                  for mate1, mate2 in pairs])
+            assert names == expected
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -27,7 +27,10 @@ from franklin.seq.seq_annotation import (create_microsatellite_annotator,
                                          create_orf_annotator,
                                          create_go_annotator,
                                          create_cdna_intron_annotator,
-                                         create_prot_change_annotator)
+                                         create_prot_change_annotator,
+                                         create_batch_orf_annotator)
+from franklin.seq.seq_annotation import \
+                                    create_batch_microsatellite_annotator
 #                                         create_polia_annotator)
 
 from franklin.seq.seqs import SeqWithQuality, Seq, SeqFeature
@@ -156,6 +159,37 @@ class AnnotationTests(unittest.TestCase):
         assert len(seq1.features) == 1
         assert seq1.features[0].type == 'orf'
 
+    @staticmethod
+    def test_batch_annotators():
+        'The batch ssr and orf annotators work on several seqs at once'
+        seq1 = SeqWithQuality(name='ssr',
+            seq=Seq('atgatgatgatgatgatgatgatgatgatggcgcgcgcgcgcgcgcgcgcgcgcgcg'))
+        seq2 = SeqWithQuality(name='no_ssr', seq=Seq('ATCGATCAGTCAGACTGACAG'))
+        annotated = create_batch_microsatellite_annotator()([seq1, None, seq2])
+        assert annotated[1] is None
+        assert annotated[0].features[0].qualifiers['score'] == 27
+        assert not annotated[2].features
+        assert annotated[0].name == 'ssr'
+
+        seq = 'CTACTTACTAGCTTTAGTAAATCCTTCTAACCCTCGGTAAAAAAAAAAAAGAGGCATCAAATG'
+        seq += 'GCTTCATCCATTCTCTCATCCGCCGNTGTGGCCTTTGNCAACAGGGCTTCCCCTGCTCAAGCT'
+        seq += 'AGCATGGGGGCACCATTCACTGGCCTAAAATCCGCCGCTGCTTTCCCNGTNACTCGCANGACC'
+        seq += 'AACGACATCACCACTTTGGTTAGCAATGGGGGAAGAGTTCAGGGCNTGAAGGTGTGCCCACCA'
+        seq += 'CTTGGATTGAAGAAGTTCGAGACTCTTTCTTACCTTCCTGATATGAGTAACGAGCAATTGGGA'
+        seq += 'AAGGAAGTTGACTACCTTCTCAGGAAGGGATGGATTCCCTGCATTGAATTCGACATTCACAGT'
+        seq += 'GGATTCGTTTACCGTGAGACCCACAGGTCACCAGGATACTTCGATGGACGCTACTGGACCATG'
+        seq += 'TGGAAGCTGCCCATGTTTGGCTGCACCGAT'
+        seq1 = SeqWithQuality(seq=Seq(seq), name='orf1')
+        seq2 = SeqWithQuality(seq=Seq(seq), name='orf2')
+        matrix_fpath = os.path.join(TEST_DATA_DIR, 'At.smat')
+        annotator = create_batch_orf_annotator(parameters={'matrix':
+                                                           matrix_fpath})
+        annotated = annotator([seq1, seq2])
+        for seq in annotated:
+            assert len(seq.features) == 1
+            assert seq.features[0].type == 'orf'
+        assert [seq.name for seq in annotated] == ['orf1', 'orf2']
+
     def test_intron_annotator(self):
         'We can annotate introns in cdnas comparing with genomic'
         seq = 'GAAAAGATGTGATTGGTGAAATAAGTTTGCCTCAATTCTCTTGTGCCGAAGTTCCAAAGAAGC'
@@ -19,9 +19,9 @@ Created on 2009 uzt 6
 # You should have received a copy of the GNU Affero General Public License
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
-import unittest, os, tempfile
+import unittest, os, tempfile, copy
 
-from franklin.seq.seqs import SeqWithQuality, Seq
+from franklin.seq.seqs import SeqWithQuality, Seq, reverse_complement_str
 from franklin.seq.writers import temp_fasta_file
 from franklin.seq.readers import seqs_in_file
 from franklin.seq.seq_cleaner import (create_adaptor_striper,
@@ -29,7 +29,11 @@ from franklin.seq.seq_cleaner import (create_adaptor_striper,
                                       create_masker_for_polia,
                                       create_masker_for_low_complexity,
                                       create_striper_by_quality_trimpoly,
+                                      create_batch_masker_for_polia,
+                                      create_batch_masker_for_low_complexity,
+                                      create_batch_striper_by_quality_trimpoly,
                                       create_striper_by_quality,
+                                      create_batch_striper_by_quality,
                                       create_striper_by_quality_lucy,
                                       _get_non_matched_locations,
                                       _get_unmasked_locations,
@@ -47,6 +51,7 @@ from franklin.seq.seq_cleaner import (create_adaptor_striper,
                                      _get_longest_non_matched_seq_region_limits)
 
 from franklin.utils.misc_utils import TEST_DATA_DIR
+from franklin.utils.test_utils import create_random_seqwithquality
 
 class SeqCleanerTest(unittest.TestCase):
     'It tests cleaner function from seq_cleaner'
@@ -161,6 +166,36 @@ NACGATACGCTATGGGGAATGGCGAAAAAAGGGAAGGGAACTCACAGGA
         new_seq = seq_trimmer(new_seq)
         assert len(new_seq) == 46
 
+    @staticmethod
+    def test_batch_strip_seq_by_quality():
+        'The batch striper finds the same trim segments'
+        seqs = [None, SeqWithQuality(seq=Seq(''), qual=[])]
+        for length in (1, 2, 5, 29, 44, 69, 150, 299, 350):
+            for qual_range in ([0, 60], [15, 25], 40):
+                seqs.append(create_random_seqwithquality(length,
+                                                       qual_range=qual_range))
+        qual = [40, 18, 10, 40, 40, 5, 8, 30, 14, 3, 40, 40, 40, 11, 6, 5, 3,
+               20, 10, 12, 8, 5, 4, 7, 1]
+        seqs.append(SeqWithQuality(qual=qual, seq=Seq('a' * len(qual))))
+        for arguments in ({'quality_treshold': 20},
+                          {'quality_treshold': 20, 'quality_window_width': 1},
+                          {'quality_treshold': 20.5, 'min_quality_bases': 3,
+                           'min_seq_length': 2, 'quality_window_width': 2},
+                          {'quality_treshold': 30, 'quality_window_width': 0,
+                           'min_quality_bases': 0, 'only_3_end': True}):
+            striper = create_striper_by_quality(**arguments)
+            batch_striper = create_batch_striper_by_quality(**arguments)
+            expected = [None if seq is None else striper(copy.deepcopy(seq))
+                                                              for seq in seqs]
+            stripped = batch_striper(copy.deepcopy(seqs))
+            assert len(stripped) == len(seqs)
+            for seq, expected_seq in zip(stripped, expected):
+                if expected_seq is None:
+                    assert seq is None
+                    continue
+                key = TRIMMING_RECOMMENDATIONS
+                assert seq.annotations[key] == expected_seq.annotations[key]
+
     @staticmethod
     def test_mask_low_complexity():
         'It test mask_low_complexity function'
@@ -206,6 +241,72 @@ NACGATACGCTATGGGGAATGGCGAAAAAAGGGAAGGGAACTCACAGGA
         assert masked_seq.seq == exp_seq
         assert masked_seq.description == 'hola'
 
+    @staticmethod
+    def test_batch_maskers():
+        'The batch maskers give the same result as the one seq ones'
+        seqs = ['TCGCATCGATCATCGCAGATCGACTGATCGATCGATCGGGGGGGGGGGGGGGGGGGGGGGG',
+                'TCGCATCGATCATCGCAGATCGACTGATCGATCGATCAAAAAAAAAAAAAAAAAAAAAAA',
+                'ATCGATCTGATCTAGTCGATGTCTAGCTGAGCTACATAGCTAACGATCTAGTCTAGTCTA']
+        seqs = [SeqWithQuality(seq=Seq(seq), name='seq%d' % index)
+                                            for index, seq in enumerate(seqs)]
+        seqs.insert(1, None)
+        sequence_trimmer = create_seq_trim_and_masker()
+        for single_factory, batch_factory in (
+                (create_masker_for_low_complexity,
+                 create_batch_masker_for_low_complexity),
+                (create_masker_for_polia, create_batch_masker_for_polia)):
+            single_masker = single_factory()
+            batch_masker = batch_factory()
+            masked_seqs = batch_masker(copy.deepcopy(seqs))
+            assert len(masked_seqs) == len(seqs)
+            assert masked_seqs[1] is None
+            for seq, masked_seq in zip(seqs, masked_seqs):
+                if seq is None:
+                    continue
+                expected = sequence_trimmer(single_masker(copy.deepcopy(seq)))
+                masked_seq = sequence_trimmer(masked_seq)
+                assert str(masked_seq.seq) == str(expected.seq)
+                assert masked_seq.name == seq.name
+        assert create_batch_masker_for_polia()([None]) == [None]
+
+        #trimpoly writes nothing for the empty seqs, they are left as they are
+        empty = SeqWithQuality(seq=Seq(''), name='empty')
+        masked_seqs = create_batch_masker_for_polia()([empty, seqs[0]])
+        assert masked_seqs[0] is empty
+        assert str(masked_seqs[0].seq) == ''
+        assert masked_seqs[1].name == 'seq0'
+
+    @staticmethod
+    def test_batch_trimpoly():
+        'The batch trimpoly striper matches the one seq striper'
+        seq1  = 'TNNNNNNAGGGCTTTCCTGACAGCTANNNNNTTTGCGGGCAACATCCAGAACAAGCACCG'
+        seq1 += 'GCAGATTGGCAATGCCGTGCCCCCGCCTCTTGCCTATGCACTTGGGAGGAAGCTGAAGGA'
+        seq1 += 'AGCCGTTGACAAGCGTCAGGAAGCCAGCGCAGGCGTGCCTGCACCATGAGAAGTTTTCCT'
+        seq2  = 'TGACATCGAACCTCGGCGCCGAGCACCTCCTCGCTGGGATGGTGGGCAAGAACTCCATGA'
+        seq2 += 'AGGTCGCTCGCGATCTGGTCATGCAGGAGGTGAGGAGGCACTTCCGCCCTGAGCTGCTGA'
+        seq2 += 'ACCGTCTCGACGAGATCGTGATCTTCGATCCTCTGTCCCACGAGCAGCTGAGGAAGGTCG'
+        seq2 += 'CTCGCCTTCAGATGAAGGATGTGGCCGTCCGTCTTGCCGAANNNNNCATCGCTCTGGCTG'
+        seq2 += 'TGACCGANNNNNCATTGGACATCATCTTGTCTCTCTCTNNNNNNTCNNNNT'
+        def _create_seqs():
+            'The trimming segments are added in place, we need new seqs'
+            return [SeqWithQuality(seq=Seq(seq1), name='seq1'), None,
+                    SeqWithQuality(seq=Seq(seq2), name='seq2'),
+                    SeqWithQuality(seq=Seq('ACTGANNNNNNNNNNN'), name='short')]
+        striper = create_striper_by_quality_trimpoly()
+        batch_striper = create_batch_striper_by_quality_trimpoly()
+        sequence_trimmer = create_seq_trim_and_masker()
+        seqs = _create_seqs()
+        trimmed_seqs = batch_striper(seqs)
+        assert len(trimmed_seqs) == len(seqs)
+        for seq, trimmed_seq in zip(_create_seqs(), trimmed_seqs):
+            expected = None if seq is None else striper(seq)
+            if expected is None:
+                assert trimmed_seq is None
+                continue
+            assert trimmed_seq.name == seq.name
+            assert str(sequence_trimmer(trimmed_seq).seq) == \
+                                        str(sequence_trimmer(expected).seq)
+
     def test_trim_seq_by_qual_trimpoly(self):
         'It test trimpoly  but with trim low quality parameters'
         seq  = 'ATCGATCTGATCTAGTCGATGTCTAGCTGAGCTACATAGCTAACGATCTAGTCTAGTCTATG'
@@ -476,6 +577,41 @@ NACGATACGCTATGGGGAATGGCGAAAAAAGGGAAGGGAACTCACAGGA
         assert vec1[4:14]  not in striped_seq
         assert vec1[-14:-4] not  in striped_seq
 
+    @staticmethod
+    def test_strip_vector_index_as_blast():
+        'The vector index strips the same vector regions as blast'
+        vector_db = os.path.join(TEST_DATA_DIR, 'blast', 'univec+')
+        vectors = [str(seq.seq) for seq in seqs_in_file(open(vector_db))]
+        insert = 'ATGCATCAGATGCATGCATGACTACGACTACGATCAGCATCAGCGATCAGCATCGATAC'
+
+        def _mismatch(str_seq, position):
+            'It changes the base in the given position'
+            base = 'A' if str_seq[position] != 'A' else 'C'
+            return str_seq[:position] + base + str_seq[position + 1:]
+        #the second vector is a low complexity one
+        vector = vectors[0]
+        #mismatches, insertions and deletions
+        vec1 = _mismatch(vector[:130], 40)
+        vec1 = vec1[:55] + 'G' + vec1[55:90] + vec1[92:]
+        vec2 = _mismatch(vector[10:], 35)
+        vec2 = vec2[:60] + 'TT' + vec2[60:100] + vec2[101:]
+        reads = [insert + vec1, reverse_complement_str(vec2) + insert,
+                 insert + _mismatch(vector[20:120], 50) + insert]
+
+        blast_striper = create_vector_striper(vector_db,
+                                              vectors_are_blastdb=True)
+        index_striper = create_vector_striper(vector_db,
+                                              vectors_are_blastdb=True,
+                                              vector_index=True)
+        for read in reads:
+            blast_seq = blast_striper(SeqWithQuality(name='seq',
+                                                     seq=Seq(read)))
+            index_seq = index_striper(SeqWithQuality(name='seq',
+                                                     seq=Seq(read)))
+            trimming = index_seq.annotations[TRIMMING_RECOMMENDATIONS]
+            assert trimming['vector']
+            assert blast_seq.annotations[TRIMMING_RECOMMENDATIONS] == trimming
+
 class SeqSplitterTests(unittest.TestCase):
     'Here we test seq splitter functions'
     @staticmethod
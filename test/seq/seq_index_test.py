@@ -0,0 +1,115 @@
+'''
+Created on 17/10/2026
+
+@author: jose
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest, tempfile, os, shutil
+import cPickle as pickle
+
+from franklin.seq.seq_index import SeqIndex, index_seq_file, INDEX_EXTENSION
+from franklin.seq.seqs import SeqWithQuality, Seq
+from franklin.seq.writers import write_seqs_in_file
+
+SEQS = {'seq1': 'ACTGATCGATCGATCAGTCGATCGA',
+        'seq2': 'TTTTTACGACGACGTAGCTAGCATCAGCATCTGACTAAAA',
+        'seq3': ''}
+
+def _write_fasta(fpath, line_length):
+    'It writes the SEQS in a fasta file with the given line length'
+    fhand = open(fpath, 'w')
+    for name in sorted(SEQS):
+        fhand.write('>%s a description\n' % name)
+        seq = SEQS[name]
+        for start in range(0, len(seq), line_length):
+            fhand.write(seq[start:start + line_length] + '\n')
+    fhand.close()
+
+class SeqIndexTest(unittest.TestCase):
+    'It tests the persistent sequence file index'
+    def setUp(self):
+        'It creates a temporary directory for the files'
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        'It removes the temporary directory'
+        shutil.rmtree(self.dir)
+
+    def test_fasta_index(self):
+        'It fetches fasta sequences and subsequences by name'
+        fpath = os.path.join(self.dir, 'seqs.fasta')
+        _write_fasta(fpath, line_length=7)
+        index = SeqIndex(fpath)
+        assert os.path.exists(fpath + INDEX_EXTENSION)
+        assert sorted(index.keys()) == sorted(SEQS.keys())
+        for name, seq in SEQS.items():
+            assert str(index[name].seq) == seq
+            assert index[name].name == name
+            assert index[name].description == 'a description'
+            assert index.get_seq_length(name) == len(seq)
+            for start in range(0, len(seq) + 2, 3):
+                for end in range(start, len(seq) + 2, 5):
+                    assert index.get_subseq(name, start, end) == seq[start:end]
+        assert 'seq4' not in index
+        sample = [seq.name for seq in index.sample(2)]
+        assert len(sample) == 2 and sample == sorted(sample)
+        try:
+            index['seq4']
+            self.fail('KeyError expected')
+        except KeyError:
+            pass
+
+        #the index is reused and it can be sent to other processes
+        index_mtime = os.path.getmtime(fpath + INDEX_EXTENSION)
+        index = pickle.loads(pickle.dumps(SeqIndex(fpath)))
+        assert os.path.getmtime(fpath + INDEX_EXTENSION) == index_mtime
+        assert str(index['seq2'].seq) == SEQS['seq2']
+
+        #if the file changes the index is rebuilt
+        fhand = open(fpath, 'a')
+        fhand.write('>seq4\nAC\nGTGG\nT\n')
+        fhand.close()
+        index = SeqIndex(fpath)
+        assert index.get_subseq('seq4', 1, 5) == 'CGTG'
+        index.close()
+
+        #an index kept only in memory
+        fpath = os.path.join(self.dir, 'seqs2.fasta')
+        _write_fasta(fpath, line_length=60)
+        index = SeqIndex(fpath, persist=False)
+        assert not os.path.exists(fpath + INDEX_EXTENSION)
+        assert index.get_subseq('seq2', 3, 8) == SEQS['seq2'][3:8]
+
+    def test_fastq_pickle_index(self):
+        'It indexes fastq and pickle files'
+        seqs = [SeqWithQuality(Seq(SEQS[name]), name=name,
+                               qual=[20] * len(SEQS[name]))
+                for name in sorted(SEQS) if SEQS[name]]
+        for format_ in ('fastq', 'pickle'):
+            fpath = os.path.join(self.dir, 'seqs.' + format_)
+            write_seqs_in_file(seqs, open(fpath, 'w'), format=format_)
+            index = index_seq_file(open(fpath))
+            assert len(index) == 2
+            seq = index['seq2']
+            assert str(seq.seq) == SEQS['seq2']
+            assert seq.qual == [20] * len(SEQS['seq2'])
+            assert index.get_subseq('seq1', 2, 6) == SEQS['seq1'][2:6]
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
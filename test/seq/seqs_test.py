@@ -20,9 +20,11 @@ Created on 2009 mar 27
 # along with franklin. If not, see <http://www.gnu.org/licenses/>.
 
 import unittest
+import cPickle as pickle
 from franklin.seq.seqs import (SeqWithQuality, Seq, SeqFeature, get_seq_name,
                                create_seq_from_struct, UNKNOWN_DESCRIPTION,
-                               reverse_complement)
+                               reverse_complement, CompactSeqWithQuality,
+                               copy_seq_with_quality, reverse_complement_seqs)
 from Bio.SeqFeature import FeatureLocation, ExactPosition
 from Bio.Alphabet import Alphabet, DNAAlphabet
 
@@ -181,7 +183,116 @@ class SeqsTest(unittest.TestCase):
         seq2 = reverse_complement(seq1)
         assert seq2.seq == sequence1.reverse_complement()
         assert seq2.qual == seq1.qual[::-1]
+        assert seq2.name == 'seq1_complemented'
 
+        #RNA and IUPAC codes
+        seq = reverse_complement(SeqWithQuality(Seq('ACGUNRY'), name='s'))
+        assert str(seq.seq) == 'RYNACGU'
+        assert seq.qual is None
+
+    @staticmethod
+    def test_reverse_complement_seqs():
+        'It reverse complements several seqs at once'
+        seqs = [SeqWithQuality(Seq('aaACG'), name='seq1', qual=[1, 2, 3, 4, 5]),
+                SeqWithQuality(Seq(''), name='seq2', qual=[]),
+                CompactSeqWithQuality('ACTTN', name='seq3',
+                                      qual=[5, 6, 7, 8, 9]),
+                SeqWithQuality(Seq('GGTR'), name='seq4')]
+        for rev_seqs in (reverse_complement_seqs(seqs),
+                         reverse_complement_seqs(seqs[:3] +
+                                 [SeqWithQuality(Seq('GGUR'), name='seq4')])):
+            expected = [reverse_complement(seq) for seq in seqs]
+            assert [str(seq.seq) for seq in rev_seqs[:3]] == \
+                   [str(seq.seq) for seq in expected[:3]]
+            assert [seq.qual for seq in rev_seqs] == \
+                   [seq.qual for seq in expected]
+            assert [seq.name for seq in rev_seqs] == \
+                   [seq.name for seq in expected]
+            assert isinstance(rev_seqs[2], CompactSeqWithQuality)
+        assert str(rev_seqs[0].seq) == 'CGTtt'
+        assert str(rev_seqs[3].seq) == 'YACC'
+
+class CompactSeqWithQualityTest(unittest.TestCase):
+    'It tests the compact read'
+    @staticmethod
+    def _check_equal(compact, seq):
+        'It checks that both seqs have the same content'
+        assert str(compact.seq) == str(seq.seq)
+        assert compact.qual == seq.qual
+        assert compact.name == seq.name
+        assert compact.id == seq.id
+        assert compact.description == seq.description
+        assert compact.annotations == seq.annotations
+
+    def test_compact_seq(self):
+        'It works as a SeqWithQuality'
+        seq = SeqWithQuality(Seq('aaACctTTgg'), name='seq1', description='d',
+                             qual=[1, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+        seq.annotations['orig'] = 'yes'
+        compact = CompactSeqWithQuality.from_seq_with_quality(seq)
+        assert not hasattr(compact, '__dict__')
+        assert len(compact) == 10
+        self._check_equal(compact, seq)
+        self._check_equal(compact[2:7], seq[2:7])
+        self._check_equal(compact.upper(), seq.upper())
+        self._check_equal(compact.complement(), seq.complement())
+        self._check_equal(compact.reverse_complement(),
+                          reverse_complement(seq))
+        self._check_equal(reverse_complement(compact),
+                          reverse_complement(seq))
+        self._check_equal(compact[:3] + compact[5:], seq[:3] + seq[5:])
+        self._check_equal(copy_seq_with_quality(compact, seq=Seq('AC'),
+                                                qual=[1, 2]),
+                          copy_seq_with_quality(seq, seq=Seq('AC'),
+                                                qual=[1, 2]))
+        self._check_equal(compact.to_seq_with_quality(), seq)
+        assert compact[3] == 'C'
+
+        #the quality and the rest of the letter annotations are sliced
+        letter_annotations = compact.letter_annotations
+        letter_annotations['mask'] = 'abcdefghij'
+        compact.letter_annotations = letter_annotations
+        assert compact[1:3].letter_annotations['mask'] == 'bc'
+        assert compact[1:3].letter_annotations['phred_quality'] == [2, 3]
+
+        #it can be pickled
+        self._check_equal(pickle.loads(pickle.dumps(compact, 2)), seq)
+
+        #without quality
+        compact = CompactSeqWithQuality('ACTG', name='seq2')
+        assert compact.qual is None
+        assert str(compact[1:].seq) == 'CTG'
+        assert compact.reverse_complement().qual is None
+
+    @staticmethod
+    def test_slice_views():
+        'The slices share the sequence and the quality until they are used'
+        compact = CompactSeqWithQuality('ACTGACTGAC', name='seq1',
+                                        qual=range(10))
+        view = compact[2:9][1:-1]
+        assert view._str_seq is compact._str_seq
+        assert len(view) == 5
+        assert view[0] == 'G' and view[-1] == 'G'
+        assert view._str_seq is compact._str_seq
+        try:
+            view[5]
+            raise AssertionError('IndexError expected')
+        except IndexError:
+            pass
+        copied = view.copy(name='seq2')
+        assert copied._str_seq is compact._str_seq
+
+        assert view.str_seq == 'GACTG'
+        assert view.qual == [3, 4, 5, 6, 7]
+        assert len(view._str_seq) == 5
+        assert copied.qual == [3, 4, 5, 6, 7] and copied.name == 'seq2'
+        assert compact.str_seq == 'ACTGACTGAC'
+        assert str(compact[5:2].seq) == ''
+        assert compact[::-2].qual == [9, 7, 5, 3, 1]
+
+        #a view is pickled with its window only
+        view = pickle.loads(pickle.dumps(compact[4:6], 2))
+        assert view.str_seq == 'AC' and view.qual == [4, 5]
 
 class SeqTest(unittest.TestCase):
     'It tests the Seq object.'
@@ -191,6 +302,8 @@ class SeqTest(unittest.TestCase):
         seq = Seq('ACTG')
         seq2 = seq.complement()
         assert seq2 == 'TGAC'
+        assert seq.reverse_complement() == 'CAGT'
+        assert Seq('ACGU').reverse_complement() == 'ACGU'
 
     @staticmethod
     def test_add():
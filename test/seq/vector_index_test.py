@@ -0,0 +1,115 @@
+'''
+Created on 17/10/2026
+
+@author: jose
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest, tempfile, os, shutil, random
+import cPickle as pickle
+
+from franklin.seq.vector_index import (VectorIndex, VectorIndexAligner,
+                                       VECTOR_INDEX_EXTENSION)
+from franklin.seq.seqs import SeqWithQuality, Seq, reverse_complement_str
+
+def _random_seq(length):
+    'It returns a random sequence str'
+    return ''.join(random.choice('ACGT') for index in range(length))
+
+class VectorIndexTest(unittest.TestCase):
+    'It tests the vector search with the minimizer index'
+    def setUp(self):
+        'It creates a temporary directory for the files'
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        'It removes the temporary directory'
+        shutil.rmtree(self.dir)
+
+    def test_vector_index(self):
+        'It finds the vectors in both strands'
+        vectors = [_random_seq(300), _random_seq(500)]
+        fpath = os.path.join(self.dir, 'vectors')
+        open(fpath, 'w').write('>vec1\n%s\n>vec2\n%s\n' % tuple(vectors))
+        index = VectorIndex(fpath)
+        assert os.path.exists(fpath + VECTOR_INDEX_EXTENSION)
+        assert len(index) == 2
+        assert index.get_name(1) == 'vec2'
+        assert index.get_length(1) == 500
+
+        #the Ns stop the extensions
+        insert = 'NNNNN' + _random_seq(100) + 'NNNNN'
+        seq = insert + vectors[1][20:120] + insert
+        hsps = index.find_hsps(seq.lower())
+        assert len(hsps) == 1
+        hsp = hsps[0]
+        assert hsp['vector'] == 1
+        assert (hsp['query_start'], hsp['query_end']) == (110, 209)
+        assert (hsp['subject_start'], hsp['subject_end']) == (20, 119)
+        assert hsp['subject_strand'] == 1
+        assert hsp['identity'] == 100
+
+        #the reverse strand, with one mismatch
+        vector = vectors[0][:50] + 'N' + vectors[0][51:150]
+        seq = reverse_complement_str(vector) + insert
+        hsp = index.find_hsps(seq)[0]
+        assert (hsp['query_start'], hsp['query_end']) == (0, 149)
+        assert (hsp['subject_start'], hsp['subject_end']) == (0, 149)
+        assert hsp['subject_strand'] == -1
+        assert 99 < hsp['identity'] < 100
+
+        #the index is reused and it can be sent to other processes
+        index_mtime = os.path.getmtime(fpath + VECTOR_INDEX_EXTENSION)
+        index = pickle.loads(pickle.dumps(VectorIndex(fpath)))
+        assert os.path.getmtime(fpath + VECTOR_INDEX_EXTENSION) == index_mtime
+        assert index.find_hsps(seq)[0]['vector'] == 0
+
+        #it is rebuilt when the file changes
+        open(fpath, 'w').write('>vec3\n%s\n' % vectors[1])
+        index = VectorIndex(fpath)
+        assert index.get_name(0) == 'vec3'
+        #or it is kept in memory
+        os.remove(fpath + VECTOR_INDEX_EXTENSION)
+        index = VectorIndex(fpath, persist=False)
+        assert not os.path.exists(fpath + VECTOR_INDEX_EXTENSION)
+        assert index.find_hsps(vectors[1])[0]['query_end'] == 499
+
+    def test_vector_aligner(self):
+        'It returns the vector alignments'
+        vector = _random_seq(400)
+        fpath = os.path.join(self.dir, 'vectors')
+        open(fpath, 'w').write('>vec1\n%s\n' % vector)
+        filters = [{'kind': 'score_threshold', 'score_key': 'identity',
+                    'min_score': 96}]
+        aligner = VectorIndexAligner(fpath, filters=filters)
+        insert = _random_seq(200)
+        seq1 = SeqWithQuality(name='seq1',
+                              seq=Seq(vector[:60] + 'NNNNN' + insert))
+        seq2 = SeqWithQuality(name='seq2', seq=Seq(insert))
+        #a match of 20 bp is not enough
+        seq3 = SeqWithQuality(name='seq3', seq=Seq(insert + vector[:20]))
+        alignments = list(aligner.do_alignment([seq1, seq2, seq3]))
+        assert len(alignments) == 1
+        assert alignments[0]['query'].name == 'seq1'
+        match = alignments[0]['matches'][0]
+        assert match['subject'].name == 'vec1'
+        assert len(match['subject']) == 400
+        assert (match['start'], match['end']) == (0, 59)
+        assert match['scores']['identity'] == 100
+
+if __name__ == "__main__":
+    unittest.main()
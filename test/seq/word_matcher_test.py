@@ -0,0 +1,108 @@
+'''
+Created on 17/10/2026
+
+@author: jose
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest, random, re
+
+from franklin.seq.word_matcher import WordMatcher
+from franklin.seq.seqs import reverse_complement_str
+
+def _random_seq(length, letters='ACGT'):
+    'It returns a random sequence str'
+    return ''.join(random.choice(letters) for index in range(length))
+
+class WordMatcherTest(unittest.TestCase):
+    'It tests the word search with the Aho-Corasick automata'
+    @staticmethod
+    def test_find_words():
+        'It finds the words and their reverse complements'
+        #            0000000000111111111122
+        #            0123456789012345678901
+        str_seq   = 'ATATcacagTGTGttAATCGcc'
+        matcher = WordMatcher(['CACA', '^ATAT', 'GCGA', 'A.T', 'TT'])
+        locations = matcher.find_words(str_seq)
+        assert locations[0] == [(4, 7, 1), (9, 12, -1)]
+        assert locations[1] == [(0, 3, 1)]
+        assert locations[2] == [(17, 20, -1)]
+        assert locations[3] == [(7, 9, 1), (15, 17, 1), (7, 9, -1),
+                                (15, 17, -1)]
+        assert locations[4] == [(13, 14, 1), (15, 16, -1)]
+
+        #the anchored reverse complements are found at the end
+        matcher = WordMatcher(['^GGCG'])
+        assert matcher.find_words(str_seq) == [[(18, 21, -1)]]
+
+        #only the forward strand and case sensitive
+        matcher = WordMatcher(['CACA', 'cacag'], reverse_complement=False,
+                              ignore_case=False)
+        assert matcher.find_words(str_seq) == [[], [(4, 8, 1)]]
+
+        #with mismatches
+        matcher = WordMatcher(['CACGG', '^ATTT'], max_mismatches=1)
+        locations = matcher.find_words(str_seq)
+        assert locations == [[(4, 8, 1), (6, 10, -1)], [(0, 3, 1)]]
+        try:
+            WordMatcher(['AC'], max_mismatches=2)
+            assert False
+        except ValueError:
+            pass
+
+    @staticmethod
+    def test_words_as_regexes():
+        'It finds the same words as the re module'
+        for index in range(50):
+            words = [_random_seq(random.randint(1, 6)) for index in range(20)]
+            words.extend('^' + word for word in words[:5])
+            str_seq = _random_seq(random.randint(0, 200), 'ACGTN')
+            rev_seq = reverse_complement_str(str_seq)
+            locations = WordMatcher(words).find_words(str_seq)
+            for word, word_locations in zip(words, locations):
+                expected = []
+                for match in re.finditer(word, str_seq):
+                    expected.append((match.start(), match.end() - 1, 1))
+                rev_expected = []
+                for match in re.finditer(word, rev_seq):
+                    rev_expected.append((len(str_seq) - match.end(),
+                                         len(str_seq) - match.start() - 1, -1))
+                assert word_locations == expected + rev_expected[::-1]
+
+    @staticmethod
+    def test_words_with_mismatches():
+        'It finds the words with the mismatches allowed'
+        for index in range(50):
+            words = [_random_seq(random.randint(3, 10)) for index in range(10)]
+            str_seq = _random_seq(random.randint(0, 200))
+            matcher = WordMatcher(words, reverse_complement=False,
+                                  max_mismatches=2)
+            for word, word_locations in zip(words,
+                                            matcher.find_words(str_seq)):
+                expected = []
+                for start in range(len(str_seq) - len(word) + 1):
+                    if expected and start <= expected[-1][1]:
+                        continue
+                    subseq = str_seq[start:start + len(word)]
+                    mismatches = sum(1 for base1, base2 in zip(word, subseq)
+                                                           if base1 != base2)
+                    if mismatches <= 2:
+                        expected.append((start, start + len(word) - 1, 1))
+                assert word_locations == expected
+
+if __name__ == "__main__":
+    unittest.main()
@@ -41,7 +41,6 @@ from franklin.snv.snv_filters import (create_unique_contiguous_region_filter,
                                       SnvNamer,
                                       create_in_segment_filter,
                                       create_in_segment_bed_filter)
-from psubprocess.utils import NamedTemporaryDir
 
 class SeqVariationFilteringTest(unittest.TestCase):
     'It checks the filtering methods.'
@@ -0,0 +1,119 @@
+'''
+Created on 17/10/2026
+
+@author: jose
+'''
+
+# Copyright 2009 Jose Blanca, Peio Ziarsolo, COMAV-Univ. Politecnica Valencia
+# This file is part of franklin.
+# franklin is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+
+# franklin is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR  PURPOSE.  See the
+# GNU Affero General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License
+# along with franklin. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest, gzip, random
+from tempfile import NamedTemporaryFile
+
+from franklin.utils.compressed_files import (open_compressed_file,
+                                             compression_kind, BgzfReader,
+                                             GzipReader, has_random_access)
+from franklin.utils.misc_utils import FileSection
+from franklin.seq.readers import (guess_seq_file_format, seqs_in_file,
+                                  seq_file_sections)
+
+def _fastq_content(num_seqs):
+    'It returns the content of a fastq file with random sequences'
+    records = []
+    for index in range(num_seqs):
+        length = random.randint(1, 300)
+        seq = ''.join(random.choice('ACTG') for base in range(length))
+        records.append('@seq%d\n%s\n+\n%s\n' % (index, seq, '5' * len(seq)))
+    return ''.join(records)
+
+class CompressedFilesTest(unittest.TestCase):
+    'It tests the gzip and BGZF readers and writers'
+    @staticmethod
+    def test_read_compressed():
+        'The compressed files are read at any position'
+        content = _fastq_content(2000)
+        bgzf_fhand = NamedTemporaryFile(suffix='.fastq.gz')
+        writer = open_compressed_file(bgzf_fhand.name, 'w', threads=2)
+        for start in range(0, len(content), 1000):
+            writer.write(content[start:start + 1000])
+            writer.flush()
+        writer.close()
+        #a gzip file with two members
+        gzip_fhand = NamedTemporaryFile(suffix='.fastq.gz')
+        middle = len(content) // 3
+        for part in (content[:middle], content[middle:]):
+            member = gzip.GzipFile(fileobj=gzip_fhand, mode='w')
+            member.write(part)
+            member.close()
+        gzip_fhand.flush()
+
+        #any gzip reader can read the BGZF file
+        assert gzip.open(bgzf_fhand.name).read() == content
+        for fhand, kind, class_ in ((bgzf_fhand, 'bgzf', BgzfReader),
+                                    (gzip_fhand, 'gzip', GzipReader)):
+            assert compression_kind(open(fhand.name)) == kind
+            reader = open_compressed_file(fhand.name)
+            assert isinstance(reader, class_)
+            assert reader.readline() == '@seq0\n'
+            assert reader.peek(4) == content[6:10]
+            reader.seek(0)
+            assert list(reader) == content.splitlines(True)
+            for position in random.sample(xrange(len(content)), 20):
+                reader.seek(position)
+                assert reader.read(70000) == content[position:position + 70000]
+                reader.seek(position)
+                end = content.find('\n', position) + 1
+                assert reader.readline() == content[position:end]
+            reader.seek(0, 2)
+            assert reader.tell() == len(content)
+            assert reader.read() == ''
+        plain_fhand = NamedTemporaryFile(suffix='.fastq')
+        plain_fhand.write(content)
+        plain_fhand.flush()
+        assert compression_kind(open(plain_fhand.name)) is None
+        assert isinstance(open_compressed_file(plain_fhand.name), file)
+        assert has_random_access(open_compressed_file(bgzf_fhand.name))
+        assert not has_random_access(open_compressed_file(gzip_fhand.name))
+
+    @staticmethod
+    def test_compressed_seq_files():
+        'The sequence files are read and split decompressed'
+        content = _fastq_content(2000)
+        fhand = NamedTemporaryFile(suffix='.fastq.gz')
+        writer = open_compressed_file(fhand.name, 'w', threads=1)
+        writer.write(content)
+        writer.close()
+
+        #the format is guessed from the raw compressed file
+        assert guess_seq_file_format(open(fhand.name)) == 'fastq'
+        seqs = list(seqs_in_file(open(fhand.name)))
+        assert len(seqs) == 2000
+        assert seqs[-1].name == 'seq1999'
+
+        reader = open_compressed_file(fhand.name)
+        block_starts = reader.block_starts()
+        assert len(block_starts) > 4
+        sections = seq_file_sections(reader, 'fastq', 4)
+        assert len(sections) == 4
+        names = []
+        for start, end in sections:
+            section = FileSection(open_compressed_file(fhand.name), start, end)
+            assert content[start] == '@'
+            names.extend(seq.name for seq in seqs_in_file(section))
+        assert names == [seq.name for seq in seqs]
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
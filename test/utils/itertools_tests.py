@@ -5,7 +5,8 @@ Created on 11/05/2010
 '''
 import unittest
 from franklin.utils.itertools_ import (take_sample, make_cache, store, classify,
-                                       ungroup)
+                                       ungroup, SpillingBuffer,
+                                       get_memory_usage, reservoir_sample)
 import itertools
 
 class TakeSampleTest(unittest.TestCase):
@@ -30,6 +31,23 @@ class TakeSampleTest(unittest.TestCase):
                 a = take_sample(iterator, sample_size)
                 assert sample_size ==  len(list(a))
 
+    @staticmethod
+    def test_reservoir_sample():
+        'It samples the items reading them only once'
+        sample = reservoir_sample(iter(range(100000)), 100)
+        assert len(sample) == 100
+        assert sample == sorted(set(sample))
+        assert sample[-1] > 50000
+        assert reservoir_sample(iter(range(5)), 10) == range(5)
+        assert reservoir_sample(iter(range(5)), 0) == []
+
+        #every item has the same chance of being sampled
+        counts = [0] * 10
+        for repeat in range(2000):
+            for item in reservoir_sample(iter(range(10)), 3):
+                counts[item] += 1
+        assert min(counts) > 450 and max(counts) < 750
+
     def test_tee_sample(self):
         'It tests that tee and sample behave ok together'
         items = iter(range(1000))
@@ -55,6 +73,31 @@ class StoreTest(unittest.TestCase):
         storage.extend(item_list)
         assert list(storage) == item_list
 
+class SpillingBufferTest(unittest.TestCase):
+    'It tests the buffer that goes to disk'
+    @staticmethod
+    def test_spilling_buffer():
+        'The items can be iterated several times'
+        assert get_memory_usage() > 0
+        item_list = [1, 3, 4, 4.7, 'hola', [1, {'caracola':True}]]
+        buffered = SpillingBuffer(iter(item_list))
+        assert list(buffered) == item_list
+        assert list(buffered) == item_list
+        assert not buffered.spilled
+
+        #the memory budget is exceeded, the items go to disk
+        buffered = SpillingBuffer(iter(range(100)), max_memory=1,
+                                  check_interval=10)
+        items1, items2 = iter(buffered), iter(buffered)
+        assert [items1.next() for index in range(50)] == range(50)
+        assert list(items2) == range(100)
+        assert list(items1) == range(50, 100)
+        assert buffered.spilled
+        assert buffered.num_spilled == 99
+        assert list(buffered) == range(100)
+        buffered.close()
+
+
 class ClassifierTest(unittest.TestCase):
     'It tests the classifier function'
     @staticmethod